@@ -0,0 +1,444 @@
+#!/usr/bin/python3
+
+"""Benchmark suite for the Admin GUI list, edit, search and import endpoints.
+
+Generates a synthetic ConfigDB (see configdb_generator.py), starts a stub
+ConfigGenerator service and requests each endpoint through the Flask test
+client as admin user. Latency, number of SQL statements and peak memory
+allocations are recorded per endpoint.
+
+Results can be saved as JSON and compared against a saved baseline. The
+exit code is 1 if any endpoint regressed beyond the threshold.
+
+Import endpoints are measured after a first warmup request, i.e. when
+re-importing already existing resources.
+
+Usage:
+    uv run benchmarks/admin_gui_benchmark.py [--scale medium] [--rounds 10] \\
+        [--db-url postgresql:///?service=qwc_bench] \\
+        [--save results.json] [--baseline baseline.json]
+"""
+
+import argparse
+from fnmatch import fnmatchcase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from urllib.parse import urlparse
+
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.engine import Engine
+
+from configdb_generator import add_scale_arguments, config_metadata, \
+    enable_sqlite_standin, generate_configdb, scale_from_args
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# number of not yet imported maps and layers served by the stub
+# ConfigGenerator
+NEW_MAPS = 5
+NEW_LAYERS = 3
+
+
+def start_config_generator(db_url):
+    """Start stub ConfigGenerator service serving the maps, layers and
+    attributes of the ConfigDB, and return its base URL.
+
+    Every second map is referenced in the service configs, for reporting
+    unused resources.
+
+    :param str db_url: DB connection URL
+    """
+    tables = {table.name: table for table in config_metadata().sorted_tables}
+    resources = tables['resources']
+    engine = create_engine(db_url)
+    with engine.connect() as conn:
+        rows = conn.execute(select(
+            resources.c.id, resources.c.parent_id, resources.c.type,
+            resources.c.name
+        ).order_by(resources.c.id)).all()
+    engine.dispose()
+
+    maps = {}
+    layer_maps = {}
+    layer_attributes = {}
+    for id, parent_id, type, name in rows:
+        if type == 'map':
+            maps[id] = {'map': name, 'layers': {}}
+        elif type == 'layer':
+            map_id = layer_maps.get(parent_id, parent_id)
+            layer_maps[id] = map_id
+            maps[map_id]['layers'][name] = []
+            layer_attributes[id] = maps[map_id]['layers'][name]
+        elif type == 'attribute' and parent_id in layer_attributes:
+            layer_attributes[parent_id].append(name)
+
+    map_details = {
+        entry['map']: sorted(entry['layers'].keys()) + [
+            'new_layer_%d' % i for i in range(NEW_LAYERS)
+        ]
+        for entry in maps.values()
+    }
+    for i in range(NEW_MAPS):
+        map_details['new_map_%d' % i] = [
+            'new_layer_%d' % l for l in range(NEW_LAYERS)
+        ]
+    referenced = [
+        {
+            'map': entry['map'],
+            'layers': [
+                {layer: attributes}
+                for layer, attributes in entry['layers'].items()
+            ]
+        }
+        for i, entry in enumerate(maps.values()) if i % 2 == 0
+    ]
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            path = urlparse(self.path).path.strip('/').split('/')
+            if path == ['maps']:
+                self.send_json(sorted(map_details.keys()))
+            elif len(path) == 2 and path[0] == 'maps' and \
+                    path[1] in map_details:
+                self.send_json({'layers': map_details[path[1]]})
+            elif path == ['resources']:
+                self.send_json(referenced)
+            else:
+                self.send_json({'error': "Not found"}, 404)
+
+        def send_json(self, data, status=200):
+            body = json.dumps(data).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return "http://127.0.0.1:%d/" % server.server_port
+
+
+def create_app(db_url, config_generator_url):
+    """Import Admin GUI app for a tenant config with the benchmark ConfigDB
+    and return it.
+
+    :param str db_url: DB connection URL
+    :param str config_generator_url: Stub ConfigGenerator URL
+    """
+    config_path = tempfile.mkdtemp(prefix='admin_gui_benchmark_')
+    os.makedirs(os.path.join(config_path, 'default'))
+    with open(
+        os.path.join(config_path, 'default', 'adminGuiConfig.json'), 'w'
+    ) as f:
+        json.dump({
+            'service': 'admin-gui',
+            'config': {
+                'db_url': db_url,
+                'config_generator_service_url': config_generator_url,
+                # disable request timeouts and error logs for unavailable
+                # services
+                'default_qgis_server_url': '',
+                'solr_service_url': ''
+            }
+        }, f)
+
+    os.environ['CONFIG_PATH'] = config_path
+    os.environ.setdefault('JWT_SECRET_KEY', os.urandom(24).hex())
+    os.environ['WARMUP_MODELS'] = 'True'
+
+    sys.path.insert(0, SRC_DIR)
+    import server
+
+    server.app.config['WTF_CSRF_ENABLED'] = False
+    if not server.warmup_done.wait(60):
+        raise Exception("Warmup did not finish")
+    return server.app
+
+
+class StatementCounter:
+    """Counts SQL statements of all engines."""
+
+    def __init__(self):
+        self.count = 0
+        event.listen(Engine, 'before_cursor_execute', self.before_execute)
+
+    def before_execute(self, *args):
+        self.count += 1
+
+
+def benchmark_cases(db_url):
+    """Return benchmark cases as list of (<name>, <method>, <path>).
+
+    :param str db_url: DB connection URL
+    """
+    tables = {table.name: table for table in config_metadata().sorted_tables}
+    resources = tables['resources']
+    permissions = tables['permissions']
+
+    engine = create_engine(db_url)
+    with engine.connect() as conn:
+        def first_id(table, *criteria):
+            return conn.execute(
+                select(table.c.id).where(*criteria).order_by(table.c.id)
+                .limit(1)
+            ).scalar() or 1
+
+        user_id = first_id(tables['users'], tables['users'].c.id > 1)
+        group_id = first_id(tables['groups'])
+        role_id = first_id(tables['roles'], tables['roles'].c.id > 2)
+        map_id = first_id(resources, resources.c.type == 'map')
+        attribute_id = first_id(resources, resources.c.type == 'attribute')
+        permission_id = first_id(permissions)
+        registrable_group_id = first_id(tables['registrable_groups'])
+    engine.dispose()
+
+    return [
+        # lists
+        ('home', 'GET', '/'),
+        ('users', 'GET', '/users'),
+        ('users_page', 'GET', '/users?page=5&per_page=50'),
+        ('users_filtered', 'GET', '/users?search=user01'),
+        ('groups', 'GET', '/groups'),
+        ('roles', 'GET', '/roles'),
+        ('resources', 'GET', '/resources'),
+        ('resources_layers', 'GET', '/resources?type=layer&per_page=100'),
+        ('resources_filtered', 'GET', '/resources?search=layer_1'),
+        ('resources_check_unused', 'GET', '/resources?check_unused=1'),
+        ('permissions', 'GET', '/permissions'),
+        ('permissions_role', 'GET', '/permissions?role=%d' % role_id),
+        ('permissions_resource', 'GET',
+         '/permissions?resource_id=%d' % attribute_id),
+        ('registrable_groups', 'GET', '/registrable_groups'),
+        ('registration_requests', 'GET', '/registration_requests'),
+        ('resource_hierarchy', 'GET', '/resources/%d/hierarchy' % map_id),
+        ('resources_unused', 'GET', '/resources/unused'),
+        # JSON search
+        ('search_users', 'GET', '/users/search?q=user01'),
+        ('search_groups', 'GET', '/groups/search?q=group'),
+        ('search_roles', 'GET', '/roles/search?q=role'),
+        ('search_resources', 'GET', '/resources/search?q=layer_1'),
+        # forms
+        ('new_user', 'GET', '/users/new'),
+        ('edit_user', 'GET', '/users/%d/edit' % user_id),
+        ('edit_group', 'GET', '/groups/%d/edit' % group_id),
+        ('edit_role', 'GET', '/roles/%d/edit' % role_id),
+        ('new_resource', 'GET', '/resources/new'),
+        ('edit_resource', 'GET', '/resources/%d/edit' % attribute_id),
+        ('new_permission', 'GET', '/permissions/new'),
+        ('edit_permission', 'GET', '/permissions/%d/edit' % permission_id),
+        ('edit_registrable_group', 'GET',
+         '/registrable_groups/%d/edit' % registrable_group_id),
+        ('import_form', 'GET', '/resources/%d/import' % map_id),
+        # imports
+        ('import_maps', 'POST', '/resources/import_maps'),
+        ('import_all', 'POST', '/resources/import_all'),
+        ('import_children', 'POST',
+         '/resources/%d/import_children' % map_id)
+    ]
+
+
+def run_case(client, headers, counter, method, path, rounds):
+    """Run benchmark case and return its results.
+
+    :param FlaskClient client: Test client
+    :param dict headers: Request headers
+    :param StatementCounter counter: SQL statement counter
+    :param str method: HTTP method
+    :param str path: Request path
+    :param int rounds: Number of timed requests
+    """
+    def request():
+        return client.open(path, method=method, headers=headers)
+
+    # warmup, e.g. for imports and caches
+    response = request()
+
+    durations = []
+    counter.count = 0
+    for i in range(rounds):
+        start = time.perf_counter()
+        request()
+        durations.append(time.perf_counter() - start)
+    statements = round(counter.count / rounds)
+
+    # NOTE: separate request for memory, as tracing slows down requests
+    tracemalloc.start()
+    request()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    durations.sort()
+    return {
+        'status': response.status_code,
+        'median_ms': statistics.median(durations) * 1000,
+        'p95_ms': durations[
+            min(len(durations) - 1, int(len(durations) * 0.95))
+        ] * 1000,
+        'statements': statements,
+        'peak_kb': peak / 1024
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print comparison with baseline results and return names of
+    regressed cases.
+
+    A case regressed if its median latency or peak memory grew by more than
+    the threshold, or if it executes more SQL statements.
+
+    :param dict results: Benchmark results
+    :param dict baseline: Baseline results
+    :param float threshold: Max relative increase, e.g. 0.2 for 20%
+    """
+    def change(value, base):
+        if not base:
+            return 0
+        return (value - base) / base
+
+    regressions = []
+    print()
+    print("%-26s %17s %15s %17s" % (
+        "Comparison", "median", "statements", "peak memory"
+    ))
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            print("%-26s %s" % (name, "(not in baseline)"))
+            continue
+
+        latency = change(result['median_ms'], base['median_ms'])
+        memory = change(result['peak_kb'], base['peak_kb'])
+        statements = result['statements'] - base['statements']
+        regressed = (
+            latency > threshold or memory > threshold or statements > 0
+        )
+        if regressed:
+            regressions.append(name)
+        print("%-26s %+16.0f%% %+15d %+16.0f%% %s" % (
+            name, latency * 100, statements, memory * 100,
+            "REGRESSION" if regressed else ""
+        ))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        '--db-url',
+        help="ConfigDB connection URL (default: generated SQLite stand-in)"
+    )
+    parser.add_argument(
+        '--skip-generate', action='store_true',
+        help="Use existing records in the ConfigDB"
+    )
+    parser.add_argument(
+        '--rounds', type=int, default=10,
+        help="Number of timed requests per endpoint"
+    )
+    parser.add_argument(
+        '--cases', default='*',
+        help="Comma separated patterns of case names to run"
+    )
+    parser.add_argument('--save', help="Save results to JSON file")
+    parser.add_argument('--baseline', help="Compare with JSON results")
+    parser.add_argument(
+        '--threshold', type=float, default=0.2,
+        help="Max relative increase of latency or memory vs. baseline"
+    )
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    db_url = args.db_url
+    if db_url is None:
+        db_url = 'sqlite:///%s' % os.path.join(
+            tempfile.mkdtemp(prefix='admin_gui_benchmark_'), 'configdb.sqlite'
+        )
+    if db_url.startswith('sqlite'):
+        enable_sqlite_standin()
+
+    scale = scale_from_args(args)
+    if not args.skip_generate:
+        start = time.perf_counter()
+        counts = generate_configdb(db_url, scale, args.seed, reset=True)
+        print("Generated ConfigDB in %.1fs: %s" % (
+            time.perf_counter() - start,
+            ", ".join("%d %s" % (count, table)
+                      for table, count in counts.items())
+        ))
+
+    config_generator_url = start_config_generator(db_url)
+    app = create_app(db_url, config_generator_url)
+    app.logger.setLevel(logging.ERROR)
+
+    from flask_jwt_extended import create_access_token
+    with app.app_context():
+        token = create_access_token(identity='admin')
+    headers = {'Authorization': 'Bearer %s' % token}
+
+    client = app.test_client()
+    counter = StatementCounter()
+    patterns = args.cases.split(',')
+
+    results = {}
+    print("%-26s %6s %12s %12s %10s %12s" % (
+        "Case", "status", "median ms", "p95 ms", "statements", "peak KB"
+    ))
+    for name, method, path in benchmark_cases(db_url):
+        if not any(fnmatchcase(name, pattern) for pattern in patterns):
+            continue
+        result = run_case(client, headers, counter, method, path, args.rounds)
+        results[name] = result
+        print("%-26s %6d %12.1f %12.1f %10d %12.0f" % (
+            name, result['status'], result['median_ms'], result['p95_ms'],
+            result['statements'], result['peak_kb']
+        ))
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'db': urlparse(db_url).scheme,
+            'scale': scale,
+            'seed': args.seed,
+            'rounds': args.rounds
+        },
+        'results': results
+    }
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('scale') != scale:
+            print("WARNING: baseline was recorded with a different scale")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("\n%d regressions: %s" % (
+                len(regressions), ", ".join(regressions)
+            ))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
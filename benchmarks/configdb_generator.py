@@ -0,0 +1,530 @@
+#!/usr/bin/python3
+
+"""Synthetic ConfigDB generator for benchmarks.
+
+Creates the qwc_config tables used by the Admin GUI, if missing, and fills
+them with generated users, groups, roles, resources and permissions at a
+configurable scale. Resources are maps with nested layer groups, layers,
+attributes and datasets.
+
+Use a dedicated database, as --reset deletes all existing ConfigDB
+records. For SQLite, the qwc_config schema is attached from the same
+database file.
+
+Usage:
+    uv run benchmarks/configdb_generator.py \\
+        --db-url postgresql:///?service=qwc_bench --scale medium --reset
+    uv run benchmarks/configdb_generator.py \\
+        --db-url sqlite:////tmp/configdb.sqlite --maps 100 --layer-depth 4
+"""
+
+import argparse
+import datetime
+import random
+import sqlite3
+import time
+
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, \
+    JSON, MetaData, String, Table, Text, create_engine, delete, event, \
+    func, insert, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.pool import Pool
+from sqlalchemy.schema import CreateSchema
+
+
+SCHEMA = 'qwc_config'
+
+# scale presets
+SCALES = {
+    'small': {
+        'users': 200, 'groups': 20, 'roles': 50, 'maps': 10,
+        'layer_depth': 2, 'layer_fanout': 4, 'attributes': 5,
+        'datasets': 2, 'permissions_per_role': 20,
+        'registration_requests': 20
+    },
+    'medium': {
+        'users': 2000, 'groups': 100, 'roles': 300, 'maps': 50,
+        'layer_depth': 3, 'layer_fanout': 5, 'attributes': 8,
+        'datasets': 5, 'permissions_per_role': 50,
+        'registration_requests': 200
+    },
+    'large': {
+        'users': 20000, 'groups': 500, 'roles': 2000, 'maps': 200,
+        'layer_depth': 4, 'layer_fanout': 4, 'attributes': 10,
+        'datasets': 10, 'permissions_per_role': 100,
+        'registration_requests': 2000
+    }
+}
+
+# resource types as (<name>, <description>, <list order>,
+# <parent is default allow>)
+RESOURCE_TYPES = [
+    ('map', "Map", 1, False),
+    ('layer', "Layer", 2, True),
+    ('attribute', "Attribute", 3, True),
+    ('data', "Data", 4, False),
+    ('data_create', "Data (create)", 5, False),
+    ('data_read', "Data (read)", 6, False),
+    ('data_update', "Data (update)", 7, False),
+    ('data_delete', "Data (delete)", 8, False),
+    ('print_template', "Print template", 9, False),
+    ('viewer_task', "Viewer task", 10, False)
+]
+
+
+def config_metadata():
+    """Return table definitions of the qwc_config schema."""
+    metadata = MetaData(schema=SCHEMA)
+
+    def fk(column):
+        return ForeignKey('%s.%s' % (SCHEMA, column))
+
+    Table(
+        'users', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('name', String, nullable=False, unique=True),
+        Column('description', Text),
+        Column('email', String),
+        Column('password_hash', String),
+        Column('failed_sign_in_count', Integer, default=0),
+        Column('force_password_change', Boolean, default=False),
+        Column('totp_secret', String),
+        Column('last_sign_in_at', DateTime)
+    )
+    Table(
+        'user_infos', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, fk('users.id'))
+    )
+    Table(
+        'groups', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('name', String, nullable=False, unique=True),
+        Column('description', Text)
+    )
+    Table(
+        'roles', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('name', String, nullable=False, unique=True),
+        Column('description', Text)
+    )
+    Table(
+        'groups_users', metadata,
+        Column('group_id', Integer, fk('groups.id'), primary_key=True),
+        Column('user_id', Integer, fk('users.id'), primary_key=True)
+    )
+    Table(
+        'users_roles', metadata,
+        Column('user_id', Integer, fk('users.id'), primary_key=True),
+        Column('role_id', Integer, fk('roles.id'), primary_key=True)
+    )
+    Table(
+        'groups_roles', metadata,
+        Column('group_id', Integer, fk('groups.id'), primary_key=True),
+        Column('role_id', Integer, fk('roles.id'), primary_key=True)
+    )
+    Table(
+        'resource_types', metadata,
+        Column('name', String, primary_key=True),
+        Column('description', String),
+        Column('list_order', Integer),
+        Column('parent_is_default_allow', Boolean, default=False),
+        Column('parents', JSON().with_variant(ARRAY(String), 'postgresql'))
+    )
+    Table(
+        'resources', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('parent_id', Integer, fk('resources.id')),
+        Column('type', String, fk('resource_types.name'), nullable=False),
+        Column('name', String, nullable=False)
+    )
+    Table(
+        'permissions', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('role_id', Integer, fk('roles.id'), nullable=False),
+        Column('resource_id', Integer, fk('resources.id'), nullable=False),
+        Column('priority', Integer, default=0),
+        Column('write', Boolean, default=False)
+    )
+    Table(
+        'registrable_groups', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('title', String),
+        Column('description', Text),
+        Column('group_id', Integer, fk('groups.id'))
+    )
+    Table(
+        'registration_requests', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user_id', Integer, fk('users.id')),
+        Column(
+            'registrable_group_id', Integer, fk('registrable_groups.id')
+        ),
+        Column('unsubscribe', Boolean),
+        Column('pending', Boolean),
+        Column('accepted', Boolean),
+        Column('created_at', DateTime)
+    )
+    Table(
+        'last_update', metadata,
+        Column('updated_at', DateTime, primary_key=True)
+    )
+
+    return metadata
+
+
+def attach_sqlite_schema(dbapi_connection, connection_record):
+    """Attach SQLite database file as qwc_config schema on connect.
+
+    :param Connection dbapi_connection: DBAPI connection
+    :param connection_record: Pool connection record
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    databases = dbapi_connection.execute("PRAGMA database_list").fetchall()
+    if any(db[1] == SCHEMA for db in databases):
+        return
+    path = next(db[2] for db in databases if db[1] == 'main')
+    dbapi_connection.execute(
+        "ATTACH DATABASE ? AS %s" % SCHEMA, (path or ':memory:',)
+    )
+
+
+def enable_sqlite_standin():
+    """Attach the qwc_config schema for all SQLite connections, including
+    connections of the Admin GUI.
+    """
+    if not event.contains(Pool, 'connect', attach_sqlite_schema):
+        event.listen(Pool, 'connect', attach_sqlite_schema)
+
+
+def add_scale_arguments(parser):
+    """Add scale arguments to an argument parser.
+
+    :param ArgumentParser parser: Argument parser
+    """
+    parser.add_argument(
+        '--scale', choices=sorted(SCALES.keys()), default='small',
+        help="Scale preset (default: small)"
+    )
+    parser.add_argument('--seed', type=int, default=1, help="Random seed")
+    for name, description in [
+        ('users', "Number of users"),
+        ('groups', "Number of groups"),
+        ('roles', "Number of roles"),
+        ('maps', "Number of maps"),
+        ('layer_depth', "Depth of layer group hierarchy per map"),
+        ('layer_fanout', "Number of child layers per layer group"),
+        ('attributes', "Number of attributes per layer"),
+        ('datasets', "Number of datasets per map"),
+        ('permissions_per_role', "Number of permissions per role"),
+        ('registration_requests', "Number of registration requests")
+    ]:
+        parser.add_argument(
+            '--%s' % name.replace('_', '-'), type=int, dest=name,
+            help="%s (overrides scale preset)" % description
+        )
+
+
+def scale_from_args(args):
+    """Return scale dict for parsed scale arguments.
+
+    :param Namespace args: Parsed arguments
+    """
+    scale = dict(SCALES[args.scale])
+    for name in scale.keys():
+        value = getattr(args, name, None)
+        if value is not None:
+            scale[name] = value
+    return scale
+
+
+class ConfigDBGenerator:
+    """Generates synthetic ConfigDB records."""
+
+    # number of rows per INSERT batch
+    BATCH_SIZE = 5000
+
+    def __init__(self, engine, scale, seed=1):
+        """Constructor
+
+        :param Engine engine: DB engine
+        :param dict scale: Number of records (see SCALES)
+        :param int seed: Random seed
+        """
+        self.engine = engine
+        self.scale = scale
+        self.random = random.Random(seed)
+        self.metadata = config_metadata()
+        self.tables = {
+            table.name: table for table in self.metadata.sorted_tables
+        }
+
+    def create_schema(self):
+        """Create qwc_config schema and missing tables."""
+        with self.engine.begin() as conn:
+            if conn.dialect.name != 'sqlite':
+                conn.execute(CreateSchema(SCHEMA, if_not_exists=True))
+            self.metadata.create_all(conn, checkfirst=True)
+
+    def count_users(self):
+        """Return number of existing users."""
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(func.count()).select_from(self.tables['users'])
+            ).scalar()
+
+    def reset(self):
+        """Delete all records in the qwc_config tables."""
+        with self.engine.begin() as conn:
+            for table in reversed(self.metadata.sorted_tables):
+                conn.execute(delete(table))
+
+    def insert(self, conn, table_name, rows):
+        """Insert rows in batches and return them.
+
+        :param Connection conn: DB connection
+        :param str table_name: Table name
+        :param list[dict] rows: Rows
+        """
+        table = self.tables[table_name]
+        for i in range(0, len(rows), self.BATCH_SIZE):
+            conn.execute(insert(table), rows[i:i + self.BATCH_SIZE])
+        return rows
+
+    def generate(self):
+        """Generate records and return number of rows per table."""
+        scale = self.scale
+        rnd = self.random
+        counts = {}
+
+        with self.engine.begin() as conn:
+            counts['resource_types'] = len(self.insert(
+                conn, 'resource_types', [
+                    {
+                        'name': name, 'description': description,
+                        'list_order': list_order,
+                        'parent_is_default_allow': default_allow
+                    }
+                    for name, description, list_order, default_allow
+                    in RESOURCE_TYPES
+                ]
+            ))
+
+            # users, groups and roles
+            # NOTE: role 1 'admin' for user 1 'admin'
+            users = self.insert(conn, 'users', [
+                {
+                    'id': i, 'name': 'admin' if i == 1 else 'user%05d' % i,
+                    'description': "Generated user %d" % i,
+                    'email': 'user%05d@example.com' % i,
+                    'failed_sign_in_count': 0,
+                    'force_password_change': False
+                }
+                for i in range(1, scale['users'] + 1)
+            ])
+            groups = self.insert(conn, 'groups', [
+                {
+                    'id': i, 'name': 'group%04d' % i,
+                    'description': "Generated group %d" % i
+                }
+                for i in range(1, scale['groups'] + 1)
+            ])
+            roles = self.insert(conn, 'roles', [
+                {
+                    'id': i,
+                    'name': {1: 'admin', 2: 'public'}.get(i, 'role%04d' % i),
+                    'description': "Generated role %d" % i
+                }
+                for i in range(1, max(scale['roles'], 2) + 1)
+            ])
+            user_ids = [user['id'] for user in users]
+            group_ids = [group['id'] for group in groups]
+            # NOTE: do not assign admin and public roles
+            role_ids = [role['id'] for role in roles][2:] or [2]
+
+            counts['users'] = len(users)
+            counts['groups'] = len(groups)
+            counts['roles'] = len(roles)
+            counts['users_roles'] = len(self.insert(
+                conn, 'users_roles', [{'user_id': 1, 'role_id': 1}] + [
+                    {'user_id': user_id, 'role_id': role_id}
+                    for user_id in user_ids[1:]
+                    for role_id in rnd.sample(role_ids, min(2, len(role_ids)))
+                ]
+            ))
+            counts['groups_users'] = len(self.insert(
+                conn, 'groups_users', [
+                    {'group_id': group_id, 'user_id': user_id}
+                    for user_id in user_ids[1:]
+                    for group_id in rnd.sample(
+                        group_ids, min(3, len(group_ids))
+                    )
+                ]
+            ))
+            counts['groups_roles'] = len(self.insert(
+                conn, 'groups_roles', [
+                    {'group_id': group_id, 'role_id': role_id}
+                    for group_id in group_ids
+                    for role_id in rnd.sample(role_ids, min(3, len(role_ids)))
+                ]
+            ))
+
+            # resources
+            resources = self.generate_resources()
+            counts['resources'] = len(
+                self.insert(conn, 'resources', resources)
+            )
+
+            # permissions
+            # NOTE: random permissions on all resource levels, including
+            #       permissions without effect for permission warnings
+            resource_ids = [resource['id'] for resource in resources]
+            map_ids = [
+                resource['id'] for resource in resources
+                if resource['type'] == 'map'
+            ]
+            permissions = [
+                {
+                    'role_id': 2, 'resource_id': map_id, 'priority': 0,
+                    'write': False
+                }
+                for map_id in map_ids[:len(map_ids) // 2]
+            ]
+            for role_id in role_ids:
+                for resource_id in rnd.sample(
+                    resource_ids,
+                    min(scale['permissions_per_role'], len(resource_ids))
+                ):
+                    permissions.append({
+                        'role_id': role_id, 'resource_id': resource_id,
+                        'priority': rnd.choice([0, 0, 0, 10]),
+                        'write': rnd.random() < 0.2
+                    })
+            for i, permission in enumerate(permissions):
+                permission['id'] = i + 1
+            counts['permissions'] = len(
+                self.insert(conn, 'permissions', permissions)
+            )
+
+            # group registration
+            registrable_groups = self.insert(
+                conn, 'registrable_groups', [
+                    {
+                        'id': i + 1, 'title': "Registrable %d" % group_id,
+                        'description': "Generated registrable group",
+                        'group_id': group_id
+                    }
+                    for i, group_id in enumerate(group_ids[:10])
+                ]
+            )
+            counts['registrable_groups'] = len(registrable_groups)
+            now = datetime.datetime.now()
+            counts['registration_requests'] = len(self.insert(
+                conn, 'registration_requests', [
+                    {
+                        'id': i, 'user_id': rnd.choice(user_ids),
+                        'registrable_group_id': rnd.choice(
+                            registrable_groups
+                        )['id'],
+                        'unsubscribe': rnd.random() < 0.2,
+                        'pending': rnd.random() < 0.5,
+                        'accepted': False,
+                        'created_at': now - datetime.timedelta(minutes=i)
+                    }
+                    for i in range(1, scale['registration_requests'] + 1)
+                ] if registrable_groups else []
+            ))
+
+            self.insert(conn, 'last_update', [{'updated_at': now}])
+
+        return counts
+
+    def generate_resources(self):
+        """Return generated resources as list of dicts, with nested layer
+        groups of 'layer_depth' levels per map.
+        """
+        scale = self.scale
+        resources = []
+
+        def add(type, name, parent_id):
+            resource = {
+                'id': len(resources) + 1, 'type': type, 'name': name,
+                'parent_id': parent_id
+            }
+            resources.append(resource)
+            return resource['id']
+
+        def add_layers(map_id, parent_id, prefix, depth):
+            for i in range(scale['layer_fanout']):
+                name = "%s_%d" % (prefix, i)
+                layer_id = add('layer', name, parent_id)
+                if depth < scale['layer_depth']:
+                    # layer group
+                    add_layers(map_id, layer_id, name, depth + 1)
+                else:
+                    for a in range(scale['attributes']):
+                        add('attribute', 'attr%02d' % a, layer_id)
+
+        for m in range(1, scale['maps'] + 1):
+            map_name = 'map%04d' % m
+            map_id = add('map', map_name, None)
+            add_layers(map_id, map_id, 'layer', 1)
+            for d in range(scale['datasets']):
+                dataset = '%s.dataset%02d' % (map_name, d)
+                for type in ['data', 'data_read', 'data_update']:
+                    add(type, dataset, map_id)
+            add('print_template', 'A4 Landscape', map_id)
+
+        return resources
+
+
+def generate_configdb(db_url, scale, seed=1, reset=False):
+    """Create and fill ConfigDB and return number of rows per table.
+
+    :param str db_url: DB connection URL
+    :param dict scale: Number of records (see SCALES)
+    :param int seed: Random seed
+    :param bool reset: Whether to delete existing records
+    """
+    if db_url.startswith('sqlite'):
+        enable_sqlite_standin()
+    engine = create_engine(db_url)
+    try:
+        generator = ConfigDBGenerator(engine, scale, seed)
+        generator.create_schema()
+        if generator.count_users() > 0:
+            if not reset:
+                raise Exception(
+                    "ConfigDB already contains users, use reset to delete "
+                    "existing records"
+                )
+            generator.reset()
+        return generator.generate()
+    finally:
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        '--db-url', required=True,
+        help="DB connection URL, e.g. sqlite:////tmp/configdb.sqlite"
+    )
+    parser.add_argument(
+        '--reset', action='store_true',
+        help="Delete all existing ConfigDB records"
+    )
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+
+    scale = scale_from_args(args)
+    start = time.perf_counter()
+    counts = generate_configdb(args.db_url, scale, args.seed, args.reset)
+    for table, count in counts.items():
+        print("%-24s %8d" % (table, count))
+    print("Generated in %.1fs" % (time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
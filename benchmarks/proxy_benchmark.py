@@ -0,0 +1,180 @@
+#!/usr/bin/python3
+
+"""Throughput benchmark for the streaming /proxy engine.
+
+Serves a generated payload from a local upstream server and downloads and
+uploads it through the ServiceProxy and through the previous proxy
+implementation (1 KB chunks, buffered request body), both running in a
+local threaded WSGI server.
+
+Usage:
+    uv run benchmarks/proxy_benchmark.py [--size-mb 32] [--rounds 5]
+"""
+
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import os
+import sys
+import threading
+import time
+
+import requests
+from flask import Flask, Response, request, stream_with_context
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from http_client import HttpClient  # noqa: E402
+from service_proxy import ServiceProxy  # noqa: E402
+
+
+def start_upstream(payload):
+    """Start local upstream server and return its base URL.
+
+    :param bytes payload: Response body for GET requests
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            remaining = int(self.headers.get('Content-Length', 0))
+            while remaining > 0:
+                remaining -= len(self.rfile.read(min(remaining, 1 << 20)))
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'OK')
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return "http://127.0.0.1:%d/" % server.server_port
+
+
+def create_app(logger):
+    """Create proxy app with current and legacy proxy routes.
+
+    :param Logger logger: Logger
+    """
+    app = Flask(__name__)
+    config = {}
+    http_client = HttpClient(logger).for_tenant('default', config)
+    service_proxy = ServiceProxy(logger)
+
+    @app.route('/proxy', methods=ServiceProxy.METHODS)
+    def proxy():
+        url = request.args.get('url')
+        if not service_proxy.url_permitted('default', ['^http://127'], url):
+            return Response(status=403)
+        return service_proxy.forward(http_client, url, request, 60)
+
+    @app.route('/legacy_proxy', methods=['GET', 'POST'])
+    def legacy_proxy():
+        url = request.args.get('url')
+        if request.method == 'GET':
+            res = requests.get(url, stream=True, timeout=60)
+        else:
+            headers = {'content-type': request.headers['content-type']}
+            res = requests.post(url, stream=True, timeout=60,
+                                data=request.get_data(), headers=headers)
+        response = Response(
+            stream_with_context(res.iter_content(chunk_size=1024)),
+            status=res.status_code
+        )
+        response.headers['content-type'] = res.headers['content-type']
+        return response
+
+    return app
+
+
+def start_app(app):
+    """Start app in local threaded WSGI server and return its base URL.
+
+    :param Flask app: Proxy app
+    """
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return "http://127.0.0.1:%d" % server.server_port
+
+
+def measure(func, size, rounds):
+    """Return best throughput of rounds in MB/s.
+
+    :param func func: Transfer function
+    :param int size: Transferred bytes per round
+    :param int rounds: Number of rounds
+    """
+    best = None
+    for i in range(rounds):
+        start = time.perf_counter()
+        func()
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return size / best / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        '--size-mb', type=int, default=32, help="Payload size in MB"
+    )
+    parser.add_argument(
+        '--rounds', type=int, default=5, help="Number of rounds per case"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logger = logging.getLogger('proxy_benchmark')
+    # silence request logging of the WSGI server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    size = args.size_mb * 1024 * 1024
+    payload = os.urandom(size)
+    upstream_url = start_upstream(payload)
+    base_url = start_app(create_app(logger))
+
+    client = requests.Session()
+
+    def download(route):
+        def func():
+            res = client.get(
+                base_url + route, params={'url': upstream_url}, stream=True
+            )
+            received = sum(
+                len(chunk) for chunk in res.iter_content(chunk_size=1 << 20)
+            )
+            assert received == size, "Received %d bytes" % received
+        return func
+
+    def upload(route):
+        def func():
+            res = client.post(
+                base_url + route, params={'url': upstream_url},
+                data=payload,
+                headers={'Content-Type': 'application/octet-stream'}
+            )
+            assert res.status_code == 200, "Status %d" % res.status_code
+        return func
+
+    print("Payload: %d MB, best of %d rounds" % (args.size_mb, args.rounds))
+    for name, route in [('legacy', '/legacy_proxy'), ('proxy', '/proxy')]:
+        print("%-8s GET  %8.1f MB/s" % (
+            name, measure(download(route), size, args.rounds)
+        ))
+        print("%-8s POST %8.1f MB/s" % (
+            name, measure(upload(route), size, args.rounds)
+        ))
+
+
+if __name__ == '__main__':
+    main()
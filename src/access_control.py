@@ -1,7 +1,8 @@
-from sqlalchemy import distinct
-from sqlalchemy.sql import text as sql_text, exists
+import threading
+import time
 
-from qwc_services_core.config_models import ConfigModels
+from sqlalchemy import distinct, func
+from sqlalchemy.sql import text as sql_text, exists
 
 
 class AccessControl:
@@ -9,21 +10,37 @@ class AccessControl:
     # name of admin iam.role
     ADMIN_ROLE_NAME = 'admin'
 
+    # default time in seconds to cache admin role decisions
+    DEFAULT_CACHE_TTL = 30
+
     def __init__(self, handler, logger):
         """Constructor
 
-        :param ConfigModels handler: Helper for ORM models
+        :param handler: Tenant config handler
         :param Logger logger: Application logger
         """
         self.handler = handler
         self.logger = logger
 
+        # cached admin role decisions as
+        #   {<tenant>: {
+        #       'updated_at': <last config update>,
+        #       'decisions': {(<username>, <groups>): (<is_admin>, <expiry>)}
+        #   }}
+        self.cache = {}
+        self.lock = threading.Lock()
+
     def is_admin(self, identity):
-        db_engine = self.handler().db_engine()
-        self.config_models = ConfigModels(
-            db_engine, self.handler().conn_str(),
-            qwc_config_schema=self.handler().qwc_config_schema()
-        )
+        """Return whether identity has the admin role.
+
+        Decisions are cached per tenant for 'admin_role_cache_ttl' seconds.
+        Expired decisions are kept as long as the timestamp of the last
+        config change in the ConfigDB has not moved forward.
+
+        :param obj identity: User name or Identity dict
+        """
+        current_handler = self.handler()
+        self.config_models = current_handler.config_models()
 
         # Extract user infos from identity
         if isinstance(identity, dict):
@@ -32,11 +49,72 @@ class AccessControl:
         else:
             username = identity
             groups = []
+
+        ttl = current_handler.config().get(
+            'admin_role_cache_ttl', self.DEFAULT_CACHE_TTL
+        )
+        if ttl <= 0:
+            # cache disabled
+            with self.config_models.session() as session:
+                return self.admin_role_query(username, groups, session)
+
+        tenant = current_handler.tenant
+        key = (username, tuple(sorted(groups or [])))
+        now = time.time()
+
+        tenant_cache = self.cache.get(tenant)
+        if tenant_cache is not None:
+            decision = tenant_cache['decisions'].get(key)
+            if decision is not None and now < decision[1]:
+                # cache hit
+                return decision[0]
+
         with self.config_models.session() as session:
-            admin_role = self.admin_role_query(username, groups, session)
+            updated_at = self.last_config_update(session)
+            with self.lock:
+                tenant_cache = self.cache.get(tenant)
+                if (
+                    tenant_cache is None or
+                    tenant_cache['updated_at'] != updated_at
+                ):
+                    # config has changed, clear cached decisions
+                    tenant_cache = {
+                        'updated_at': updated_at,
+                        'decisions': {}
+                    }
+                    self.cache[tenant] = tenant_cache
+
+            decision = tenant_cache['decisions'].get(key)
+            if decision is not None:
+                # refresh expired decision for unchanged config
+                admin_role = decision[0]
+            else:
+                admin_role = self.admin_role_query(username, groups, session)
+
+        tenant_cache['decisions'][key] = (admin_role, now + ttl)
 
         return admin_role
 
+    def last_config_update(self, session):
+        """Return timestamp of last config change in ConfigDB.
+
+        :param Session session: DB session
+        """
+        LastUpdate = self.config_models.model('last_update')
+        return session.query(func.max(LastUpdate.updated_at)).scalar()
+
+    def invalidate(self, tenant=None):
+        """Clear cached admin role decisions of a tenant,
+        or of all tenants if None.
+
+        :param str tenant: Optional tenant ID
+        """
+        with self.lock:
+            if tenant is None:
+                self.cache = {}
+            else:
+                self.cache.pop(tenant, None)
+
     def admin_role_query(self, username, groups, session):
         """Create base query for all permissions of a user and group.
 
@@ -1,13 +1,21 @@
+import base64
+from contextlib import contextmanager
 import datetime
+import json
 import math
 
-from flask import abort, flash, redirect, render_template, request, url_for
+from flask import abort, flash, jsonify, redirect, render_template, request, \
+    url_for
 from markupsafe import Markup
+from sqlalchemy import and_, case, delete, event, false, func, insert, \
+    inspect, or_, select
 from sqlalchemy.exc import IntegrityError, InternalError
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import text as sql_text
+from sqlalchemy.sql.elements import UnaryExpression
+from sqlalchemy.sql.operators import desc_op
 from wtforms import ValidationError
 
-from qwc_services_core.config_models import ConfigModels
-
 from utils import i18n
 
 
@@ -21,6 +29,14 @@ class Controller:
     PER_PAGE_OPTIONS = [10, 25, 50, 100]
     # default number of resources shown per page
     DEFAULT_PER_PAGE = 10
+    # default max number of rows counted if pagination_count is 'capped'
+    DEFAULT_COUNT_CAP = 10000
+
+    # max number of IDs per IN clause when updating relation collections
+    COLLECTION_CHUNK_SIZE = 1000
+    # default and max number of items per page of JSON search results
+    SEARCH_PER_PAGE = 20
+    SEARCH_MAX_PER_PAGE = 100
 
     def __init__(self, resource_name, base_route, endpoint_suffix,
                  templates_dir, app, handler):
@@ -90,11 +106,8 @@ class Controller:
         config_handler = self.handler()
         self.config = config_handler.config()
 
-        db_engine = config_handler.db_engine()
-        self.config_models = ConfigModels(
-            db_engine, config_handler.conn_str(),
-            qwc_config_schema=config_handler.qwc_config_schema()
-        )
+        # shared models for tenant
+        self.config_models = config_handler.config_models()
 
         self.Group = self.config_models.model('groups')
         self.Permission = self.config_models.model('permissions')
@@ -132,6 +145,241 @@ class Controller:
         """
         return None
 
+    def keyset_columns(self, sort, sort_asc):
+        """Return unique sort order for keyset pagination as list of
+        (column, ascending) tuples, or None if not supported.
+
+        Implement in subclass
+
+        :param str sort: Column name for sorting (None for default order)
+        :param bool sort_asc: Set to sort in ascending order
+        """
+        return None
+
+    def keyset_order(self, order_by, tiebreaker):
+        """Helper to convert an order_by criterion to a list of
+        (column, ascending) tuples for keyset pagination.
+
+        :param object order_by: Single sort column or tuple of sort columns
+                                (as returned by order_by_criterion)
+        :param Column tiebreaker: Unique column appended if missing
+                                  (e.g. primary key)
+        """
+        if type(order_by) is not tuple:
+            order_by = (order_by,)
+
+        columns = []
+        for criterion in order_by:
+            if isinstance(criterion, UnaryExpression) and \
+                    criterion.modifier is desc_op:
+                columns.append((criterion.element, False))
+            else:
+                columns.append((criterion, True))
+
+        if not any(column is tiebreaker for column, asc in columns):
+            columns.append((tiebreaker, True))
+
+        return columns
+
+    def paginate(self, query, sort, sort_asc, page, per_page, filtered):
+        """Return (resources, pagination) for current page of index query.
+
+        Uses keyset pagination if 'pagination_mode' is set to 'keyset' and
+        the controller supports it, otherwise LIMIT/OFFSET pagination.
+
+        :param Query query: Sorted index query
+        :param str sort: Column name for sorting
+        :param bool sort_asc: Set to sort in ascending order
+        :param int page: Page number for offset pagination
+        :param int per_page: Number of resources per page
+        :param bool filtered: Set if any filters are applied to query
+        """
+        num_resources, count_exact = self.index_count(query, filtered)
+        pagination = {
+            'mode': 'offset',
+            'page': page,
+            'num_pages': None,
+            'num_resources': num_resources,
+            'count_exact': count_exact
+        }
+        if num_resources is not None:
+            pagination['num_pages'] = math.ceil(num_resources / per_page)
+
+        columns = None
+        if self.config.get('pagination_mode', 'offset') == 'keyset':
+            columns = self.keyset_columns(sort, sort_asc)
+
+        if columns is None:
+            # LIMIT/OFFSET pagination
+            rows = query.limit(per_page + 1) \
+                .offset((page - 1) * per_page).all()
+            pagination['has_prev'] = page > 1
+            pagination['has_next'] = len(rows) > per_page
+            return rows[:per_page], pagination
+
+        # keyset pagination
+        pagination['mode'] = 'keyset'
+        after = self.decode_cursor(request.args.get('after'), columns)
+        before = self.decode_cursor(request.args.get('before'), columns)
+        forward = before is None
+        cursor = after if forward else before
+
+        query = query.order_by(None).add_columns(*[
+            column.label('keyset_%d' % i)
+            for i, (column, asc) in enumerate(columns)
+        ])
+        if cursor is not None:
+            query = query.filter(
+                self.keyset_filter(columns, cursor, forward)
+            )
+        query = query.order_by(*[
+            column.asc() if asc == forward else column.desc()
+            for column, asc in columns
+        ])
+
+        rows = query.limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if not forward:
+            rows.reverse()
+
+        resources = [row[0] for row in rows]
+        if rows:
+            pagination['prev_cursor'] = self.encode_cursor(rows[0][1:])
+            pagination['next_cursor'] = self.encode_cursor(rows[-1][1:])
+        pagination['has_prev'] = has_more if not forward else \
+            cursor is not None
+        pagination['has_next'] = has_more if forward else True
+
+        return resources, pagination
+
+    def keyset_filter(self, columns, values, forward):
+        """Return filter for rows after (or before) a keyset cursor.
+
+        NULL values are sorted as in PostgreSQL, i.e. last in ascending
+        and first in descending order.
+
+        :param list columns: Sort order as list of (column, ascending)
+        :param list values: Values of sort columns at cursor
+        :param bool forward: Set for rows after cursor, else before cursor
+        """
+        clauses = []
+        for i, (column, asc) in enumerate(columns):
+            # rows with same values in preceding sort columns
+            prefix = [
+                c.is_not_distinct_from(v)
+                for (c, a), v in zip(columns[:i], values[:i])
+            ]
+            value = values[i]
+            if asc == forward:
+                # greater values, then NULLs
+                if value is None:
+                    continue
+                condition = or_(column > value, column.is_(None))
+            else:
+                # NULLs, then smaller values
+                if value is None:
+                    condition = column.isnot(None)
+                else:
+                    condition = column < value
+            clauses.append(and_(*prefix, condition))
+
+        return or_(false(), *clauses)
+
+    def encode_cursor(self, values):
+        """Return opaque keyset cursor for sort column values.
+
+        :param list values: Values of sort columns
+        """
+        data = json.dumps(list(values), default=str, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, cursor, columns):
+        """Return sort column values for a keyset cursor, or None if blank
+        or invalid.
+
+        :param str cursor: Opaque keyset cursor
+        :param list columns: Sort order as list of (column, ascending)
+        """
+        if not cursor:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            if (
+                isinstance(values, list) and len(values) == len(columns) and
+                all(
+                    value is None or
+                    isinstance(value, (str, int, float, bool))
+                    for value in values
+                )
+            ):
+                return values
+        except ValueError:
+            # invalid base64, UTF-8 or JSON
+            pass
+
+        self.logger.warning("Ignoring invalid pagination cursor")
+        return None
+
+    def index_count(self, query, filtered):
+        """Return (count, exact) for index query according to the
+        'pagination_count' config ('exact', 'capped', 'estimate' or 'none').
+
+        :param Query query: Index query
+        :param bool filtered: Set if any filters are applied to query
+        """
+        count_mode = self.config.get('pagination_count', 'exact')
+        if count_mode == 'none':
+            return None, False
+
+        if count_mode == 'estimate' and not filtered:
+            estimate = self.estimated_table_count(query)
+            if estimate is not None:
+                return estimate, False
+            # fall back to capped count
+            count_mode = 'capped'
+
+        if count_mode in ('capped', 'estimate'):
+            cap = self.config.get('pagination_count_cap', self.DEFAULT_COUNT_CAP)
+            subquery = query.order_by(None).limit(cap + 1).subquery()
+            count = query.session.query(func.count()) \
+                .select_from(subquery).scalar()
+            if count > cap:
+                return cap, False
+            return count, True
+
+        return query.count(), True
+
+    def estimated_table_count(self, query):
+        """Return estimated row count of main table of query from PostgreSQL
+        statistics, or None if not available.
+
+        :param Query query: Index query
+        """
+        session = query.session
+        if session.get_bind().dialect.name != 'postgresql':
+            return None
+
+        table = query.column_descriptions[0]['entity'].__table__
+        sql = sql_text("""
+            SELECT c.reltuples::bigint
+            FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = :schema AND c.relname = :table;
+        """)
+        try:
+            estimate = session.execute(
+                sql, {'schema': table.schema, 'table': table.name}
+            ).scalar()
+        except Exception as e:
+            self.logger.warning("Could not get estimated row count: %s" % e)
+            return None
+
+        if estimate is None or estimate < 0:
+            # table has not yet been analyzed
+            return None
+        return estimate
+
     def index(self):
         """Show resources list."""
         self.setup_models()
@@ -163,12 +411,11 @@ class Controller:
 
             # paginate
             page, per_page = self.pagination_args()
-            num_pages = math.ceil(query.count() / per_page)
-            resources = query.limit(per_page).offset((page - 1) * per_page).all()
+            resources, pagination = self.paginate(
+                query, sort, sort_asc, page, per_page, search_text is not None
+            )
 
-            pagination = {
-                'page': page,
-                'num_pages': num_pages,
+            pagination.update({
                 'per_page': per_page,
                 'per_page_options': self.PER_PAGE_OPTIONS,
                 'per_page_default': self.DEFAULT_PER_PAGE,
@@ -176,7 +423,7 @@ class Controller:
                     'search': search_text,
                     'sort': sort_param
                 }
-            }
+            })
 
         return render_template(
             '%s/index.html' % self.templates_dir, resources=resources,
@@ -210,8 +457,9 @@ class Controller:
             try:
                 # create and commit resource
                 with self.session() as session, session.begin():
-                    self.create_or_update_resources(None, form, session)
-                    self.update_config_timestamp(session)
+                    with self.count_statements(session, 'create'):
+                        self.create_or_update_resources(None, form, session)
+                        self.update_config_timestamp(session)
                 flash(i18n('interface.main.new_resource_message_success', [self.resource_name]), 'success')
 
                 return redirect(url_for(self.base_route))
@@ -288,8 +536,11 @@ class Controller:
                 if form.validate_on_submit():
                     try:
                         # update and commit resource
-                        self.create_or_update_resources(resource, form, session)
-                        self.update_config_timestamp(session)
+                        with self.count_statements(session, 'update'):
+                            self.create_or_update_resources(
+                                resource, form, session
+                            )
+                            self.update_config_timestamp(session)
                         flash(i18n('interface.main.update_resource_message_success', [self.resource_name]),
                             'success')
 
@@ -426,10 +677,14 @@ class Controller:
     ):
         """Helper to update collection multi-select field for resource.
 
+        Only the selected relations are loaded as choices, other relations
+        are searched via the JSON search endpoint of the relation model.
+
         :param object resource: Optional resource object for edit (e.g. group)
         :param bool edit_form: Set if edit form
-        :param SelectMultipleField multi_select: MultiSelect for relations
-                                                 (e.g. form.users)
+        :param SearchableSelectMultipleField multi_select: MultiSelect for
+                                                           relations
+                                                           (e.g. form.users)
         :param object relation_model: ConfigModel for relation (e.g. User)
         :param str collection_attr: Collection attribute for resource
                                     (e.g. 'users_collection')
@@ -437,59 +692,249 @@ class Controller:
         :param str name_attr: Name attribute of relation model (e.g. 'name')
         :param Session session: DB session
         """
+        id_column = getattr(relation_model, id_attr)
+        name_column = getattr(relation_model, name_attr)
+
         if edit_form:
             # add collection items for resource on edit
             items = getattr(resource, collection_attr)
             multi_select.data = [
                 getattr(i, id_attr) for i in items
             ]
+            multi_select.choices = [
+                (getattr(i, id_attr), getattr(i, name_attr)) for i in items
+            ]
+        else:
+            # load selected items from DB
+            multi_select.load_choices(id_column, name_column, session)
 
-        # load related resources from DB
-        query = session.query(relation_model). \
-            order_by(getattr(relation_model, name_attr))
-        items = query.all()
-
-        # set choices for collection select field
-        multi_select.choices = [
-            (getattr(i, id_attr), getattr(i, name_attr)) for i in items
-        ]
-
-    def update_collection(self, collection, multi_select, relation_model,
-                          id_attr, session):
+    def update_collection(self, resource, relation_name, multi_select,
+                          relation_model, id_attr, session):
         """Helper to add or remove relations from a resource collection.
 
-        :param object collection: Collection of resource relations
-                                  (e.g. Group.user_collection)
+        The relations are synchronized with set-based statements on the
+        association table instead of loading each related object.
+
+        :param object resource: Resource object (e.g. Group)
+        :param str relation_name: Name of collection relationship
+                                  (e.g. 'users_collection')
         :param SelectMultipleField multi_select: MultiSelect for relations
                                                  (e.g. form.users)
         :param object relation_model: ConfigModel for relation (e.g. User)
         :param str id_attr: ID attribute of relation model (e.g. 'id')
         :param Session session: DB session
         """
-        # lookup for relation of resource
-        resource_relations = {}
-        for relation in collection:
-            resource_relations[relation.id] = relation
-
-        # update relations
-        relation_ids = []
-        for relation_id in multi_select.data:
-            # get relation from ConfigDB
-            filter = {id_attr: relation_id}
-            query = session.query(relation_model).filter_by(**filter)
-            relation = query.first()
-
-            if relation is not None:
-                relation_ids.append(relation_id)
-                if relation_id not in resource_relations:
-                    # add relation to resource
-                    collection.append(relation)
+        relationship = inspect(type(resource)).relationships[relation_name]
+        association = relationship.secondary
+        # columns of association table referencing resource and relation
+        ((resource_key, resource_fk),) = relationship.synchronize_pairs
+        ((relation_key, relation_fk),) = \
+            relationship.secondary_synchronize_pairs
+
+        resource_id = getattr(resource, resource_key.key)
+        if resource_id is None:
+            # flush new resource to get its ID
+            session.flush()
+            resource_id = getattr(resource, resource_key.key)
+
+        # get current relation IDs
+        query = select(relation_fk).where(resource_fk == resource_id)
+        current_ids = set(session.execute(query).scalars())
+
+        # get selected relations existing in ConfigDB
+        relation_column = getattr(relation_model, id_attr)
+        selected_ids = list(set(multi_select.data or []))
+        relation_ids = set()
+        for i in range(0, len(selected_ids), self.COLLECTION_CHUNK_SIZE):
+            chunk = selected_ids[i:i + self.COLLECTION_CHUNK_SIZE]
+            query = select(relation_column).where(relation_column.in_(chunk))
+            relation_ids.update(session.execute(query).scalars())
+
+        # add new relations
+        added_ids = sorted(relation_ids - current_ids)
+        if added_ids:
+            session.execute(
+                insert(association),
+                [
+                    {resource_fk.key: resource_id, relation_fk.key: id}
+                    for id in added_ids
+                ]
+            )
 
         # remove removed relations
-        for relation in resource_relations.values():
-            if relation.id not in relation_ids:
-                # remove relation from resource
-                collection.remove(relation)
+        removed_ids = sorted(current_ids - relation_ids)
+        for i in range(0, len(removed_ids), self.COLLECTION_CHUNK_SIZE):
+            chunk = removed_ids[i:i + self.COLLECTION_CHUNK_SIZE]
+            session.execute(
+                delete(association)
+                .where(resource_fk == resource_id)
+                .where(relation_fk.in_(chunk))
+            )
+
+        if added_ids or removed_ids:
+            # reload collection on next access
+            session.expire(resource, [relation_name])
+
+    @contextmanager
+    def count_statements(self, session, action):
+        """Context manager for logging the number of SQL statements issued
+        on the connection of a DB session.
+
+        :param Session session: DB session
+        :param str action: Action name for log message
+        """
+        stats = {'statements': 0}
+
+        def before_cursor_execute(conn, cursor, statement, parameters,
+                                  context, executemany):
+            stats['statements'] += 1
+
+        connection = session.connection()
+        event.listen(connection, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield stats
+        finally:
+            event.remove(
+                connection, 'before_cursor_execute', before_cursor_execute
+            )
+            self.logger.debug(
+                "%s %s: %d SQL statements" % (
+                    self.resource_name, action, stats['statements']
+                )
+            )
+
+    # search
+
+    def add_search_route(self, app):
+        """Add route for JSON search of resources by name.
+
+        :param Flask app: Flask application
+        """
+        app.add_url_rule(
+            '/%s/search' % self.base_route, 'search_%s' % self.endpoint_suffix,
+            self.search, methods=['GET']
+        )
+
+    def search_columns(self):
+        """Return ID and name columns for JSON search as tuple.
+
+        Implement in subclass
+        """
+        raise NotImplementedError
+
+    def search(self):
+        """Return JSON with page of resources whose name matches the
+        search text, for typeahead selections.
+
+        Names starting with the search text are listed first.
+        """
+        self.setup_models()
+        id_column, name_column = self.search_columns()
+
+        search_text = request.args.get('q', '').strip()
+        page = self.to_int(request.args.get('page'), 1, 1)
+        per_page = self.search_per_page_arg()
+
+        with self.session() as session:
+            query = session.query(id_column, name_column)
+            order_by = []
+            if search_text:
+                query = query.filter(self.name_search_filter(
+                    name_column, search_text
+                ))
+                # list prefix matches first
+                order_by.append(self.prefix_match_order(
+                    name_column, search_text
+                ))
+            order_by += [name_column, id_column]
+
+            # query one additional item to check for a next page
+            query = query.order_by(*order_by) \
+                .offset((page - 1) * per_page).limit(per_page + 1)
+            rows = query.all()
+
+        return jsonify({
+            'items': [
+                {'id': id, 'name': name} for id, name in rows[:per_page]
+            ],
+            'more': len(rows) > per_page
+        })
+
+    def search_per_page_arg(self):
+        """Return request arg for number of JSON search results per page."""
+        return min(
+            self.to_int(request.args.get('per_page'), self.SEARCH_PER_PAGE, 1),
+            self.SEARCH_MAX_PER_PAGE
+        )
+
+    def like_pattern(self, search_text):
+        """Return search text with escaped LIKE wildcards.
+
+        :param str search_text: Search string
+        """
+        return search_text.replace('\\', '\\\\') \
+            .replace('%', '\\%').replace('_', '\\_')
+
+    def name_search_filter(self, name_column, search_text):
+        """Return filter for names containing the search text.
+
+        :param Column name_column: Name column
+        :param str search_text: Search string
+        """
+        return name_column.ilike(
+            '%%%s%%' % self.like_pattern(search_text), escape='\\'
+        )
+
+    def prefix_match_order(self, name_column, search_text):
+        """Return order_by criterion for listing names starting with the
+        search text first.
+
+        :param Column name_column: Name column
+        :param str search_text: Search string
+        """
+        return case(
+            (
+                name_column.ilike(
+                    '%s%%' % self.like_pattern(search_text), escape='\\'
+                ),
+                0
+            ),
+            else_=1
+        )
+
+    def resource_items_query(self, session):
+        """Return query for resource items with (id, type, name, parent name)
+        for resource pickers, ordered by resource type.
+
+        :param Session session: DB session
+        """
+        Parent = aliased(self.Resource)
+        return session.query(
+            self.Resource.id, self.Resource.type, self.Resource.name,
+            Parent.name
+        ).join(self.Resource.resource_types) \
+            .outerjoin(Parent, self.Resource.parent_id == Parent.id)
+
+    def resource_items(self, ids, session):
+        """Return resource picker items for selected resource IDs.
+
+        :param list[int] ids: Resource IDs
+        :param Session session: DB session
+        """
+        ids = [id for id in ids if id]
+        if not ids:
+            return []
+
+        query = self.resource_items_query(session) \
+            .filter(self.Resource.id.in_(ids)) \
+            .order_by(
+                self.ResourceType.list_order, self.Resource.type,
+                self.Resource.name
+            )
+        return [
+            {'id': id, 'type': type, 'name': name, 'parent': parent}
+            for id, type, name, parent in query.all()
+        ]
 
     def search_text_arg(self):
         """Return request arg for search string."""
@@ -15,6 +15,9 @@ class GroupsController(Controller):
             "Group", 'groups', 'group', 'groups', app, handler
         )
 
+        # JSON search
+        self.add_search_route(app)
+
     def resources_for_index_query(self, search_text, session):
         """Return query for groups list.
 
@@ -46,6 +49,22 @@ class GroupsController(Controller):
 
         return order_by
 
+    def keyset_columns(self, sort, sort_asc):
+        """Return unique sort order for keyset pagination.
+
+        :param str sort: Column name for sorting
+        :param bool sort_asc: Set to sort in ascending order
+        """
+        order_by = self.order_by_criterion(sort, sort_asc)
+        if order_by is None:
+            # default order
+            order_by = self.Group.name
+        return self.keyset_order(order_by, self.Group.id)
+
+    def search_columns(self):
+        """Return ID and name columns for JSON search of groups."""
+        return self.Group.id, self.Group.name
+
     def find_resource(self, id, session):
         """Find group by ID.
 
@@ -96,9 +115,9 @@ class GroupsController(Controller):
 
         # update users
         self.update_collection(
-            group.users_collection, form.users, self.User, 'id', session
+            group, 'users_collection', form.users, self.User, 'id', session
         )
         # update roles
         self.update_collection(
-            group.roles_collection, form.roles, self.Role, 'id', session
+            group, 'roles_collection', form.roles, self.Role, 'id', session
         )
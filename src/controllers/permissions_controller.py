@@ -1,9 +1,10 @@
 from collections import OrderedDict
-import math
+import threading
 
 from flask import flash, render_template, request, session as flask_session
 from markupsafe import Markup
-from sqlalchemy.orm import joinedload
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import aliased, joinedload
 
 from .controller import Controller
 from forms import PermissionForm
@@ -24,6 +25,15 @@ class PermissionsController(Controller):
             handler
         )
 
+        # cached warnings for permissions without effect as
+        #   {<tenant>: {
+        #       'updated_at': <last config update>,
+        #       'default_allow_types': <resource types>,
+        #       'warnings': {<permission ID>: <warning or None>}
+        #   }}
+        self.warnings_cache = {}
+        self.warnings_lock = threading.Lock()
+
     def resources_for_index_query(self, search_text, role, resource_type,
                                   resource_id, session):
         """Return query for permissions list filtered by role or resource type.
@@ -59,6 +69,7 @@ class PermissionsController(Controller):
         query = query.options(
             joinedload(self.Permission.role),
             joinedload(self.Permission.resource)
+            .joinedload(self.Resource.parent)
         )
 
         return query
@@ -96,6 +107,18 @@ class PermissionsController(Controller):
 
         return order_by
 
+    def keyset_columns(self, sort, sort_asc):
+        """Return unique sort order for keyset pagination.
+
+        :param str sort: Column name for sorting
+        :param bool sort_asc: Set to sort in ascending order
+        """
+        order_by = self.order_by_criterion(sort, sort_asc)
+        if order_by is None:
+            # default order
+            order_by = (self.Role.name, self.Resource.type, self.Resource.name)
+        return self.keyset_order(order_by, self.Permission.id)
+
     def index(self):
         """Show permissions list."""
         self.setup_models()
@@ -159,8 +182,11 @@ class PermissionsController(Controller):
 
             # paginate
             page, per_page = self.pagination_args(flask_session["permissions"]['params'])
-            num_pages = math.ceil(query.count() / per_page)
-            resources = query.limit(per_page).offset((page - 1) * per_page).all()
+            resources, pagination = self.paginate(
+                query, sort, sort_asc, page, per_page,
+                active_search_text is not None or active_role is not None or
+                active_resource_type is not None or resource_id is not None
+            )
             flask_session["permissions"]['params']['per_page'] = per_page
 
             # Set modified property to True so that the flask_session object
@@ -170,13 +196,11 @@ class PermissionsController(Controller):
             # See https://stackoverflow.com/questions/39261260/flask-session-variable-not-persisting-between-requests/39261335#39261335
             flask_session.modified = True
 
-            pagination = {
-                'page': page,
-                'num_pages': num_pages,
+            pagination.update({
                 'per_page_options': self.PER_PAGE_OPTIONS,
                 'per_page_default': self.DEFAULT_PER_PAGE,
                 'params': flask_session["permissions"]["params"]
-            }
+            })
 
             # query roles
             roles = session.query(self.Role).order_by(self.Role.name).all()
@@ -202,35 +226,30 @@ class PermissionsController(Controller):
                 if resource_type.parent_is_default_allow:
                     parent_default_allow_resources.append(resource_type.name)
 
-            # Create dict with all defined parents from resource objects
-            all_resources = self.resources_for_index_query(
-                None, None, None, resource_id, session
-            ).all()
+            # parent names of listed resources
             parents_dict = {}
-            for res in all_resources:
-                if res.resource.parent is not None and \
-                        res.resource.parent.id not in parents_dict.keys():
-                    parents_dict[res.resource.parent.id] = res.resource.parent.name
+            for res in resources:
+                parent = res.resource.parent
+                if parent is not None:
+                    parents_dict[parent.id] = parent.name
 
             # Warn if role does not have permission on resource parent
-            resource_roles = {}
-            for res in all_resources:
-                resource_roles[res.resource.type + ":" + res.resource.name] = \
-                    resource_roles.get(res.resource.type + ":" + res.resource.name, []) + [res.role.name]
-
+            warnings = self.parent_permission_warnings(
+                [res.id for res in resources], parent_default_allow_resources,
+                session
+            )
             role_warnings = []
-            for res in all_resources:
-                parent = res.resource.parent
-                default_parent_roles = ['public'] if parent is not None and res.resource.type in parent_default_allow_resources else []
-                if parent is not None and \
-                        'public' not in resource_roles.get(parent.type + ":" + parent.name, default_parent_roles) and \
-                        res.role.name not in resource_roles.get(parent.type + ":" + parent.name, default_parent_roles):
+            for res in resources:
+                warning = warnings.get(res.id)
+                if warning is not None:
+                    role_name, resource_type, resource_name, parent_name = \
+                        warning
                     role_warnings.append(
                         (
                             "The permission for role <b>%s</b> on the <b>%s</b> resource <b>%s</b> " +
                             "has no effect because <b>%s</b> has no permission on the " +
                             "parent resource <b>%s</b>."
-                        ) % (res.role.name, res.resource.type, res.resource.name, res.role.name, parent.name)
+                        ) % (role_name, resource_type, resource_name, role_name, parent_name)
                     )
             if role_warnings:
                 flash(Markup("<br />".join(role_warnings)), 'warning')
@@ -245,6 +264,95 @@ class PermissionsController(Controller):
             active_resource_type=active_resource_type, i18n = i18n
         )
 
+    def parent_permission_warnings(self, permission_ids, default_allow_types,
+                                   session):
+        """Return permissions without effect, because their role has no
+        permission on the parent resource, as
+        {<permission ID>: (<role>, <resource type>, <resource>, <parent>)}.
+
+        Permissions on the parent resource are matched by resource type and
+        name. Permissions of the 'public' role apply to all roles. Parents
+        without any permissions are allowed for resource types with
+        'parent_is_default_allow'.
+
+        Results are cached per tenant until the config timestamp changes.
+
+        :param list[int] permission_ids: Permission IDs to check
+        :param list[str] default_allow_types: Resource types whose parent is
+                                              allowed by default
+        :param Session session: DB session
+        """
+        tenant = self.handler().tenant
+        LastUpdate = self.config_models.model('last_update')
+        updated_at = session.query(func.max(LastUpdate.updated_at)).scalar()
+        default_allow_types = tuple(sorted(default_allow_types))
+
+        with self.warnings_lock:
+            tenant_cache = self.warnings_cache.get(tenant)
+            if (
+                tenant_cache is None or
+                tenant_cache['updated_at'] != updated_at or
+                tenant_cache['default_allow_types'] != default_allow_types
+            ):
+                # config has changed, clear cached warnings
+                tenant_cache = {
+                    'updated_at': updated_at,
+                    'default_allow_types': default_allow_types,
+                    'warnings': {}
+                }
+                self.warnings_cache[tenant] = tenant_cache
+            cached_warnings = tenant_cache['warnings']
+
+        missing_ids = [
+            id for id in permission_ids if id not in cached_warnings
+        ]
+        if missing_ids:
+            Parent = aliased(self.Resource)
+            ParentResource = aliased(self.Resource)
+            ParentPermission = aliased(self.Permission)
+            PublicRole = aliased(self.Role)
+
+            # permissions on resources matching the parent resource
+            parent_permissions = select(ParentPermission.id) \
+                .join(
+                    ParentResource,
+                    ParentPermission.resource_id == ParentResource.id
+                ) \
+                .where(ParentResource.type == Parent.type) \
+                .where(ParentResource.name == Parent.name)
+            # parent permissions for the role or the public role
+            role_permissions = parent_permissions \
+                .outerjoin(
+                    PublicRole, and_(
+                        ParentPermission.role_id == PublicRole.id,
+                        PublicRole.name == 'public'
+                    )
+                ) \
+                .where(or_(
+                    ParentPermission.role_id == self.Permission.role_id,
+                    PublicRole.id.isnot(None)
+                ))
+
+            query = session.query(
+                self.Permission.id, self.Role.name, self.Resource.type,
+                self.Resource.name, Parent.name
+            ).join(self.Permission.role).join(self.Permission.resource) \
+                .join(Parent, self.Resource.parent_id == Parent.id) \
+                .filter(self.Permission.id.in_(missing_ids)) \
+                .filter(~role_permissions.exists())
+            if default_allow_types:
+                query = query.filter(or_(
+                    self.Resource.type.notin_(default_allow_types),
+                    parent_permissions.exists()
+                ))
+
+            warnings = dict.fromkeys(missing_ids)
+            for row in query.all():
+                warnings[row[0]] = tuple(row[1:])
+            cached_warnings.update(warnings)
+
+        return dict([(id, cached_warnings.get(id)) for id in permission_ids])
+
     def find_resource(self, id, session):
         """Find permission by ID.
 
@@ -272,24 +380,15 @@ class PermissionsController(Controller):
                 .order_by(self.ResourceType.list_order, self.ResourceType.name)
             resource_types = query.all()
 
-            # query resources
-            query = session.query(self.Resource) \
-                .join(self.Resource.resource_type) \
-                .order_by(self.ResourceType.list_order, self.Resource.type,
-                        self.Resource.name)
-            # eager load relations
-            query = query.options(
-                joinedload(self.Resource.resource_type)
-            )
-            resources = query.all()
+            resource_id = request.args.get('resource_id')
+            if resource_id is not None and resource_id.isdigit():
+                form.resource_id.data = int(resource_id)
 
-            # This small code is needed to make sure that the parent object
-            # of all resources is called at least once before closing the session.
-            # Doing this allows us to call the parent object even after the session
-            # was closed.
-            for res in resources:
-                if res.parent is not None:
-                    res.parent.name
+            # load only selected resource, other resources are searched
+            # on demand
+            form.resource_items = self.resource_items(
+                [form.resource_id.data], session
+            )
 
         # set choices for role select field
         form.role_id.choices = [(0, "")] + [
@@ -303,32 +402,10 @@ class PermissionsController(Controller):
 
         # set choices for resource select field
         form.resource_id.choices = [(0, "")] + [
-            (r.id, "%s: %s" % (r.type, r.name)) for r in resources
+            (r['id'], "%s: %s" % (r['type'], r['name']))
+            for r in form.resource_items
         ]
 
-        resource_id = request.args.get('resource_id')
-        if resource_id is not None and resource_id.isdigit():
-            form.resource_id.data = int(resource_id)
-
-        # set choices for resource select field, grouped by resource type
-        current_type = None
-        group = {}
-        form.resource_choices = []
-        for r in resources:
-            if r.type != current_type:
-                # add new group
-                current_type = r.type
-                group = {
-                    'resource_type': r.type,
-                    'group_label': r.resource_type.description,
-                    'options': []
-                }
-
-                form.resource_choices.append(group)
-
-            # add resource to group
-            group['options'].append((r.id, r.name, r.parent))
-
         return form
 
     def create_or_update_resources(self, resource, form, session):
@@ -1,23 +1,33 @@
 from collections import OrderedDict
-import math
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import json
+import threading
+import time
 from urllib.parse import urljoin
-from operator import itemgetter
 
-from flask import abort, flash, redirect, render_template, request, url_for, session as flask_session
+from flask import abort, flash, jsonify, redirect, render_template, request, url_for, session as flask_session
+from sqlalchemy import delete, func, insert, select, update
 from sqlalchemy.exc import IntegrityError, InternalError
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import aliased, joinedload
 from sqlalchemy.ext.declarative import DeclarativeMeta
 
 from .controller import Controller
 from forms import ImportResourceForm, ResourceForm
+from resource_utils import upsert_resources
 from utils import i18n
 
 
 class ResourcesController(Controller):
     """Controller for resource model"""
 
+    # resource types checked for references in service configs
+    UNUSED_CHECK_TYPES = ["map", "layer", "attribute", "data"]
+    # default time in seconds to cache referenced resources
+    DEFAULT_UNUSED_CACHE_TTL = 60
+    # default max number of concurrent requests when importing all maps
+    DEFAULT_IMPORT_MAX_WORKERS = 4
+
     def __init__(self, app, handler):
         """Constructor
 
@@ -29,9 +39,25 @@ class ResourcesController(Controller):
             handler
         )
 
+        # cached lookup indexes for referenced resources as
+        #   {<tenant>: {
+        #       'index': <lookup index>,
+        #       'etag': <ETag>, 'last_modified': <Last-Modified>,
+        #       'expires': <expiry>
+        #   }}
+        self.referenced_resources_cache = {}
+        self.referenced_resources_lock = threading.Lock()
+
         # add custom routes
         base_route = self.base_route
         suffix = self.endpoint_suffix
+        # JSON search
+        self.add_search_route(app)
+        # unused resources report
+        app.add_url_rule(
+            '/%s/unused' % base_route, 'unused_%s' % suffix,
+            self.unused_resources, methods=['GET']
+        )
         # delete cascaded
         app.add_url_rule(
             '/%s/<int:id>/cascaded' % base_route,
@@ -54,6 +80,11 @@ class ResourcesController(Controller):
             '/%s/import_maps' % base_route, 'import_maps_%s' % suffix,
             self.import_maps, methods=['POST']
         )
+        # import maps and their layers
+        app.add_url_rule(
+            '/%s/import_all' % base_route, 'import_all_%s' % suffix,
+            self.import_all, methods=['POST']
+        )
         # import resource children
         app.add_url_rule(
             '/%s/<int:id>/import_children' % base_route,
@@ -125,6 +156,21 @@ class ResourcesController(Controller):
 
         return order_by
 
+    def keyset_columns(self, sort, sort_asc):
+        """Return unique sort order for keyset pagination.
+
+        :param str sort: Column name for sorting
+        :param bool sort_asc: Set to sort in ascending order
+        """
+        order_by = self.order_by_criterion(sort, sort_asc)
+        if order_by is None:
+            # default order
+            order_by = (
+                self.ResourceType.list_order, self.Resource.type,
+                self.Resource.name, self.Resource.id
+            )
+        return self.keyset_order(order_by, self.Resource.id)
+
     def index(self):
         """Show resources list."""
         self.setup_models()
@@ -180,8 +226,11 @@ class ResourcesController(Controller):
 
             # paginate
             page, per_page = self.pagination_args(flask_session["resources"]['params'])
-            num_pages = math.ceil(query.count() / per_page)
-            resources = query.limit(per_page).offset((page - 1) * per_page).all()
+            resources, pagination = self.paginate(
+                query, sort, sort_asc, page, per_page,
+                active_search_text is not None or
+                active_resource_type is not None
+            )
             flask_session["resources"]['params']['per_page'] = per_page
 
             check_unused = request.args.get('check_unused')
@@ -199,13 +248,11 @@ class ResourcesController(Controller):
             # See https://stackoverflow.com/questions/39261260/flask-session-variable-not-persisting-between-requests/39261335#39261335
             flask_session.modified = True
 
-            pagination = {
-                'page': page,
-                'num_pages': num_pages,
+            pagination.update({
                 'per_page_options': self.PER_PAGE_OPTIONS,
                 'per_page_default': self.DEFAULT_PER_PAGE,
                 'params': flask_session["resources"]["params"]
-            }
+            })
 
             # query resource types
             resource_types = OrderedDict()
@@ -267,10 +314,15 @@ class ResourcesController(Controller):
 
                 try:
                     # delete and commit resource and its children
-                    self.destroy_resource_cascaded(resource, session)
+                    counts = self.destroy_resource_cascaded(resource, session)
                     self.update_config_timestamp(session)
                     flash(
-                        'Resource and its children have been deleted.', 'success'
+                        'Resource and its children have been deleted (%s).' %
+                        ", ".join([
+                            "%d %s" % (count, resource_type)
+                            for resource_type, count in counts.items()
+                        ]),
+                        'success'
                     )
                 except InternalError as e:
                     flash('InternalError: %s' % e.orig, 'error')
@@ -290,17 +342,71 @@ class ResourcesController(Controller):
                 abort(404)
 
     def destroy_resource_cascaded(self, resource, session):
-        """Recursively delete existing resource and its children in DB.
+        """Delete existing resource and all its descendants in DB.
+
+        Returns number of deleted resources per resource type.
 
         :param object resource: Resource object
         :param Session session: DB session
         """
-        # recursively delete child resources (depth first)
-        for child in resource.children:
-            self.destroy_resource_cascaded(child, session)
+        return self.destroy_resources_bulk([resource.id], True, session)
+
+    def destroy_resources_bulk(self, ids, cascaded, session):
+        """Delete resources and their permissions in DB using set-based
+        statements.
+
+        If cascaded, all descendants are deleted as well, otherwise any
+        children are detached from their deleted parent.
+
+        Returns number of deleted resources per resource type as
+        OrderedDict.
+
+        :param list[int] ids: Resource IDs
+        :param bool cascaded: Set to also delete all descendants
+        :param Session session: DB session
+        """
+        Resource = self.Resource
+        if cascaded:
+            # recursively collect IDs of resources and their descendants
+            subtree = select(Resource.id) \
+                .where(Resource.id.in_(ids)) \
+                .cte('subtree', recursive=True)
+            subtree = subtree.union(
+                select(Resource.id)
+                .join(subtree, Resource.parent_id == subtree.c.id)
+            )
+            resource_ids = select(subtree.c.id)
+        else:
+            resource_ids = list(ids)
+
+            # detach children
+            session.execute(
+                update(Resource)
+                .where(Resource.parent_id.in_(resource_ids))
+                .where(Resource.id.notin_(resource_ids))
+                .values(parent_id=None),
+                execution_options={'synchronize_session': False}
+            )
+
+        # count resources per type
+        query = session.query(Resource.type, func.count(Resource.id)) \
+            .filter(Resource.id.in_(resource_ids)) \
+            .group_by(Resource.type) \
+            .order_by(Resource.type)
+        counts = OrderedDict(query.all())
+
+        # delete permissions and resources
+        session.execute(
+            delete(self.Permission)
+            .where(self.Permission.resource_id.in_(resource_ids)),
+            execution_options={'synchronize_session': False}
+        )
+        session.execute(
+            delete(Resource).where(Resource.id.in_(resource_ids)),
+            execution_options={'synchronize_session': False}
+        )
 
-        # delete resource
-        session.delete(resource)
+        return counts
 
     def destroy_multiple(self):
         """Delete selected resources.
@@ -313,32 +419,85 @@ class ResourcesController(Controller):
 
         self.setup_models()
 
-        selected_id_resources = request.form.getlist("resource_checkbox")
+        selected_id_resources = set()
+        for id in request.form.getlist("resource_checkbox"):
+            id = self.to_int(id, None)
+            if id is None:
+                # invalid resource ID
+                abort(404)
+            selected_id_resources.add(id)
 
         with self.session() as session, session.begin():
-            for id in selected_id_resources:
-                # find resource
-                resource = self.find_resource(id, session)
+            # find resources
+            query = session.query(self.Resource.id, self.Resource.name) \
+                .filter(self.Resource.id.in_(selected_id_resources)) \
+                .order_by(self.Resource.id)
+            resources = query.all()
+
+            if len(resources) != len(selected_id_resources):
+                # resource not found
+                abort(404)
 
-                if resource is not None:
-                    try:
-                        # delete and commit resource and its children
-                        self.destroy_resource(resource, session)
-                        self.update_config_timestamp(session)
+            if resources:
+                try:
+                    # delete and commit resources
+                    self.destroy_resources_bulk(
+                        selected_id_resources, False, session
+                    )
+                    self.update_config_timestamp(session)
+                    for id, name in resources:
                         flash(
-                            f"{self.resource_name} '{resource.name}' has been deleted.", 'success'
+                            f"{self.resource_name} '{name}' has been deleted.", 'success'
                         )
-                    except InternalError as e:
-                        flash('InternalError: %s' % e.orig, 'error')
-                    except IntegrityError as e:
-                        flash('IntegrityError: %s' % e.orig, 'error')
+                except InternalError as e:
+                    flash('InternalError: %s' % e.orig, 'error')
+                except IntegrityError as e:
+                    flash('IntegrityError: %s' % e.orig, 'error')
 
-                else:
-                    # resource not found
-                    abort(404)
         # redirect to resources list
         return redirect(url_for(self.base_route))
 
+    def search(self):
+        """Return JSON with page of resources whose name matches the
+        search text, for resource pickers.
+
+        Results can be filtered by resource types with repeated 'type' args.
+        """
+        self.setup_models()
+
+        search_text = request.args.get('q', '').strip()
+        resource_types = request.args.getlist('type')
+        page = self.to_int(request.args.get('page'), 1, 1)
+        per_page = self.search_per_page_arg()
+
+        with self.session() as session:
+            query = self.resource_items_query(session)
+            if resource_types:
+                query = query.filter(self.Resource.type.in_(resource_types))
+            order_by = [self.ResourceType.list_order, self.Resource.type]
+            if search_text:
+                query = query.filter(self.name_search_filter(
+                    self.Resource.name, search_text
+                ))
+                # list prefix matches first
+                order_by.append(self.prefix_match_order(
+                    self.Resource.name, search_text
+                ))
+            order_by += [self.Resource.name, self.Resource.id]
+
+            # query one additional item to check for a next page
+            query = query.order_by(*order_by) \
+                .offset((page - 1) * per_page).limit(per_page + 1)
+            rows = query.all()
+
+        return jsonify({
+            'items': [
+                {'id': id, 'type': type, 'name': name, 'parent': parent}
+                for id, type, name, parent in rows[:per_page]
+            ],
+            'more': len(rows) > per_page
+        })
+
     def create_form(self, resource=None, edit_form=False):
         """Return form with fields loaded from DB.
 
@@ -361,16 +520,11 @@ class ResourcesController(Controller):
                     .order_by(self.ResourceType.list_order, self.ResourceType.name)
             resource_types = query.all()
 
-            # query resources
-            query = session.query(self.Resource) \
-                .join(self.Resource.resource_types) \
-                .order_by(self.ResourceType.list_order, self.Resource.type,
-                        self.Resource.name)
-            # eager load relations
-            query = query.options(
-                joinedload(self.Resource.resource_type)
+            # load only selected parent resource, other resources are
+            # searched on demand
+            form.parent_items = self.resource_items(
+                [form.parent_id.data], session
             )
-            resources = query.all()
 
         # set choices for type select field
         form.type.choices = [
@@ -393,28 +547,10 @@ class ResourcesController(Controller):
 
         # set choices for parent select field
         form.parent_id.choices = [(0, "")] + [
-            (r.id, "%s: %s" % (r.type, r.name)) for r in resources
+            (r['id'], "%s: %s" % (r['type'], r['name']))
+            for r in form.parent_items
         ]
 
-        # set choices for parent select field, grouped by resource type
-        current_type = None
-        group = {}
-        form.parent_choices = []
-        for r in resources:
-            if r.type != current_type:
-                # add new group
-                current_type = r.type
-                group = {
-                    'resource_type': r.type,
-                    'group_label': r.resource_type.description,
-                    'options': []
-                }
-
-                form.parent_choices.append(group)
-
-            # add resource to group
-            group['options'].append((r.id, r.name))
-
         return form
 
     def create_import_form(self):
@@ -486,16 +622,9 @@ class ResourcesController(Controller):
             resource = self.find_resource(id, session)
 
             if resource is not None:
-                # get root resource
-                root = resource
-                parent = root.parent
-                while parent is not None:
-                    root = parent
-                    parent = root.parent
-
-                # recursively collect hierarchy
-                items = []
-                self.collect_resources(root, 0, items, session)
+                # get root resource and collect hierarchy
+                root_id = self.root_resource_id(resource.id, session)
+                items = self.collect_hierarchy(root_id, session)
 
                 # query resource types
                 resource_types = OrderedDict()
@@ -514,44 +643,108 @@ class ResourcesController(Controller):
                 # resource not found
                 abort(404)
 
-    def collect_resources(self, resource, depth, items, session):
-        """Recursively collect resource hierarchy from DB.
+    def root_resource_id(self, id, session):
+        """Return ID of root resource of a resource hierarchy.
 
-        :param object resource: Resource object
-        :param int depth: Hierarchy depth
-        :param list[object] choices: List of collected resources
+        :param int id: Resource ID
         :param Session session: DB session
         """
-        # query resource permissions
-        query = session.query(self.Permission) \
-            .filter(self.Permission.resource_id == resource.id)
-        has_permissions = query.count() > 0
-
-        permissions = []
-        for permission in query.all():
-            permissions.append({
-                "role": permission.role.name,
-                "write": permission.write
+        Resource = self.Resource
+
+        # recursively collect ancestors
+        # NOTE: UNION stops on any cycles in the hierarchy
+        ancestors = session.query(Resource.id, Resource.parent_id) \
+            .filter(Resource.id == id) \
+            .cte('ancestors', recursive=True)
+        ancestors = ancestors.union(
+            session.query(Resource.id, Resource.parent_id)
+            .join(ancestors, Resource.id == ancestors.c.parent_id)
+        )
+
+        root_id = session.query(ancestors.c.id) \
+            .filter(ancestors.c.parent_id.is_(None)).scalar()
+        if root_id is None:
+            # no root found due to cycle
+            root_id = id
+
+        return root_id
+
+    def collect_hierarchy(self, root_id, session):
+        """Collect resource hierarchy from DB in depth first order.
+
+        Returns list of items as {
+            'depth': <hierarchy depth>,
+            'resource': <resource object>,
+            'has_permissions': <whether resource has any permissions>,
+            'permissions': [{'role': <role name>, 'write': <write flag>}]
+        }
+
+        :param int root_id: ID of root resource
+        :param Session session: DB session
+        """
+        Resource = self.Resource
+
+        # recursively collect IDs of root and all its descendants
+        subtree = session.query(Resource.id) \
+            .filter(Resource.id == root_id) \
+            .cte('subtree', recursive=True)
+        subtree = subtree.union(
+            session.query(Resource.id)
+            .join(subtree, Resource.parent_id == subtree.c.id)
+        )
+
+        # query all resources in hierarchy, in sort order of siblings
+        query = session.query(Resource) \
+            .join(subtree, Resource.id == subtree.c.id) \
+            .join(Resource.resource_types) \
+            .order_by(self.ResourceType.list_order, Resource.type,
+                      Resource.name, Resource.id)
+        resources = query.all()
+
+        # query all permissions in hierarchy
+        query = session.query(
+            self.Permission.resource_id, self.Permission.write,
+            self.Role.name
+        ).join(self.Permission.role) \
+            .join(subtree, self.Permission.resource_id == subtree.c.id) \
+            .order_by(self.Permission.id)
+        permissions = {}
+        for resource_id, write, role_name in query.all():
+            permissions.setdefault(resource_id, []).append({
+                "role": role_name,
+                "write": write
             })
 
-        # add resource
-        items.append({
-            'depth': depth,
-            'resource': resource,
-            'has_permissions': has_permissions,
-            'permissions': permissions
-        })
+        # group sorted children by parent
+        root = None
+        children = {}
+        for resource in resources:
+            if resource.id == root_id:
+                root = resource
+            else:
+                children.setdefault(resource.parent_id, []).append(resource)
+
+        items = []
+        if root is None:
+            return items
+
+        # traverse hierarchy depth first
+        stack = [(root, 0)]
+        while stack:
+            resource, depth = stack.pop()
+            resource_permissions = permissions.get(resource.id, [])
+            items.append({
+                'depth': depth,
+                'resource': resource,
+                'has_permissions': len(resource_permissions) > 0,
+                'permissions': resource_permissions
+            })
 
-        # get sorted children
-        query = session.query(self.Resource) \
-            .join(self.Resource.resource_types) \
-            .order_by(self.ResourceType.list_order, self.Resource.type,
-                      self.Resource.name, self.Resource.id) \
-            .filter(self.Resource.parent_id == resource.id)
+            # push children in reverse order to pop them in sort order
+            for child in reversed(children.pop(resource.id, [])):
+                stack.append((child, depth + 1))
 
-        # recursively collect children
-        for child in query.all():
-            self.collect_resources(child, depth + 1, items, session)
+        return items
 
     def import_maps(self):
         """Import map resources."""
@@ -567,7 +760,7 @@ class ResourcesController(Controller):
             url = urljoin(config_generator_service_url, 'maps')
             tenant = self.handler().tenant
             params = {'tenant': tenant, 'use_cached_project_metadata': '1'}
-            response = requests.get(url, params=params)
+            response = self.handler().http_client().get(url, params=params)
             if response.status_code != requests.codes.ok:
                 self.logger.error(
                     "Could not get maps from %s:\n%s" %
@@ -584,23 +777,12 @@ class ResourcesController(Controller):
 
             self.setup_models()
             with self.session() as session, session.begin():
-                # get maps from ConfigDB
-                query = session.query(self.Resource) \
-                    .filter(self.Resource.type == 'map')
-                maps = [
-                    resource.name for resource in query.all()
-                ]
-
                 # add additional maps to ConfigDB
-                new_maps = sorted(list(set(maps_from_config) - set(maps)))
+                new_maps = upsert_resources(self.Resource, [
+                    {'type': 'map', 'name': map_name, 'parent_id': None}
+                    for map_name in sorted(set(maps_from_config))
+                ], session)
                 if new_maps:
-                    for map_name in new_maps:
-                        # create new map resource
-                        resource = self.Resource()
-                        resource.type = 'map'
-                        resource.name = map_name
-                        session.add(resource)
-
                     self.update_config_timestamp(session)
 
                     flash(
@@ -618,98 +800,315 @@ class ResourcesController(Controller):
             flash(msg, 'error')
             return redirect(url_for(self.base_route))
 
+    def import_all(self):
+        """Import map resources and their layers.
+
+        The map details are fetched concurrently from the ConfigGenerator.
+        """
+        # get config generator URL
+        config_generator_service_url = self.handler().config().get(
+            "config_generator_service_url",
+            "http://qwc-config-service:9090"
+        )
+        max_workers = self.handler().config().get(
+            "import_max_workers", self.DEFAULT_IMPORT_MAX_WORKERS
+        )
+        # NOTE: bind HTTP client to tenant outside of worker threads
+        http_client = self.handler().http_client()
+
+        try:
+            # get maps for tenant from config generator service
+            url = urljoin(config_generator_service_url, 'maps')
+            tenant = self.handler().tenant
+            params = {'tenant': tenant, 'use_cached_project_metadata': '1'}
+            response = http_client.get(url, params=params)
+            if response.status_code != requests.codes.ok:
+                self.logger.error(
+                    "Could not get maps from %s:\n%s" %
+                    (response.url, response.content)
+                )
+                flash(
+                    '%s Status %s' %(
+                    i18n('interface.resources.import_maps_message_error'), response.status_code),
+                    'error'
+                )
+                return redirect(url_for(self.base_route))
+
+            maps_from_config = sorted(set(response.json()))
+
+            # get map details concurrently
+            def map_layers(map_name):
+                url = urljoin(
+                    config_generator_service_url, 'maps/%s' % map_name
+                )
+                response = http_client.get(url, params=params)
+                if response.status_code != requests.codes.ok:
+                    self.logger.error(
+                        "Could not get map details from %s:\n%s" %
+                        (response.url, response.content)
+                    )
+                    return None
+                return response.json().get('layers', [])
+
+            with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as pool:
+                layers_from_config = dict(zip(
+                    maps_from_config, pool.map(map_layers, maps_from_config)
+                ))
+
+            self.setup_models()
+            with self.session() as session, session.begin():
+                # add additional maps to ConfigDB
+                new_maps = upsert_resources(self.Resource, [
+                    {'type': 'map', 'name': map_name, 'parent_id': None}
+                    for map_name in maps_from_config
+                ], session)
+
+                # get IDs of all maps
+                query = session.query(self.Resource.name, self.Resource.id) \
+                    .filter(self.Resource.type == 'map') \
+                    .filter(self.Resource.parent_id.is_(None)) \
+                    .order_by(self.Resource.id.desc())
+                map_ids = dict(query.all())
+
+                # add additional layers to ConfigDB
+                new_layers = upsert_resources(self.Resource, [
+                    {
+                        'type': 'layer', 'name': layer,
+                        'parent_id': map_ids[map_name]
+                    }
+                    for map_name in maps_from_config
+                    for layer in layers_from_config[map_name] or []
+                ], session)
+
+                if new_maps or new_layers:
+                    self.update_config_timestamp(session)
+
+            failed_maps = [
+                map_name for map_name in maps_from_config
+                if layers_from_config[map_name] is None
+            ]
+            if failed_maps:
+                flash(
+                    '%s %s' % (
+                    i18n('interface.resources.import_layers_message_error'), ", ".join(failed_maps)),
+                    'error'
+                )
+            if new_maps:
+                flash(
+                    '%d %s' % (
+                    len(new_maps), i18n('interface.resources.add_maps_message_success')),
+                    'success'
+                )
+            elif not new_layers:
+                flash(i18n('interface.resources.add_maps_message_error'), 'info')
+            if new_layers:
+                flash(
+                    '%d %s' % (
+                    len(new_layers), i18n('interface.resources.add_layers_message_success')),
+                    'success'
+                )
+
+            return redirect(url_for(self.base_route, type='map'))
+        except Exception as e:
+            msg = "%s %s" % (i18n('interface.resources.import_maps_message_error'), e)
+            self.logger.error(msg)
+            flash(msg, 'error')
+            return redirect(url_for(self.base_route))
+
+    def upsert_layers(self, map_id, layers, session):
+        """Add missing layer resources of a map and update config timestamp.
+
+        Returns the inserted layers.
+
+        :param int map_id: Map resource ID
+        :param list[str] layers: Layer names
+        :param Session session: DB session
+        """
+        new_layers = upsert_resources(self.Resource, [
+            {'type': 'layer', 'name': layer, 'parent_id': map_id}
+            for layer in sorted(set(layers))
+        ], session)
+        if new_layers:
+            self.update_config_timestamp(session)
+
+        return new_layers
+
     def _check_unused_resources(self, resources):
         """Check for unreferenced resources."""
+        index = self.referenced_resources_index()
+
+        for res in resources:
+            parent_name = res.parent.name if res.parent is not None else None
+            res.not_referenced = not self.resource_referenced(
+                index, res.type, res.name, parent_name
+            )
+
+            if res.not_referenced:
+                self.logger.info("Unreferenced resource: %s" % json.dumps(
+                    res, cls=AlchemyEncoder))
+
+    def unused_resources(self):
+        """Return JSON with all resources not referenced in any service
+        config.
+        """
+        self.setup_models()
+        index = self.referenced_resources_index()
+
+        unused = []
+        with self.session() as session:
+            Parent = aliased(self.Resource)
+            query = session.query(
+                self.Resource.id, self.Resource.type, self.Resource.name,
+                Parent.name
+            ).outerjoin(Parent, self.Resource.parent_id == Parent.id) \
+                .filter(self.Resource.type.in_(self.UNUSED_CHECK_TYPES)) \
+                .order_by(self.Resource.type, self.Resource.name,
+                          self.Resource.id) \
+                .execution_options(yield_per=1000)
+            for id, type, name, parent_name in query:
+                if not self.resource_referenced(index, type, name, parent_name):
+                    unused.append({
+                        'id': id, 'type': type, 'name': name,
+                        'parent': parent_name
+                    })
+
+        return jsonify({'resources': unused, 'count': len(unused)})
+
+    def resource_referenced(self, index, type, name, parent_name):
+        """Return whether a resource is referenced in the lookup index of
+        resources from the service configs.
+
+        Resource types other than maps, layers, data and attributes are
+        always considered referenced.
+
+        :param dict index: Lookup index of referenced resources
+        :param str type: Resource type
+        :param str name: Resource name
+        :param str parent_name: Name of parent resource (None if no parent)
+        """
+        if type == "map":
+            return name in index['maps']
+        elif type not in self.UNUSED_CHECK_TYPES:
+            # resources are marked as referenced per default,
+            # if we don't check them
+            return True
+        elif parent_name is None:
+            # parent does not exist -> resource is not referenced
+            return False
+        elif "*" in name and parent_name in index['maps']:
+            # wildcard resource in referenced map
+            return True
+        elif type in ["layer", "data"]:
+            # layer of parent map
+            return name in index['map_layers'].get(parent_name, ())
+        else:
+            # attribute of parent layer in any map
+            return name in index['layer_attributes'].get(parent_name, ())
+
+    def referenced_resources_index(self):
+        """Return lookup index of resources referenced in the service
+        configs, as
+            {
+                'maps': {<map>},
+                'map_layers': {<map>: {<layer>}},
+                'layer_attributes': {<layer>: {<attribute>}}
+            }
+
+        The resources are fetched from the ConfigGenerator and the index is
+        cached per tenant. It is revalidated using the ETag or Last-Modified
+        headers of the ConfigGenerator response after
+        'unused_resources_cache_ttl' seconds.
+        """
+        tenant = self.handler().tenant
+        ttl = self.handler().config().get(
+            "unused_resources_cache_ttl", self.DEFAULT_UNUSED_CACHE_TTL
+        )
+
+        entry = self.referenced_resources_cache.get(tenant)
+        if entry is not None and time.time() < entry['expires']:
+            # cache hit
+            return entry['index']
+
         # get config generator URL
         config_generator_service_url = self.handler().config().get(
             "config_generator_service_url",
             "http://qwc-config-service:9090"
         )
         url = urljoin(config_generator_service_url, "resources")
-        tenant = self.handler().tenant
         params = {'tenant': tenant, 'use_cached_project_metadata': '1'}
-        response = requests.get(url, params=params)
-        if response.status_code != requests.codes.ok:
+        headers = {}
+        if entry is not None:
+            # revalidate cached resources
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = self.handler().http_client().get(
+            url, params=params, headers=headers
+        )
+        if (
+            response.status_code == requests.codes.not_modified and
+            entry is not None
+        ):
+            self.logger.debug("Referenced resources not modified")
+            index = entry['index']
+        elif response.status_code != requests.codes.ok:
             self.logger.error(
                 "Could not get all resources from %s:\n%s" %
                 (response.url, response.content)
             )
-            resources_from_config = []
+            # do not cache failed requests
+            return self.build_referenced_resources_index([])
         else:
             # List of resources that are referenced somewhere in the config of
             # a service
             resources_from_config = response.json()
+            self.logger.debug(
+                "resources_from_config: %s" % resources_from_config
+            )
+            index = self.build_referenced_resources_index(
+                resources_from_config
+            )
 
-        self.logger.debug("resources_from_config: %s" % resources_from_config)
-        maps_from_config = list(map(itemgetter('map'), resources_from_config))
+        with self.referenced_resources_lock:
+            self.referenced_resources_cache[tenant] = {
+                'index': index,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'expires': time.time() + ttl
+            }
 
-        # Iterate over all registered resources and
-        # check whether they are referenced in a service config or not
+        return index
 
-        # resources_from_config is a dict with all maps and their
-        # layers(and attributes) that the ConfigGenerator sees.
+    def build_referenced_resources_index(self, resources_from_config):
+        """Return lookup index for resources from the ConfigGenerator.
 
-        for res in resources:
-            if res.type == "map":
-                if res.name not in maps_from_config:
-                    res.not_referenced = True
-
-                continue
-            elif res.type in ["layer", "attribute", "data"]:
-                # Check if parent exists --> If not, then resource is not referenced
-                if res.parent is None:
-                    res.not_referenced = True
-                else:
-                    # Iterate over all resources found in the config
-                    res.not_referenced = True
-                    for resource in resources_from_config:
-                        # data and layer types are handled the same
-
-                        # When iterating over the `resources_from_config` list,
-                        # the existance of the `res` resource will be checked in all maps.
-                        # This means that when have found the resource in a map, this loop should end.
-                        if res.not_referenced == False:
-                            break
-
-                        # Check whether the resource parent is referenced
-                        if "*" in res.name and res.parent.name in maps_from_config:
-                            res.not_referenced = False
-                            continue
-                        elif (res.type == "data" or res.type == "layer") and \
-                            res.parent.name in maps_from_config and \
-                                resource["map"] == res.parent.name:
-
-                            # Here we use generator comprehension to boost the
-                            # performance
-                            res.not_referenced = next(
-                                (False for layer in resource[
-                                    "layers"] if res.name in layer.keys()),
-                                True)
-                            # Stop here, because we iterated over
-                            # the maps(parent) resources and didn't find
-                            # any reference
-                            continue
-
-                        elif res.type == "attribute":
-                            # Here we use generator comprehension to boost the
-                            # performance
-                            # What we do here is we iterate over the layers list and check the following
-                            # - Is the resources parent (which is a layer) in the layers list?
-                            # - Does the corresponding layer attribute list contain the resource name?
-                            res.not_referenced = next(
-                                (False for layer in resource["layers"] if res.parent.name in layer.keys() \
-                                    and res.name in list(layer.values())[0]), True)
-                            # Stop here, because we iterated over
-                            # the maps(parent) resources and didn't find
-                            # any reference
-                            continue
-            else:
-                # Resources are marked as referenced per default, if we don't check them
-                res.not_referenced = False
-
-            if res.not_referenced:
-                self.logger.info("Unreferenced resource: %s" % json.dumps(
-                    res, cls=AlchemyEncoder))
+        :param list resources_from_config: Maps with their layers and
+                                           attributes as
+                                           [{'map': <map>, 'layers': [
+                                           {<layer>: [<attribute>]}]}]
+        """
+        maps = set()
+        map_layers = {}
+        layer_attributes = {}
+        for resource in resources_from_config:
+            map_name = resource['map']
+            maps.add(map_name)
+            layers = map_layers.setdefault(map_name, set())
+            for layer in resource.get('layers') or []:
+                layers.update(layer.keys())
+                # attributes are listed in the first layer value
+                attributes = next(iter(layer.values()), None) or []
+                for layer_name in layer.keys():
+                    layer_attributes.setdefault(layer_name, set()) \
+                        .update(attributes)
+
+        return {
+            'maps': maps,
+            'map_layers': map_layers,
+            'layer_attributes': layer_attributes
+        }
 
     def import_children(self, id):
         """Import child resources for a resource:
@@ -761,7 +1160,7 @@ class ResourcesController(Controller):
             )
             tenant = self.handler().tenant
             params = {'tenant': tenant, 'use_cached_project_metadata': '1'}
-            response = requests.get(url, params=params)
+            response = self.handler().http_client().get(url, params=params)
             if response.status_code != requests.codes.ok:
                 self.logger.error(
                     "Could not get map details from %s:\n%s" %
@@ -776,41 +1175,15 @@ class ResourcesController(Controller):
             layers_from_config = response.json().get('layers', [])
 
             if layers_from_config:
-                # get map layers from ConfigDB
-                query = session.query(self.Resource) \
-                    .filter(self.Resource.type == 'layer') \
-                    .filter(self.Resource.parent_id == map_resource.id)
-                layers = [
-                    resource.name for resource in query.all()
-                ]
-
                 # add additional layers to ConfigDB
-                new_layers = sorted(
-                    list(set(layers_from_config) - set(layers))
+                new_layers = self.upsert_layers(
+                    map_resource.id, layers_from_config, session
                 )
                 if new_layers:
-                    imported_layers = 0
-                    for layer in new_layers:
-                        try:
-                            # create new layer resource
-                            resource = self.Resource()
-                            resource.type = 'layer'
-                            resource.name = layer
-                            resource.parent_id = map_resource.id
-                            session.add(resource)
-
-                            self.update_config_timestamp(session)
-                            imported_layers += 1
-                        except Exception as e:
-                            msg = f"{i18n('interface.resources.import_layer_message_error', layer)} - {e}"
-                            self.logger.error(msg)
-                            flash(msg, 'error')
-
-                    if imported_layers > 0:
-                        flash(
-                            '%d %s' %(
-                            len(new_layers), i18n('interface.resources.add_layers_message_success')), 'success'
-                        )
+                    flash(
+                        '%d %s' %(
+                        len(new_layers), i18n('interface.resources.add_layers_message_success')), 'success'
+                    )
                 else:
                     flash(i18n('interface.resources.add_layers_map_message_error'), 'info')
             else:
@@ -865,7 +1238,7 @@ class ResourcesController(Controller):
                         )
                         tenant = self.handler().tenant
                         params = {'tenant': tenant, 'use_cached_project_metadata': '1'}
-                        response = requests.get(url, params=params)
+                        response = self.handler().http_client().get(url, params=params)
                         if response.status_code != requests.codes.ok:
                             self.logger.error(
                                 "Could not get map details from %s:\n%s" %
@@ -880,85 +1253,51 @@ class ResourcesController(Controller):
                         layers_from_config = response.json().get('layers', [])
 
                         if layers_from_config:
-                            new_resources = []
-                            new_permissions = []
-                            for layer in layers_from_config:
-                                try:
-                                    with self.session() as session, session.begin():
-                                        # first query to know if resource already exists
-                                        query = session.query(self.Resource) \
-                                            .filter(self.Resource.name == layer) \
-                                            .filter(self.Resource.type == type) \
-                                            .filter(self.Resource.parent_id == parent_resource.id)
-                                        resources = query.all()
-
-                                        if not resources:
-                                            # resource does not exist in database so create new resource
-                                            resource = self.Resource()
-                                            resource.type = type
-                                            resource.name = layer
-                                            resource.parent_id = parent_resource.id
-                                            new_resources.append(resource)
-                                            session.add(resource)
-
-                                            # new query to get id of new resource
-                                            query = session.query(self.Resource) \
-                                                .filter(self.Resource.name == layer) \
-                                                .filter(self.Resource.type == type) \
-                                                .filter(self.Resource.parent_id == parent_resource.id)
-                                            resources = query.all()
-
-                                        # handle permission for existing or new resource if role has been chosen
-                                        role = form.role_id.data
-                                        if role > 0:
-                                            for resource in resources:
-                                                resource_id = resource.__dict__.get('id')
-                                                # query resource permissions
-                                                query = session.query(self.Permission) \
-                                                    .filter(self.Permission.resource_id == resource_id) \
-                                                    .filter(self.Permission.role_id == role)
-
-                                                permissions = []
-                                                for permission in query.all():
-                                                    permissions.append({
-                                                        "role": permission.role.name,
-                                                        "write": permission.write
-                                                    })
-                                                if not permissions:
-                                                    # create new permission for resource
-                                                    permission = self.Permission()
-                                                    session.add(permission)
-
-                                                    # update permission
-                                                    permission.priority = form.priority.data
-                                                    permission.write = form.write.data
-
-                                                    permission.role_id = role
-
-                                                    permission.resource_id = resource_id
-                                                    new_permissions.append(permission)                                
-
-                                        self.update_config_timestamp(session)
-                                except Exception as e:
-                                    msg = f"{i18n('interface.resources.add_resource_message_error', layer)} - {e}"
-                                    self.logger.error(msg)
-                                    flash(msg, 'error')                                    
-                            if new_resources:
-                                flash(
-                                    '%d %s' % (
-                                    len(new_resources), i18n('interface.resources.add_resources_message_success')), 
-                                    'success'
+                            # import all layers in one transaction
+                            with self.session() as session, session.begin():
+                                result = self.bulk_import_children(
+                                    parent_resource.id, type,
+                                    layers_from_config, form.role_id.data,
+                                    form.priority.data, form.write.data,
+                                    form.dry_run.data, session
                                 )
-                            else:
-                                flash(i18n('interface.resources.add_resources_message_error'), 'info')
 
-                            if new_permissions:
+                            if form.dry_run.data:
                                 flash(
-                                    '%d %s' % (
-                                    len(new_permissions), i18n('interface.resources.add_permissions_message_success')), 'success'
+                                    i18n(
+                                        'interface.resources.import_dry_run_message', [
+                                            result['created'], result['skipped'],
+                                            result['permissions_created']
+                                        ]
+                                    ),
+                                    'info'
                                 )
                             else:
-                                flash(i18n('interface.resources.add_permissions_message_error'), 'info')
+                                if result['created']:
+                                    flash(
+                                        '%d %s' % (
+                                        result['created'], i18n('interface.resources.add_resources_message_success')),
+                                        'success'
+                                    )
+                                else:
+                                    flash(i18n('interface.resources.add_resources_message_error'), 'info')
+
+                                if result['skipped']:
+                                    flash(
+                                        i18n(
+                                            'interface.resources.import_skipped_message',
+                                            [result['skipped']]
+                                        ),
+                                        'info'
+                                    )
+
+                                if result['permissions_created']:
+                                    flash(
+                                        '%d %s' % (
+                                        result['permissions_created'], i18n('interface.resources.add_permissions_message_success')), 'success'
+                                    )
+                                else:
+                                    flash(i18n('interface.resources.add_permissions_message_error'), 'info')
                         else:
                             # map not found or no layers
                             flash(i18n('interface.resources.add_layers_map_message_error'), 'warning')
@@ -989,6 +1328,94 @@ class ResourcesController(Controller):
                 url_for(self.base_route)
             )
 
+    def bulk_import_children(self, parent_id, type, names, role_id,
+                             priority, write, dry_run, session):
+        """Create missing child resources of a parent resource and their
+        permissions for a role, using multi-row INSERT statements.
+
+        Existing children are looked up in a single query. Returns the
+        number of created and skipped resources and permissions as dict.
+
+        :param int parent_id: Parent resource ID
+        :param str type: Resource type of children
+        :param list[str] names: Names of child resources
+        :param int role_id: Role ID for permissions (0 for no permissions)
+        :param int priority: Permission priority
+        :param bool write: Write permission
+        :param bool dry_run: Set to only count changes without writing
+        :param Session session: DB session
+        """
+        # unique names in original order
+        names = list(OrderedDict.fromkeys(names))
+
+        # find existing children as {<name>: [<resource IDs>]}
+        existing = {}
+        for i in range(0, len(names), self.COLLECTION_CHUNK_SIZE):
+            chunk = names[i:i + self.COLLECTION_CHUNK_SIZE]
+            query = session.query(self.Resource.name, self.Resource.id) \
+                .filter(self.Resource.parent_id == parent_id) \
+                .filter(self.Resource.type == type) \
+                .filter(self.Resource.name.in_(chunk))
+            for name, id in query.all():
+                existing.setdefault(name, []).append(id)
+        missing_names = [name for name in names if name not in existing]
+        existing_ids = [id for ids in existing.values() for id in ids]
+
+        # find existing permissions of role
+        permitted_ids = set()
+        if role_id:
+            for i in range(0, len(existing_ids), self.COLLECTION_CHUNK_SIZE):
+                chunk = existing_ids[i:i + self.COLLECTION_CHUNK_SIZE]
+                query = session.query(self.Permission.resource_id) \
+                    .filter(self.Permission.role_id == role_id) \
+                    .filter(self.Permission.resource_id.in_(chunk))
+                permitted_ids.update(id for id, in query.all())
+
+        result = {
+            'created': len(missing_names),
+            'skipped': len(existing),
+            'permissions_created': 0,
+            'permissions_skipped': len(permitted_ids)
+        }
+        if role_id:
+            result['permissions_created'] = \
+                len(missing_names) + len(existing_ids) - len(permitted_ids)
+
+        if dry_run:
+            return result
+
+        # create missing resources
+        resource_ids = [
+            id for id in existing_ids if id not in permitted_ids
+        ]
+        resources_table = self.Resource.__table__
+        for i in range(0, len(missing_names), self.COLLECTION_CHUNK_SIZE):
+            chunk = missing_names[i:i + self.COLLECTION_CHUNK_SIZE]
+            statement = insert(resources_table).values([
+                {'type': type, 'name': name, 'parent_id': parent_id}
+                for name in chunk
+            ]).returning(resources_table.c.id)
+            resource_ids += session.execute(statement).scalars().all()
+
+        # create missing permissions
+        if role_id:
+            permissions_table = self.Permission.__table__
+            for i in range(0, len(resource_ids), self.COLLECTION_CHUNK_SIZE):
+                chunk = resource_ids[i:i + self.COLLECTION_CHUNK_SIZE]
+                session.execute(insert(permissions_table).values([
+                    {
+                        'role_id': role_id, 'resource_id': resource_id,
+                        'priority': priority, 'write': write
+                    }
+                    for resource_id in chunk
+                ]))
+
+        if result['created'] or result['permissions_created']:
+            self.update_config_timestamp(session)
+
+        return result
+
+
 class AlchemyEncoder(json.JSONEncoder):
 
     def default(self, obj):
@@ -21,6 +21,9 @@ class RolesController(Controller):
             "Role", 'roles', 'role', 'roles', app, handler
         )
 
+        # JSON search
+        self.add_search_route(app)
+
     def resources_for_index_query(self, search_text, session):
         """Return query for roles list.
 
@@ -52,6 +55,22 @@ class RolesController(Controller):
 
         return order_by
 
+    def keyset_columns(self, sort, sort_asc):
+        """Return unique sort order for keyset pagination.
+
+        :param str sort: Column name for sorting
+        :param bool sort_asc: Set to sort in ascending order
+        """
+        order_by = self.order_by_criterion(sort, sort_asc)
+        if order_by is None:
+            # default order
+            order_by = self.Role.name
+        return self.keyset_order(order_by, self.Role.id)
+
+    def search_columns(self):
+        """Return ID and name columns for JSON search of roles."""
+        return self.Role.id, self.Role.name
+
     def find_resource(self, id, session):
         """Find role by ID.
 
@@ -105,11 +124,11 @@ class RolesController(Controller):
 
         # update groups
         self.update_collection(
-            role.groups_collection, form.groups, self.Group, 'id', session
+            role, 'groups_collection', form.groups, self.Group, 'id', session
         )
         # update users
         self.update_collection(
-            role.users_collection, form.users, self.User, 'id', session
+            role, 'users_collection', form.users, self.User, 'id', session
         )
 
     def destroy_resource(self, resource, session):
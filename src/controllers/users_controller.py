@@ -23,6 +23,9 @@ class UsersController(Controller):
             "User", 'users', 'user', 'users', app, handler
         )
 
+        # JSON search
+        self.add_search_route(app)
+
         self.mail = mail
 
         # send mail
@@ -62,6 +65,22 @@ class UsersController(Controller):
 
         return order_by
 
+    def keyset_columns(self, sort, sort_asc):
+        """Return unique sort order for keyset pagination.
+
+        :param str sort: Column name for sorting
+        :param bool sort_asc: Set to sort in ascending order
+        """
+        order_by = self.order_by_criterion(sort, sort_asc)
+        if order_by is None:
+            # default order
+            order_by = self.User.name
+        return self.keyset_order(order_by, self.User.id)
+
+    def search_columns(self):
+        """Return ID and name columns for JSON search of users."""
+        return self.User.id, self.User.name
+
     def find_resource(self, id, session):
         """Find user by ID.
 
@@ -171,11 +190,11 @@ class UsersController(Controller):
 
         # update groups
         self.update_collection(
-            user.groups_collection, form.groups, self.Group, 'id', session
+            user, 'groups_collection', form.groups, self.Group, 'id', session
         )
         # update roles
         self.update_collection(
-            user.roles_collection, form.roles, self.Role, 'id', session
+            user, 'roles_collection', form.roles, self.Role, 'id', session
         )
 
         if set_random_password_send_invite:
@@ -15,19 +15,19 @@ class PermissionForm(FlaskForm):
     resource_id = SelectField(
         i18n('interface.common.resource'), coerce=int, validators=[DataRequired()]
     )
-    """ list of resource choices grouped by resource type
+    """ list with selected resource, other resources are loaded from the
+        JSON resource search
 
-        resource_choices = [
+        resource_items = [
             {
-                'resource_type': '<resource type>',
-                'group_label': '<resource type description>',
-                'options': [
-                    (<resource ID>, '<resource name>')
-                ]
+                'id': <resource ID>,
+                'type': '<resource type>',
+                'name': '<resource name>',
+                'parent': '<parent resource name>'
             }
         ]
     """
-    resource_choices = []
+    resource_items = []
     priority = IntegerField(
         i18n('interface.common.form_priority'),
         validators=[
@@ -11,19 +11,19 @@ class ResourceForm(FlaskForm):
     parent_id = SelectField(
         i18n('interface.resources.parent_resource'), coerce=int, validators=[Optional()]
     )
-    """ list of parent choices grouped by resource type
+    """ list with selected parent resource, other parent resources are
+        loaded from the JSON resource search
 
-        parent_choices = [
+        parent_items = [
             {
-                'resource_type': '<resource type>',
-                'group_label': '<resource type description>',
-                'options': [
-                    (<resource ID>, '<resource name>')
-                ]
+                'id': <resource ID>,
+                'type': '<resource type>',
+                'name': '<resource name>',
+                'parent': '<parent resource name>'
             }
         ]
     """
-    parent_choices = []
+    parent_items = []
 
     submit = SubmitField(i18n('interface.common.form_submit'))
 
@@ -39,3 +39,4 @@ class ImportResourceForm(FlaskForm):
         ]
     )
     write = BooleanField(i18n('interface.resources.form_write'))
+    dry_run = BooleanField(i18n('interface.resources.form_dry_run'))
@@ -1,21 +1,22 @@
 from flask_wtf import FlaskForm
-from wtforms import SelectMultipleField, StringField, SubmitField, \
+from wtforms import StringField, SubmitField, \
     TextAreaField, ValidationError
 from wtforms.validators import DataRequired, Optional
 from utils import i18n
+from .searchable_select_multiple_field import SearchableSelectMultipleField
 
 
 class RoleForm(FlaskForm):
     """Main form for Role GUI"""
     name = StringField(i18n('interface.common.name'), validators=[DataRequired()])
     description = TextAreaField(i18n('interface.common.description'), validators=[Optional()])
-    groups = SelectMultipleField(
+    groups = SearchableSelectMultipleField(
         i18n('interface.common.assigned_groups'),
-        coerce=int, validators=[Optional()]
+        coerce=int, validators=[Optional()], search_endpoint='search_group'
     )
-    users = SelectMultipleField(
+    users = SearchableSelectMultipleField(
         i18n('interface.common.assigned_users'),
-        coerce=int, validators=[Optional()]
+        coerce=int, validators=[Optional()], search_endpoint='search_user'
     )
 
     submit = SubmitField(i18n('interface.common.form_submit'))
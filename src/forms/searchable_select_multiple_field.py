@@ -0,0 +1,49 @@
+from flask import url_for
+from wtforms import SelectMultipleField
+
+
+class SearchableSelectMultipleField(SelectMultipleField):
+    """Multi-select field for large relation tables.
+
+    Only the selected items are loaded as choices, other items are searched
+    on demand via the JSON search endpoint of the relation model.
+    """
+
+    def __init__(self, label=None, validators=None, search_endpoint=None,
+                 **kwargs):
+        """Constructor
+
+        :param str label: Field label
+        :param list validators: Field validators
+        :param str search_endpoint: Endpoint of JSON search for relation
+                                    model (e.g. 'search_user')
+        """
+        super(SearchableSelectMultipleField, self).__init__(
+            label, validators, **kwargs
+        )
+        self.search_endpoint = search_endpoint
+
+    def load_choices(self, id_column, name_column, session):
+        """Set choices to the items of the selected IDs, using a single
+        lookup query.
+
+        Selected IDs missing in the DB are not added to the choices and
+        will fail validation.
+
+        :param Column id_column: ID column of relation model
+        :param Column name_column: Name column of relation model
+        :param Session session: DB session
+        """
+        ids = [id for id in (self.data or []) if isinstance(id, int)]
+        if ids:
+            query = session.query(id_column, name_column) \
+                .filter(id_column.in_(ids)) \
+                .order_by(name_column)
+            self.choices = [(id, name) for id, name in query.all()]
+        else:
+            self.choices = []
+
+    def __call__(self, **kwargs):
+        if self.search_endpoint:
+            kwargs.setdefault('data-search-url', url_for(self.search_endpoint))
+        return super(SearchableSelectMultipleField, self).__call__(**kwargs)
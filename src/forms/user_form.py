@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from wtforms import FormField, IntegerField, SelectField, SelectMultipleField, \
+from wtforms import FormField, IntegerField, SelectField, \
     StringField, SubmitField, TextAreaField, ValidationError, PasswordField, \
     BooleanField
 from wtforms.validators import DataRequired, Optional, Email, EqualTo, \
@@ -7,6 +7,7 @@ from wtforms.validators import DataRequired, Optional, Email, EqualTo, \
 from wtforms.widgets import NumberInput
 
 from utils import i18n
+from .searchable_select_multiple_field import SearchableSelectMultipleField
 
 
 class UserForm(FlaskForm):
@@ -38,13 +39,13 @@ class UserForm(FlaskForm):
         ]
     )
 
-    groups = SelectMultipleField(
+    groups = SearchableSelectMultipleField(
         i18n('interface.common.assigned_groups'),
-        coerce=int, validators=[Optional()]
+        coerce=int, validators=[Optional()], search_endpoint='search_group'
     )
-    roles = SelectMultipleField(
+    roles = SearchableSelectMultipleField(
         i18n('interface.common.assigned_roles'),
-        coerce=int, validators=[Optional()]
+        coerce=int, validators=[Optional()], search_endpoint='search_role'
     )
 
     submit = SubmitField(i18n('interface.common.form_submit'))
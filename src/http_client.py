@@ -0,0 +1,292 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class HttpClient:
+    """Shared HTTP client for requests to upstream services.
+
+    Connections are pooled and kept alive per upstream host, with one
+    requests session per tenant and client settings. Idempotent requests
+    are retried with exponential backoff on connection errors and gateway
+    errors. Latency and errors are recorded per upstream.
+    """
+
+    # default timeout in seconds for establishing a connection
+    DEFAULT_CONNECT_TIMEOUT = 10
+    # default timeout in seconds between bytes received
+    DEFAULT_READ_TIMEOUT = 60
+    # default max number of retries of idempotent requests
+    DEFAULT_RETRIES = 2
+    # default backoff factor in seconds between retries
+    DEFAULT_RETRY_BACKOFF = 0.5
+    # default max number of kept alive connections per upstream host
+    DEFAULT_POOL_SIZE = 10
+
+    # HTTP status codes of responses which are retried
+    RETRY_STATUS_CODES = [502, 503, 504]
+
+    def __init__(self, logger):
+        """Constructor
+
+        :param Logger logger: Application logger
+        """
+        self.logger = logger
+
+        # lookup for sessions as {(<tenant>, <settings>): <Session>}
+        self.sessions = {}
+        # lookup for upstream metrics as {<upstream>: <metrics dict>}
+        self.upstream_metrics = {}
+        # functions called after each request as
+        # listener(upstream, duration, status_code)
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def add_listener(self, listener):
+        """Add function called after each request with the arguments
+        (upstream, duration, status_code).
+
+        :param func listener: Listener function
+        """
+        self.listeners.append(listener)
+
+    def for_tenant(self, tenant, config):
+        """Return client bound to tenant settings.
+
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        """
+        return TenantHttpClient(self, tenant, config)
+
+    def settings(self, config):
+        """Return client settings from tenant config as tuple of
+        (connect_timeout, read_timeout, retries, retry_backoff, pool_size).
+
+        :param obj config: Tenant config
+        """
+        return (
+            config.get('http_connect_timeout', self.DEFAULT_CONNECT_TIMEOUT),
+            config.get('http_read_timeout', self.DEFAULT_READ_TIMEOUT),
+            config.get('http_retries', self.DEFAULT_RETRIES),
+            config.get('http_retry_backoff', self.DEFAULT_RETRY_BACKOFF),
+            config.get('http_pool_size', self.DEFAULT_POOL_SIZE)
+        )
+
+    def max_request_time(self, config, timeout=None):
+        """Return max time in seconds a request may take including retries,
+        i.e. the timeouts of all attempts and the backoff between them.
+
+        :param obj config: Tenant config
+        :param timeout: Optional timeout in seconds as float or
+                        (connect, read) tuple
+        """
+        connect_timeout, read_timeout, retries, retry_backoff, _ = \
+            self.settings(config)
+        if isinstance(timeout, tuple):
+            connect_timeout, read_timeout = timeout
+        elif timeout is not None:
+            connect_timeout = read_timeout = timeout
+
+        backoff = sum([
+            min(retry_backoff * 2 ** i, Retry.DEFAULT_BACKOFF_MAX)
+            for i in range(retries)
+        ])
+        return (retries + 1) * (connect_timeout + read_timeout) + backoff
+
+    def session(self, tenant, settings):
+        """Return shared requests session for a tenant, creating it if
+        required.
+
+        :param str tenant: Tenant ID
+        :param tuple settings: Client settings
+        """
+        key = (tenant, settings)
+        session = self.sessions.get(key)
+        if session is None:
+            with self.lock:
+                session = self.sessions.get(key)
+                if session is None:
+                    session = self.create_session(settings)
+                    # close sessions with previous settings of this tenant
+                    current = [settings, self.without_retries(settings)]
+                    for other in list(self.sessions.keys()):
+                        if other[0] == tenant and other[1] not in current:
+                            self.sessions.pop(other).close()
+                    self.sessions[key] = session
+
+        return session
+
+    def without_retries(self, settings):
+        """Return client settings with retries disabled.
+
+        :param tuple settings: Client settings
+        """
+        return settings[:2] + (0,) + settings[3:]
+
+    def create_session(self, settings):
+        """Create requests session with pooled connections and retries.
+
+        :param tuple settings: Client settings
+        """
+        _connect, _read, retries, retry_backoff, pool_size = settings
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=retry_backoff,
+            status_forcelist=self.RETRY_STATUS_CODES,
+            # only retry idempotent methods
+            allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+            # return last response instead of raising RetryError
+            raise_on_status=False
+        )
+        # NOTE: pool_connections is the number of cached host pools,
+        #       pool_maxsize the number of connections per host
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size,
+            max_retries=retry
+        )
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def request(self, tenant, config, method, url, timeout=None,
+                retry=True, **kwargs):
+        """Send request to upstream and return response.
+
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        :param str method: HTTP method
+        :param str url: Request URL
+        :param timeout: Optional timeout in seconds as float or
+                        (connect, read) tuple
+        :param bool retry: Set to False to disable retries, e.g. for
+                           streamed request bodies which cannot be resent
+        :param kwargs: Additional arguments for requests.Session.request
+        """
+        settings = self.settings(config)
+        if not retry:
+            settings = self.without_retries(settings)
+        if timeout is None:
+            timeout = (settings[0], settings[1])
+        session = self.session(tenant, settings)
+
+        upstream = self.upstream(url)
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except requests.exceptions.RequestException as e:
+            self.record(upstream, time.perf_counter() - start, None)
+            self.logger.warning(
+                "%s %s failed: %s" % (method.upper(), upstream, e)
+            )
+            raise
+
+        duration = time.perf_counter() - start
+        self.record(upstream, duration, response.status_code)
+        self.logger.debug(
+            "%s %s: %s in %.3fs" % (
+                method.upper(), url, response.status_code, duration
+            )
+        )
+        return response
+
+    def upstream(self, url):
+        """Return upstream key of a URL as '<scheme>://<host>:<port>'.
+
+        :param str url: Request URL
+        """
+        parts = urlparse(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        return "%s://%s:%d" % (parts.scheme, parts.hostname, port)
+
+    def record(self, upstream, duration, status_code):
+        """Update metrics of an upstream.
+
+        Server errors and failed requests (status_code None) count as errors.
+
+        :param str upstream: Upstream key
+        :param float duration: Request duration in seconds (until headers
+                               were received for streamed responses)
+        :param int status_code: Response status code or None on failure
+        """
+        with self.lock:
+            metrics = self.upstream_metrics.get(upstream)
+            if metrics is None:
+                metrics = {
+                    'requests': 0,
+                    'errors': 0,
+                    'total_time': 0.0,
+                    'max_time': 0.0
+                }
+                self.upstream_metrics[upstream] = metrics
+            metrics['requests'] += 1
+            if status_code is None or status_code >= 500:
+                metrics['errors'] += 1
+            metrics['total_time'] += duration
+            metrics['max_time'] = max(metrics['max_time'], duration)
+
+        for listener in self.listeners:
+            listener(upstream, duration, status_code)
+
+    def metrics(self):
+        """Return copy of upstream metrics as
+        {<upstream>: {'requests': <count>, 'errors': <count>,
+                      'total_time': <s>, 'max_time': <s>, 'avg_time': <s>}}
+        """
+        with self.lock:
+            result = {}
+            for upstream, metrics in self.upstream_metrics.items():
+                result[upstream] = dict(metrics)
+                result[upstream]['avg_time'] = (
+                    metrics['total_time'] / metrics['requests']
+                )
+            return result
+
+
+class TenantHttpClient:
+    """HttpClient bound to the settings of a tenant."""
+
+    def __init__(self, http_client, tenant, config):
+        """Constructor
+
+        :param HttpClient http_client: Shared HTTP client
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        """
+        self.http_client = http_client
+        self.tenant = tenant
+        self.config = config
+
+    def request(self, method, url, **kwargs):
+        """Send request and return response.
+
+        :param str method: HTTP method
+        :param str url: Request URL
+        :param kwargs: Additional arguments for HttpClient.request
+        """
+        return self.http_client.request(
+            self.tenant, self.config, method, url, **kwargs
+        )
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def options(self, url, **kwargs):
+        return self.request('OPTIONS', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
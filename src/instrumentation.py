@@ -0,0 +1,316 @@
+import threading
+import time
+
+from flask import g, has_request_context, request, Response
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class Histogram:
+    """Prometheus histogram with cumulative buckets per label set."""
+
+    def __init__(self, name, description, label_names, buckets):
+        """Constructor
+
+        :param str name: Metric name
+        :param str description: Metric description
+        :param list[str] label_names: Label names
+        :param list[float] buckets: Upper bounds of buckets
+        """
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = sorted(buckets)
+
+        # lookup for values as
+        # {<label values>: {'counts': [<count per bucket>], 'sum': <sum>,
+        #                   'count': <count>}}
+        self.values = {}
+
+    def observe(self, label_values, value):
+        """Add observed value.
+
+        NOTE: not thread-safe, lock in caller
+
+        :param tuple label_values: Label values
+        :param float value: Observed value
+        """
+        entry = self.values.get(label_values)
+        if entry is None:
+            entry = {'counts': [0] * len(self.buckets), 'sum': 0, 'count': 0}
+            self.values[label_values] = entry
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry['counts'][i] += 1
+        entry['sum'] += value
+        entry['count'] += 1
+
+    def lines(self):
+        """Return metric in Prometheus text format as list of lines."""
+        lines = [
+            "# HELP %s %s" % (self.name, self.description),
+            "# TYPE %s histogram" % self.name
+        ]
+        for label_values, entry in sorted(self.values.items()):
+            labels = format_labels(self.label_names, label_values)
+            for bound, count in zip(self.buckets, entry['counts']):
+                lines.append('%s_bucket{%s} %d' % (
+                    self.name,
+                    ",".join(filter(None, [labels, 'le="%g"' % bound])),
+                    count
+                ))
+            lines.append('%s_bucket{%s} %d' % (
+                self.name, ",".join(filter(None, [labels, 'le="+Inf"'])),
+                entry['count']
+            ))
+            lines.append("%s_sum%s %.6f" % (
+                self.name, "{%s}" % labels if labels else "", entry['sum']
+            ))
+            lines.append("%s_count%s %d" % (
+                self.name, "{%s}" % labels if labels else "", entry['count']
+            ))
+        return lines
+
+
+class Counter:
+    """Prometheus counter per label set."""
+
+    def __init__(self, name, description, label_names):
+        """Constructor
+
+        :param str name: Metric name
+        :param str description: Metric description
+        :param list[str] label_names: Label names
+        """
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+
+        # lookup for values as {<label values>: <value>}
+        self.values = {}
+
+    def inc(self, label_values, value=1):
+        """Increment counter.
+
+        NOTE: not thread-safe, lock in caller
+
+        :param tuple label_values: Label values
+        :param float value: Increment
+        """
+        self.values[label_values] = self.values.get(label_values, 0) + value
+
+    def lines(self):
+        """Return metric in Prometheus text format as list of lines."""
+        lines = [
+            "# HELP %s %s" % (self.name, self.description),
+            "# TYPE %s counter" % self.name
+        ]
+        for label_values, value in sorted(self.values.items()):
+            labels = format_labels(self.label_names, label_values)
+            lines.append("%s%s %g" % (
+                self.name, "{%s}" % labels if labels else "", value
+            ))
+        return lines
+
+
+def format_labels(label_names, label_values):
+    """Return Prometheus labels as 'name="value",...'.
+
+    :param list[str] label_names: Label names
+    :param tuple label_values: Label values
+    """
+    return ",".join(
+        '%s="%s"' % (
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n')
+        )
+        for name, value in zip(label_names, label_values)
+    )
+
+
+class Instrumentation:
+    """Opt-in request instrumentation.
+
+    Records request latencies per endpoint, SQL statement counts and
+    durations, outbound HTTP request durations and template render times.
+    Metrics are served in Prometheus text format by /metrics, and the
+    timings of each request are added as Server-Timing response header.
+
+    NOTE: metrics are collected per worker process
+    """
+
+    # histogram buckets in seconds
+    BUCKETS = [
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30
+    ]
+
+    def __init__(self, app, http_client):
+        """Constructor
+
+        :param Flask app: Flask application
+        :param HttpClient http_client: Shared HTTP client
+        """
+        self.app = app
+        self.lock = threading.Lock()
+
+        self.request_duration = Histogram(
+            'qwc_admin_gui_request_duration_seconds',
+            "Request duration by endpoint",
+            ['endpoint', 'method', 'status'], self.BUCKETS
+        )
+        self.db_statements = Counter(
+            'qwc_admin_gui_db_statements_total',
+            "Number of SQL statements by endpoint", ['endpoint']
+        )
+        self.db_duration = Counter(
+            'qwc_admin_gui_db_duration_seconds_total',
+            "Total duration of SQL statements by endpoint", ['endpoint']
+        )
+        self.http_duration = Histogram(
+            'qwc_admin_gui_upstream_request_duration_seconds',
+            "Duration of outbound HTTP requests by upstream",
+            ['upstream'], self.BUCKETS
+        )
+        self.http_errors = Counter(
+            'qwc_admin_gui_upstream_errors_total',
+            "Number of failed outbound HTTP requests by upstream",
+            ['upstream']
+        )
+        self.render_duration = Histogram(
+            'qwc_admin_gui_template_render_duration_seconds',
+            "Template render duration by template",
+            ['template'], self.BUCKETS
+        )
+
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        before_render_template.connect(self.before_render, app)
+        template_rendered.connect(self.after_render, app)
+        # NOTE: listen on all engines, including tenant ConfigDB engines
+        event.listen(Engine, 'before_cursor_execute', self.before_execute)
+        event.listen(Engine, 'after_cursor_execute', self.after_execute)
+        http_client.add_listener(self.http_request)
+
+        app.add_url_rule('/metrics', 'metrics', self.metrics)
+
+    def before_request(self):
+        """Start request timing."""
+        g.instrumentation = {
+            'start': time.perf_counter(),
+            'db_count': 0,
+            'db_time': 0.0,
+            'http_count': 0,
+            'http_time': 0.0,
+            'render_time': 0.0,
+            'render_start': []
+        }
+
+    def after_request(self, response):
+        """Record request metrics and add Server-Timing header.
+
+        :param Response response: Response
+        """
+        timings = g.pop('instrumentation', None)
+        if timings is None:
+            return response
+
+        duration = time.perf_counter() - timings['start']
+        endpoint = request.endpoint or 'none'
+        with self.lock:
+            self.request_duration.observe(
+                (endpoint, request.method, str(response.status_code)),
+                duration
+            )
+            self.db_statements.inc((endpoint,), timings['db_count'])
+            self.db_duration.inc((endpoint,), timings['db_time'])
+
+        # NOTE: durations in milliseconds, streamed bodies are not included
+        response.headers['Server-Timing'] = ", ".join([
+            'db;dur=%.1f;desc="%d SQL statements"' % (
+                timings['db_time'] * 1000, timings['db_count']
+            ),
+            'http;dur=%.1f;desc="%d upstream requests"' % (
+                timings['http_time'] * 1000, timings['http_count']
+            ),
+            'render;dur=%.1f' % (timings['render_time'] * 1000),
+            'total;dur=%.1f' % (duration * 1000)
+        ])
+        return response
+
+    def before_render(self, sender, template, context, **extra):
+        """Start template render timing.
+
+        :param Flask sender: Flask application
+        :param Template template: Rendered template
+        :param dict context: Template context
+        """
+        if has_request_context() and 'instrumentation' in g:
+            g.instrumentation['render_start'].append(time.perf_counter())
+
+    def after_render(self, sender, template, context, **extra):
+        """Record template render time.
+
+        :param Flask sender: Flask application
+        :param Template template: Rendered template
+        :param dict context: Template context
+        """
+        if not has_request_context() or 'instrumentation' not in g:
+            return
+        timings = g.instrumentation
+        if not timings['render_start']:
+            return
+        duration = time.perf_counter() - timings['render_start'].pop()
+        if not timings['render_start']:
+            # only count outermost template
+            timings['render_time'] += duration
+        with self.lock:
+            self.render_duration.observe((template.name,), duration)
+
+    def before_execute(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        """Start SQL statement timing."""
+        conn.info.setdefault('instrumentation_start', []).append(
+            time.perf_counter()
+        )
+
+    def after_execute(self, conn, cursor, statement, parameters, context,
+                      executemany):
+        """Record SQL statement duration."""
+        starts = conn.info.get('instrumentation_start')
+        if not starts:
+            return
+        duration = time.perf_counter() - starts.pop()
+        if has_request_context() and 'instrumentation' in g:
+            g.instrumentation['db_count'] += 1
+            g.instrumentation['db_time'] += duration
+
+    def http_request(self, upstream, duration, status_code):
+        """Record outbound HTTP request.
+
+        :param str upstream: Upstream key
+        :param float duration: Request duration in seconds
+        :param int status_code: Response status code or None on failure
+        """
+        with self.lock:
+            self.http_duration.observe((upstream,), duration)
+            if status_code is None or status_code >= 500:
+                self.http_errors.inc((upstream,))
+        if has_request_context() and 'instrumentation' in g:
+            g.instrumentation['http_count'] += 1
+            g.instrumentation['http_time'] += duration
+
+    def metrics(self):
+        """Return metrics in Prometheus text format."""
+        lines = []
+        with self.lock:
+            for metric in [
+                self.request_duration, self.db_statements, self.db_duration,
+                self.http_duration, self.http_errors, self.render_duration
+            ]:
+                lines += metric.lines()
+        return Response(
+            "\n".join(lines) + "\n",
+            content_type='text/plain; version=0.0.4; charset=utf-8'
+        )
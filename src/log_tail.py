@@ -0,0 +1,107 @@
+import hashlib
+
+from markupsafe import escape
+
+
+# number of trailing lines identifying a log cursor
+CURSOR_LINES = 3
+
+
+def line_hash(line):
+    """Return short hash of a log line.
+
+    :param str line: Log line
+    """
+    return hashlib.sha1(line.encode('utf-8')).hexdigest()[:8]
+
+
+def log_cursor(lines, end):
+    """Return cursor identifying the log position after lines[:end].
+
+    The cursor consists of the hashes of the last CURSOR_LINES lines before
+    the position, so it can be found again in a later window of the log.
+
+    :param list[str] lines: Log lines
+    :param int end: Position after the last returned line
+    """
+    return ".".join(
+        line_hash(line) for line in lines[max(0, end - CURSOR_LINES):end]
+    )
+
+
+def new_lines_start(lines, cursor):
+    """Return position of the first line after the cursor, and whether the
+    cursor was found.
+
+    Lines are searched backwards from the end, so the cost grows with the
+    number of new lines. The cursor lines may be partially outside of the
+    window. Returns position 0 if the cursor is not in the window, e.g. if
+    more lines have been logged than were fetched.
+
+    :param list[str] lines: Current window of log lines
+    :param str cursor: Cursor of last returned line
+    """
+    cursor_hashes = cursor.split(".") if cursor else []
+    if not cursor_hashes:
+        return 0, False
+
+    hashes = {}
+    for end in range(len(lines), 0, -1):
+        count = min(len(cursor_hashes), end)
+        for i in range(count):
+            pos = end - 1 - i
+            if pos not in hashes:
+                hashes[pos] = line_hash(lines[pos])
+            if hashes[pos] != cursor_hashes[-1 - i]:
+                break
+        else:
+            return end, True
+    return 0, False
+
+
+def log_lines(text):
+    """Split log text into lines, without trailing empty line.
+
+    :param str text: Log text
+    """
+    lines = text.split("\n")
+    if lines and lines[-1] == '':
+        lines.pop()
+    return lines
+
+
+def colorize(line):
+    """Return log line as HTML, with highlighted warnings and errors.
+
+    :param str line: Log line
+    """
+    if line[9:16] == "WARNING":
+        return f'<b style="color: orange">{escape(line)}</b>'
+    elif line[9:17] == "CRITICAL" or line.startswith("Traceback"):
+        return f'<b style="color: red">{escape(line)}</b>'
+    else:
+        return str(escape(line))
+
+
+def colorized_lines(lines, start=0):
+    """Yield lines from a position as colorized HTML lines.
+
+    :param list[str] lines: Log lines
+    :param int start: Position of first line
+    """
+    for i in range(start, len(lines)):
+        yield colorize(lines[i]) + "\n"
+
+
+def sse_event(lines, start, cursor):
+    """Return Server-Sent Event with colorized lines from a position.
+
+    :param list[str] lines: Log lines
+    :param int start: Position of first line
+    :param str cursor: Cursor after the last line, used as event ID
+    """
+    data = "".join(
+        "data: %s\n" % line.rstrip("\n")
+        for line in colorized_lines(lines, start)
+    )
+    return "id: %s\n%s\n" % (cursor, data)
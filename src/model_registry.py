@@ -0,0 +1,155 @@
+import threading
+import time
+
+from sqlalchemy.sql import text as sql_text
+
+from qwc_services_core.config_models import ConfigModels
+
+
+class ModelRegistry:
+    """Tenant-keyed registry of ConfigModels.
+
+    Reflecting the ConfigDB schema is expensive, so the ORM models are built
+    once per tenant and shared by all controllers. The cached models are
+    dropped if the DB connection changes, on explicit invalidation or if the
+    ConfigDB schema version (Alembic revision) has changed.
+    """
+
+    # default interval in seconds between schema version checks
+    DEFAULT_CHECK_INTERVAL = 60
+
+    def __init__(self, db_engine, logger):
+        """Constructor
+
+        :param DatabaseEngine db_engine: Database engine with DB connections
+        :param Logger logger: Application logger
+        """
+        self.db_engine = db_engine
+        self.logger = logger
+
+        # lookup for cached models as {<tenant>: <entry dict>}
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def config_models(self, tenant, conn_str, qwc_config_schema,
+                      check_interval=DEFAULT_CHECK_INTERVAL):
+        """Return cached ConfigModels for a tenant, building them if required.
+
+        :param str tenant: Tenant ID
+        :param str conn_str: DB connection string for ConfigDB
+        :param str qwc_config_schema: Name of qwc_config schema
+        :param int check_interval: Interval in seconds between schema version
+                                   checks (negative to disable checks)
+        """
+        stale_entry = None
+        entry = self.entries.get(tenant)
+        if entry is not None and not self.entry_valid(
+            tenant, entry, conn_str, qwc_config_schema, check_interval
+        ):
+            stale_entry = entry
+            entry = None
+
+        if entry is None:
+            with self.lock:
+                # use models built by another thread in the meantime
+                current = self.entries.get(tenant)
+                if (
+                    current is not None and current is not stale_entry and
+                    current['conn_str'] == conn_str and
+                    current['qwc_config_schema'] == qwc_config_schema
+                ):
+                    return current['config_models']
+
+                entry = self.build_entry(tenant, conn_str, qwc_config_schema)
+                self.entries[tenant] = entry
+
+        return entry['config_models']
+
+    def entry_valid(self, tenant, entry, conn_str, qwc_config_schema,
+                    check_interval):
+        """Return whether a registry entry may still be used.
+
+        :param str tenant: Tenant ID
+        :param dict entry: Registry entry
+        :param str conn_str: DB connection string for ConfigDB
+        :param str qwc_config_schema: Name of qwc_config schema
+        :param int check_interval: Interval in seconds between schema version
+                                   checks (negative to disable checks)
+        """
+        if (
+            entry['conn_str'] != conn_str or
+            entry['qwc_config_schema'] != qwc_config_schema
+        ):
+            # DB connection changed
+            return False
+
+        if check_interval < 0 or \
+                time.time() - entry['checked_at'] < check_interval:
+            return True
+
+        entry['checked_at'] = time.time()
+        schema_version = self.schema_version(
+            entry['config_models'].engine, qwc_config_schema
+        )
+        if schema_version != entry['schema_version']:
+            self.logger.info(
+                "ConfigDB schema version for tenant '%s' changed from %s to %s"
+                % (tenant, entry['schema_version'], schema_version)
+            )
+            return False
+
+        return True
+
+    def build_entry(self, tenant, conn_str, qwc_config_schema):
+        """Create ConfigModels for a tenant and return registry entry.
+
+        :param str tenant: Tenant ID
+        :param str conn_str: DB connection string for ConfigDB
+        :param str qwc_config_schema: Name of qwc_config schema
+        """
+        self.logger.info("Building ConfigDB models for tenant '%s'" % tenant)
+        config_models = ConfigModels(
+            self.db_engine, conn_str, qwc_config_schema=qwc_config_schema
+        )
+        return {
+            'config_models': config_models,
+            'conn_str': conn_str,
+            'qwc_config_schema': qwc_config_schema,
+            'schema_version': self.schema_version(
+                config_models.engine, qwc_config_schema
+            ),
+            'checked_at': time.time()
+        }
+
+    def schema_version(self, engine, qwc_config_schema):
+        """Return current Alembic revision of the ConfigDB schema,
+        or None if not available.
+
+        :param Engine engine: ConfigDB engine
+        :param str qwc_config_schema: Name of qwc_config schema
+        """
+        sql = sql_text(
+            'SELECT version_num FROM "{schema}".alembic_version'.format(
+                schema=qwc_config_schema
+            )
+        )
+        try:
+            with engine.connect() as connection:
+                versions = [row[0] for row in connection.execute(sql)]
+            return ",".join(sorted(versions))
+        except Exception as e:
+            self.logger.debug(
+                "Could not read ConfigDB schema version: %s" % e
+            )
+            return None
+
+    def invalidate(self, tenant=None):
+        """Drop cached models of a tenant, or of all tenants if None.
+
+        :param str tenant: Optional tenant ID
+        """
+        with self.lock:
+            if tenant is None:
+                self.entries = {}
+            else:
+                self.entries.pop(tenant, None)
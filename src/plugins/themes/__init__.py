@@ -30,11 +30,11 @@ def load_plugin(app, handler):
     global __files_controller
     global __info_templates_controller
 
-    themesconfig = ThemeUtils.load_themesconfig(app, handler)
+    ThemeUtils.init_indexes(app)
     featureInfoconfig = ThemeUtils.load_featureinfo_config(app, handler)
-    __background_layers_controller = BackgroundLayersController(app, handler, themesconfig)
+    __background_layers_controller = BackgroundLayersController(app, handler)
     __mapthumbs_controller = MapthumbsController(app, handler)
-    __themes_controller = ThemesController(app, handler, themesconfig)
+    __themes_controller = ThemesController(app, handler)
     __files_controller = FilesController(app, handler)
     __info_templates_controller = InfoTemplatesController(app, handler, featureInfoconfig)
 
@@ -2,26 +2,24 @@ import json
 
 from collections import OrderedDict
 
-from flask import flash, redirect, render_template, url_for
+from flask import abort, flash, redirect, render_template, request, url_for
 from wtforms import ValidationError
 
 from plugins.themes.forms import WMSLayerForm, WMTSLayerForm, XYZLayerForm
-from plugins.themes.utils import ThemeUtils
+from plugins.themes.utils import ThemeUtils, ThemesConfigConflict
 from utils import i18n
 
 
 class BackgroundLayersController():
     """Controller for theme model"""
 
-    def __init__(self, app, handler, themesconfig):
+    def __init__(self, app, handler):
         """Constructor
 
         :param Flask app: Flask application
         :param handler: Tenant config handler
-        :param themesconfig: Themes config
         """
 
-        self.themesconfig = themesconfig
         self.app = app
         self.handler = handler
         self.template_dir = "plugins/themes/templates"
@@ -53,13 +51,16 @@ class BackgroundLayersController():
 
     def index(self):
         """Show backgroundlayers."""
-        self.themesconfig = ThemeUtils.load_themesconfig(self.app, self.handler)
+        themesconfig, revision = ThemeUtils.load_themesconfig_revision(
+            self.app, self.handler
+        )
         layers = []
-        for layer in self.themesconfig["themes"]["backgroundLayers"]:
+        for layer in themesconfig["themes"]["backgroundLayers"]:
             layers.append(layer)
 
         return render_template(
             "%s/backgroundlayers.html" % self.template_dir, backgroundlayers=layers,
+            revision=revision,
             title=i18n('plugins.themes.backgroundlayers.title'), i18n=i18n
         )
 
@@ -127,7 +128,10 @@ class BackgroundLayersController():
         :param int index: Backgroundlayer ID
         """
         # find background layer
-        backgroundlayer = self.find_backgroundlayer(index)
+        themesconfig, revision = ThemeUtils.load_themesconfig_revision(
+            self.app, self.handler
+        )
+        backgroundlayer = self.find_backgroundlayer(themesconfig, index)
 
         if backgroundlayer is not None:
             # show validation errors
@@ -139,7 +143,9 @@ class BackgroundLayersController():
                 template = "%s/xyzlayer.html" % self.template_dir
             form = self.create_form(type=backgroundlayer["type"], backgroundlayer=backgroundlayer)
             title = i18n('plugins.themes.backgroundlayers.edit_title')
-            action = url_for("update_backgroundlayer", index=index)
+            action = url_for(
+                "update_backgroundlayer", index=index, revision=revision
+            )
 
             return render_template(
                 template, title=title, type=backgroundlayer["type"], form=form, action=action,
@@ -155,7 +161,9 @@ class BackgroundLayersController():
         :param int index: Backgroundlayer ID
         """
         # find backgroundlayer
-        backgroundlayer = self.find_backgroundlayer(index)
+        revision = request.values.get('revision')
+        themesconfig = ThemeUtils.load_themesconfig(self.app, self.handler)
+        backgroundlayer = self.find_backgroundlayer(themesconfig, index)
 
         if backgroundlayer is not None:
             form = self.create_form(type=backgroundlayer["type"], backgroundlayer=None)
@@ -163,7 +171,10 @@ class BackgroundLayersController():
             if form.validate_on_submit():
                 try:
                     # update background layer
-                    self.create_or_update_backgroundlayer(backgroundlayer["type"], form, index=index)
+                    self.create_or_update_backgroundlayer(
+                        backgroundlayer["type"], form, index=index,
+                        revision=revision
+                    )
                     return redirect(url_for("backgroundlayers"))
                 except ValidationError:
                     flash("{0} {1}.".format(
@@ -182,7 +193,9 @@ class BackgroundLayersController():
             elif backgroundlayer["type"] == "xyz":
                 template = "%s/xyzlayer.html" % self.template_dir
             title = i18n('plugins.themes.backgroundlayers.edit_title')
-            action = url_for("update_backgroundlayer", index=index)
+            action = url_for(
+                "update_backgroundlayer", index=index, revision=revision
+            )
 
             return render_template(
                 template, title=title, type=backgroundlayer["type"], form=form, action=action,
@@ -194,25 +207,48 @@ class BackgroundLayersController():
 
     def delete(self, index=None):
         """Delete backgroundlayer."""
-        count = len(self.themesconfig["themes"]["backgroundLayers"])
+        themesconfig = ThemeUtils.load_themesconfig(self.app, self.handler)
+        count = len(themesconfig["themes"]["backgroundLayers"])
         if index is None or index > count - 1:
             self.app.logger.error("Error saving backgroundLayer: index not defined \
                     or out of range. index={0} count={1}".format(index, count))
             flash(i18n('plugins.themes.backgroundlayers.delete_message_error'), "error")
         else:
-            self.themesconfig["themes"]["backgroundLayers"].pop(index)
-            if ThemeUtils.save_themesconfig(self.themesconfig, self.app, self.handler):
+            def patch(themesconfig):
+                themesconfig["themes"]["backgroundLayers"].pop(index)
+
+            saved = self.update_themesconfig(
+                patch, request.values.get('revision')
+            )
+            if saved:
                 flash(i18n('plugins.themes.backgroundlayers.delete_message_success'), "success")
-            else:
+            elif saved is not None:
                 flash(i18n('plugins.themes.backgroundlayers.delete_message_error'), "error")
         return redirect(url_for("backgroundlayers"))
 
-    def find_backgroundlayer(self, index=None):
+    def update_themesconfig(self, patch, revision=None):
+        """Apply changes to the themesconfig and return whether it was saved,
+        or None if it was modified in the meantime.
+
+        :param func patch: Function modifying the themesconfig
+        :param str revision: Revision the changes are based on
+        """
+        try:
+            return ThemeUtils.update_themesconfig(
+                self.app, self.handler, patch, revision
+            )
+        except ThemesConfigConflict as e:
+            self.app.logger.warning(e)
+            flash(i18n('plugins.themes.common.conflict_message'), "warning")
+            return None
+
+    def find_backgroundlayer(self, themesconfig, index=None):
         """Find backgroundlayer by ID.
 
+        :param obj themesconfig: Themes config
         :param int index: Backgroundlayer ID
         """
-        for i, item in enumerate(self.themesconfig["themes"]["backgroundLayers"]):
+        for i, item in enumerate(themesconfig["themes"]["backgroundLayers"]):
             if i == index:
                 return item
 
@@ -294,14 +330,14 @@ class BackgroundLayersController():
 
         return form
 
-    def create_or_update_backgroundlayer(self, type, form, index=None):
+    def create_or_update_backgroundlayer(self, type, form, index=None,
+                                         revision=None):
         """Create or update backgroundlayer records in Themesconfig.
 
-        :param object backgroundlayer: Optional backgroundlayer object
-                                (None for create)
-        :param str type: Optional backgroundlayer object
-                                (None for create)
+        :param str type: Backgroundlayer type
         :param FlaskForm form: Form for backgroundlayer
+        :param int index: Backgroundlayer ID (None for create)
+        :param str revision: Themesconfig revision of edited backgroundlayer
         """
         item = OrderedDict()
         item["type"] = type
@@ -375,22 +411,28 @@ class BackgroundLayersController():
                 item["crs"] = form.crs.data
 
         # edit background layer
-        if index:
+        if index is not None:
             action_name = i18n('plugins.themes.backgroundlayers.action_updated')
-            self.themesconfig["themes"]["backgroundLayers"][index] = item
+
+            def patch(themesconfig):
+                themesconfig["themes"]["backgroundLayers"][index] = item
         # new background layer
         else:
             action_name = i18n('plugins.themes.backgroundlayers.action_created')
-            self.themesconfig["themes"]["backgroundLayers"].append(
-                item)
+            # NOTE: appending does not conflict with concurrent changes
+            revision = None
+
+            def patch(themesconfig):
+                themesconfig["themes"]["backgroundLayers"].append(item)
 
-        if ThemeUtils.save_themesconfig(self.themesconfig, self.app, self.handler):
+        saved = self.update_themesconfig(patch, revision)
+        if saved:
             message = "{0} '{1}' {2}.\
                     ".format(
                         i18n('plugins.themes.backgroundlayers.save_action_message_success'), item.get("title", ""), action_name)
             flash(message, "success")
-        else:
+        elif saved is not None:
             message = "{0} '{1}'.\
                     ".format(
-                        i18n('plugins.themes.backgroundlayers.save_action_message_error'), item["title"])
+                        i18n('plugins.themes.backgroundlayers.save_action_message_error'), item.get("title", ""))
             flash(message, "error")
@@ -1,11 +1,14 @@
 import os
-from zipfile import ZipFile
+from zipfile import BadZipFile
 
-from flask import flash, redirect, render_template, url_for
+from flask import flash, jsonify, redirect, render_template, request, url_for
 from werkzeug.utils import secure_filename
 
 from plugins.themes.forms import LayerForm, ProjectForm, TemplateForm
 from plugins.themes.utils import ThemeUtils
+from plugins.themes.utils.uploads import (
+    ChunkedUploads, UploadConflict, UploadError, UploadQuotaExceeded
+)
 from utils import i18n
 
 
@@ -55,6 +58,27 @@ class FilesController:
             "/files/templates/delete/<string:templatename>", "delete_template",
             self.delete_template, methods=["GET"]
         )
+        # Chunked uploads
+        # start
+        app.add_url_rule(
+            '/files/uploads', 'start_upload', self.start_upload,
+            methods=["POST"]
+        )
+        # status
+        app.add_url_rule(
+            '/files/uploads/<string:upload_id>', 'upload_status',
+            self.upload_status, methods=["GET"]
+        )
+        # chunk
+        app.add_url_rule(
+            '/files/uploads/<string:upload_id>', 'upload_chunk',
+            self.upload_chunk, methods=["PUT"]
+        )
+        # cancel
+        app.add_url_rule(
+            '/files/uploads/<string:upload_id>', 'cancel_upload',
+            self.cancel_upload, methods=["DELETE"]
+        )
 
         self.app = app
         self.handler = handler
@@ -63,7 +87,12 @@ class FilesController:
         config_handler = handler()
         self.resources_path = config_handler.config().get("qgs_resources_path")
         self.info_templates_path = config_handler.config().get("info_templates_path")
-          
+
+        self.uploads = ChunkedUploads(
+            app.logger,
+            on_change=lambda path: ThemeUtils.file_index.refresh(path)
+        )
+
     def index(self):
         """Show project list."""
         form_project = ProjectForm()
@@ -87,7 +116,9 @@ class FilesController:
             f = form.upload.data
             filename = secure_filename(f.filename)
             try:
+                self.check_upload_quota()
                 f.save(os.path.join(self.resources_path, filename))
+                ThemeUtils.file_index.refresh(self.resources_path)
                 flash("{0}: '{1}'.".format(
                     i18n('plugins.themes.files.project_upload_message_success'), filename),
                       'success')
@@ -96,6 +127,9 @@ class FilesController:
                 self.app.logger.error("Error writing project to {}: {}".format(
                     self.resources_path, e.strerror))
                 flash(i18n('plugins.themes.files.project_save_message_error'), 'error')
+            except UploadQuotaExceeded as e:
+                self.app.logger.warning("Error uploading project: %s" % e)
+                flash(i18n('plugins.themes.files.upload_quota_message_error'), 'error')
         else:
             # TODO: validation error
             self.app.logger.error("Error uploading project: \
@@ -119,6 +153,7 @@ class FilesController:
         """Delete QGIS project."""
         try:
             os.remove(os.path.join(self.resources_path, projectname + '.qgs'))
+            ThemeUtils.file_index.refresh(self.resources_path)
             return redirect(url_for('files'))
         except IOError as e:
             self.app.logger.error("Error deleting project: \
@@ -145,17 +180,21 @@ class FilesController:
             f = form.upload.data
             filename = secure_filename(f.filename)
             try:
+                self.check_upload_quota()
                 f.save(os.path.join(self.resources_path, filename))
                 is_zip_file = os.path.splitext(filename)[1] == '.zip'
                 if (is_zip_file):
                     self.app.logger.info(f"Extracting files from file {filename}...")
-                    extensions = ('shp', 'shx', 'dbf', 'prj', 'cpg', 'geojson', 'kml', 'gpkg')
-                    with ZipFile(os.path.join(self.resources_path, filename), 'r') as zip:
-                        for file in zip.namelist():
-                            if file.endswith(extensions):
-                                self.app.logger.info(f"Extracting {file} from {filename}")
-                                zip.extract(file, os.path.join(self.resources_path))
-                    os.remove(os.path.join(self.resources_path, filename))
+                    config_handler = self.handler()
+                    try:
+                        self.uploads.extract_zip(
+                            config_handler.tenant, config_handler.config(),
+                            os.path.join(self.resources_path, filename),
+                            self.resources_path
+                        )
+                    finally:
+                        os.remove(os.path.join(self.resources_path, filename))
+                ThemeUtils.file_index.refresh(self.resources_path)
                 flash("{0} {2}: {1}".format(
                     i18n('plugins.themes.files.file_upload_message_success'), filename, 
                     i18n('plugins.themes.files.file_extract_message_success') if is_zip_file else ""),
@@ -165,6 +204,12 @@ class FilesController:
                 self.app.logger.error("Error writing file: \
                                       {}".format(e.strerror))
                 flash(i18n('plugins.themes.files.file_save_message_error'), 'error')
+            except BadZipFile as e:
+                self.app.logger.error("Error extracting file: %s" % e)
+                flash(i18n('plugins.themes.files.file_save_message_error'), 'error')
+            except UploadQuotaExceeded as e:
+                self.app.logger.warning("Error uploading file: %s" % e)
+                flash(i18n('plugins.themes.files.upload_quota_message_error'), 'error')
         else:
             # TODO: validation error
             self.app.logger.error("Error uploading file: \
@@ -194,6 +239,7 @@ class FilesController:
                 name = os.path.splitext(layername)[0]
                 [os.remove(os.path.join(self.resources_path, name + ext)) for ext in extensions if os.path.exists(os.path.join(self.resources_path, name + ext))]
             os.remove(os.path.join(self.resources_path, layername))
+            ThemeUtils.file_index.refresh(self.resources_path)
             return redirect(url_for('files'))
         except IOError as e:
             self.app.logger.error("Error deleting file: \
@@ -220,7 +266,9 @@ class FilesController:
             f = form.upload.data
             filename = secure_filename(f.filename)
             try:
+                self.check_upload_quota()
                 f.save(os.path.join(self.info_templates_path, filename))
+                ThemeUtils.file_index.refresh(self.info_templates_path)
                 flash("{1}: '{0}'".format(filename, i18n('plugins.themes.files.template_upload_message_success')),
                       'success')
                 return redirect(url_for('files'))
@@ -228,6 +276,9 @@ class FilesController:
                 self.app.logger.error("Error writing template to {}: {}".format(
                     self.info_templates_path, e.strerror))
                 flash(i18n('plugins.themes.files.template_save_message_error'), 'error')
+            except UploadQuotaExceeded as e:
+                self.app.logger.warning("Error uploading template: %s" % e)
+                flash(i18n('plugins.themes.files.upload_quota_message_error'), 'error')
         else:
             # TODO: validation error
             self.app.logger.error("Error uploading template: \
@@ -252,6 +303,7 @@ class FilesController:
         """Delete template file."""
         try:
             os.remove(os.path.join(self.info_templates_path, templatename))
+            ThemeUtils.file_index.refresh(self.info_templates_path)
             return redirect(url_for('files'))
         except IOError as e:
             self.app.logger.error("Error deleting file: \
@@ -270,3 +322,144 @@ class FilesController:
             form_project=form_project, form_layer=form_layer, form_template=form_template,
             title=i18n('plugins.themes.files.template_delete_title')
         )
+
+    def start_upload(self):
+        """Start chunked upload.
+
+        JSON body:
+            target: Upload target ('project', 'layer' or 'template')
+            filename: File name
+            size: File size in bytes
+            checksum: Optional SHA-256 hex digest of the file
+        """
+        data = request.get_json(silent=True) or {}
+        config_handler = self.handler()
+        try:
+            size = int(data.get('size'))
+        except (TypeError, ValueError):
+            return self.upload_error_response("Invalid file size", 400)
+
+        try:
+            upload = self.uploads.start(
+                config_handler.tenant, config_handler.config(),
+                data.get('target'), data.get('filename'), size,
+                data.get('checksum')
+            )
+        except UploadQuotaExceeded as e:
+            return self.upload_error_response(str(e), 413)
+        except UploadError as e:
+            return self.upload_error_response(str(e), 400)
+
+        return self.upload_response(upload, 201)
+
+    def upload_status(self, upload_id):
+        """Return state of chunked upload.
+
+        :param str upload_id: Upload ID
+        """
+        config_handler = self.handler()
+        upload = self.uploads.status(
+            config_handler.tenant, config_handler.config(), upload_id
+        )
+        if upload is None:
+            return self.upload_error_response("Upload not found", 404)
+
+        return self.upload_response(upload)
+
+    def upload_chunk(self, upload_id):
+        """Append chunk from raw request body.
+
+        Parameter:
+            offset: Offset of chunk in bytes
+
+        :param str upload_id: Upload ID
+        """
+        config_handler = self.handler()
+        config = config_handler.config()
+        offset = request.args.get('offset', 0, int)
+        try:
+            upload = self.uploads.write_chunk(
+                config_handler.tenant, config, upload_id, offset,
+                request.stream, request.content_length
+            )
+        except UploadConflict as e:
+            # return current state for resuming at its offset
+            upload = self.uploads.status(
+                config_handler.tenant, config, upload_id
+            )
+            return self.upload_error_response(str(e), 409, upload)
+        except UploadError as e:
+            return self.upload_error_response(str(e), 400)
+        except OSError as e:
+            self.app.logger.error(
+                "Error writing upload %s: %s" % (upload_id, e)
+            )
+            return self.upload_error_response(
+                i18n('plugins.themes.files.file_save_message_error'), 500
+            )
+        if upload is None:
+            return self.upload_error_response("Upload not found", 404)
+
+        return self.upload_response(upload)
+
+    def cancel_upload(self, upload_id):
+        """Cancel chunked upload or extraction.
+
+        :param str upload_id: Upload ID
+        """
+        config_handler = self.handler()
+        upload = self.uploads.cancel(
+            config_handler.tenant, config_handler.config(), upload_id
+        )
+        if upload is None:
+            return self.upload_error_response("Upload not found", 404)
+
+        return self.upload_response(upload)
+
+    def check_upload_quota(self):
+        """Raise UploadQuotaExceeded if the current form upload exceeds the
+        max file size or the tenant quota."""
+        config_handler = self.handler()
+        config = config_handler.config()
+        size = request.content_length or 0
+        max_size = config.get('upload_max_size')
+        if max_size is not None and size > max_size:
+            raise UploadQuotaExceeded(
+                "Upload of %d bytes exceeds max size of %d bytes" %
+                (size, max_size)
+            )
+        with self.uploads.lock:
+            self.uploads.check_quota(config_handler.tenant, config, size)
+
+    def upload_response(self, upload, status_code=200):
+        """Return JSON response for a chunked upload.
+
+        :param dict upload: Upload state
+        :param int status_code: HTTP status code
+        """
+        return jsonify({
+            'upload_id': upload['upload_id'],
+            'target': upload['target'],
+            'filename': upload['filename'],
+            'size': upload['size'],
+            'offset': upload['offset'],
+            'chunk_size': upload['chunk_size'],
+            'status': upload['status'],
+            'running': upload['status'] in ChunkedUploads.ACTIVE_STATUSES,
+            'progress': upload['progress'],
+            'sha256': upload['sha256'],
+            'message': upload['message']
+        }), status_code
+
+    def upload_error_response(self, message, status_code, upload=None):
+        """Return JSON error response for a chunked upload.
+
+        :param str message: Error message
+        :param int status_code: HTTP status code
+        :param dict upload: Optional current upload state
+        """
+        response = {'error': message}
+        if upload is not None:
+            response['offset'] = upload['offset']
+            response['status'] = upload['status']
+        return jsonify(response), status_code
@@ -58,6 +58,7 @@ class MapthumbsController():
             filename = secure_filename(f.filename)
             try:
                 f.save(os.path.join(self.mapthumb_path, filename))
+                ThemeUtils.file_index.refresh(self.mapthumb_path)
                 flash(": '{1}'".format(
                     i18n('plugins.themes.mapthumbs.upload_message_success'), filename),
                     'success')
@@ -84,6 +85,7 @@ class MapthumbsController():
         """Delete mapthumb."""
         try:
             os.remove(os.path.join(self.mapthumb_path, image))
+            ThemeUtils.file_index.refresh(self.mapthumb_path)
             return redirect(url_for('mapthumbs'))
         except IOError as e:
             self.app.logger.error("Error deleting mapthumb: \
@@ -3,20 +3,21 @@ from flask import abort, flash, redirect, render_template, request, url_for
 from wtforms import ValidationError
 from sqlalchemy.exc import IntegrityError, InternalError
 from urllib.parse import urlparse
-from qwc_services_core.config_models import ConfigModels
 
 from plugins.themes.forms import ThemeForm
-from plugins.themes.utils import ThemeUtils
+from plugins.themes.utils import ThemeUtils, ThemesConfigConflict
+from resource_utils import upsert_resources
 from utils import i18n
 
 
 class ThemesController:
     """Controller for theme model"""
 
-    def __init__(self, app, handler, themesconfig):
+    def __init__(self, app, handler):
         """Constructor
 
         :param Flask app: Flask application
+        :param handler: Tenant config handler
         """
 
         # index
@@ -117,26 +118,22 @@ class ThemesController:
 
         self.app = app
         self.handler = handler
-        self.themesconfig = themesconfig
         self.template_dir = "plugins/themes/templates"
 
         config_handler = handler()
-        current_handler = handler()
-        db_engine = config_handler.db_engine()
-        self.config_models = ConfigModels(
-            db_engine, config_handler.conn_str(),
-            qwc_config_schema=current_handler.qwc_config_schema()
-        )
+        self.config_models = config_handler.config_models()
         self.resources = self.config_models.model('resources')
 
     def index(self):
         """Show theme list."""
-        self.themesconfig = ThemeUtils.load_themesconfig(self.app, self.handler)
+        themesconfig, revision = ThemeUtils.load_themesconfig_revision(
+            self.app, self.handler
+        )
         themes = OrderedDict()
         themes["items"] = []
         themes["groups"] = []
 
-        for item in self.themesconfig["themes"].get("items", []):
+        for item in themesconfig["themes"].get("items", []):
             themes["items"].append({
                 "name": item["title"] if "title" in item else item["url"],
                 "url": item["url"],
@@ -144,7 +141,7 @@ class ThemesController:
             })
 
         # TODO: nested groups
-        for group in self.themesconfig["themes"].get("groups", []):
+        for group in themesconfig["themes"].get("groups", []):
             groupEntry = {
                 "title": group["title"],
                 "items": []
@@ -159,12 +156,13 @@ class ThemesController:
 
         return render_template(
             "%s/themes.html" % self.template_dir, themes=themes,
-            endpoint_suffix="theme", title=i18n('plugins.themes.themes.title'), i18n=i18n
+            revision=revision, endpoint_suffix="theme", title=i18n('plugins.themes.themes.title'), i18n=i18n
         )
 
     def new_theme(self, gid=None):
         """Show new theme form."""
-        form = self.create_form()
+        themesconfig = ThemeUtils.load_themesconfig(self.app, self.handler)
+        form = self.create_form(themesconfig)
         template = "%s/theme.html" % self.template_dir
         title = i18n('plugins.themes.themes.create_theme_title')
         action = url_for("create_theme", gid=gid)
@@ -176,13 +174,14 @@ class ThemesController:
 
     def create_theme(self, gid=None):
         """Create new theme."""
-        form = self.create_form()
+        themesconfig = ThemeUtils.load_themesconfig(self.app, self.handler)
+        form = self.create_form(themesconfig)
         if form.validate_on_submit():
             try:
-                self.create_or_update_theme(None, form, gid=gid)
-                flash("{0}: {1}.".format(
-                    i18n('plugins.themes.themes.create_theme_message_success'),form.title.data),
-                      "success")
+                if self.create_or_update_theme(None, form, gid=gid):
+                    flash("{0}: {1}.".format(
+                        i18n('plugins.themes.themes.create_theme_message_success'),form.title.data),
+                          "success")
                 return redirect(url_for("themes"))
             except ValidationError:
                 flash("{0} {1}.".format(
@@ -208,13 +207,18 @@ class ThemesController:
         :param int id: Theme ID
         """
         # find theme
-        theme = self.find_theme(tid, gid)
+        themesconfig, revision = ThemeUtils.load_themesconfig_revision(
+            self.app, self.handler
+        )
+        theme = self.find_theme(themesconfig, tid, gid)
 
         if theme is not None:
             template = "%s/theme.html" % self.template_dir
-            form = self.create_form(theme)
+            form = self.create_form(themesconfig, theme)
             title = i18n('plugins.themes.themes.edit_theme_title')
-            action = url_for("update_theme", tid=tid, gid=gid)
+            action = url_for(
+                "update_theme", tid=tid, gid=gid, revision=revision
+            )
 
             return render_template(
                 template, title=title, form=form, action=action, theme=theme,
@@ -230,19 +234,24 @@ class ThemesController:
         :param int id: Theme ID
         """
         # find theme
-        theme = self.find_theme(tid, gid)
+        revision = request.values.get('revision')
+        themesconfig = ThemeUtils.load_themesconfig(self.app, self.handler)
+        theme = self.find_theme(themesconfig, tid, gid)
 
         if theme is not None:
-            form = self.create_form()
+            form = self.create_form(themesconfig)
 
             if form.validate_on_submit():
                 try:
                     # update theme
-                    self.create_or_update_theme(theme, form, tid=tid, gid=gid)
-                    flash("{0} : {1}.".format(
-                        i18n('plugins.themes.themes.update_theme_message_success'), form.title.data), 
-                        "success")
-                    return redirect(url_for("themes"))
+                    saved = self.create_or_update_theme(
+                        theme, form, tid=tid, gid=gid, revision=revision
+                    )
+                    if saved:
+                        flash("{0} : {1}.".format(
+                            i18n('plugins.themes.themes.update_theme_message_success'), form.title.data), 
+                            "success")
+                        return redirect(url_for("themes"))
                 except ValidationError:
                     flash("{0} {1}.".format(
                         i18n('plugins.themes.themes.update_theme_message_error'), form.title.data), 
@@ -255,7 +264,9 @@ class ThemesController:
             # show validation errors
             template = "%s/theme.html" % self.template_dir
             title = i18n('plugins.themes.themes.update_theme_title')
-            action = url_for("update_theme", tid=tid, gid=gid)
+            action = url_for(
+                "update_theme", tid=tid, gid=gid, revision=revision
+            )
 
             return render_template(
                 template, title=title, form=form, action=action, tid=tid,
@@ -267,15 +278,15 @@ class ThemesController:
             abort(404)
 
     def delete_theme(self, tid, gid=None):
-        if gid is None:
-            name = self.themesconfig["themes"]["items"][tid]["url"]
-            name = name.split("/")[-1]
-            self.themesconfig["themes"]["items"].pop(tid)
-        else:
-            name = self.themesconfig["themes"]["groups"][gid]["items"][tid]["url"]
-            name = name.split("/")[-1]
-            self.themesconfig["themes"]["groups"][gid]["items"].pop(tid)
+        removed = []
+
+        def patch(themesconfig):
+            removed.append(self.theme_items(themesconfig, gid).pop(tid))
 
+        if not self.update_themesconfig(patch, request.values.get('revision')):
+            return redirect(url_for("themes"))
+
+        name = removed[0]["url"].split("/")[-1]
         with self.config_models.session() as session, session.begin():
             resource = session.query(self.resources).filter_by(
                 type="map", name=name
@@ -291,12 +302,11 @@ class ThemesController:
                         i18n('plugins.themes.themes.delete_theme_message_error'), resource.name), 
                         "warning")
 
-        self.save_themesconfig()
         return redirect(url_for("themes"))
 
     def move_theme(self, direction, tid, gid=None):
-        if gid is None:
-            items = self.themesconfig["themes"]["items"]
+        def patch(themesconfig):
+            items = self.theme_items(themesconfig, gid)
 
             if direction == "up" and tid > 0:
                 items[tid-1], items[tid] = items[tid], items[tid-1]
@@ -304,75 +314,100 @@ class ThemesController:
             elif direction == "down" and len(items)-1 > tid:
                 items[tid], items[tid+1] = items[tid+1], items[tid]
 
-            self.themesconfig["themes"]["items"] = items
-
-        else:
-            items = self.themesconfig["themes"]["groups"][gid]["items"]
-
-            if direction == "up" and tid > 0:
-                items[tid-1], items[tid] = items[tid], items[tid-1]
-
-            elif direction == "down" and len(items)-1 > tid:
-                items[tid], items[tid+1] = items[tid+1], items[tid]
-
-            self.themesconfig["themes"]["groups"][gid]["items"] = items
-
-        self.save_themesconfig()
+        self.update_themesconfig(patch, request.values.get('revision'))
         return redirect(url_for("themes"))
 
     def move_theme_to_group(self, tid, old_gid, gid):
         if old_gid == gid : 
             return redirect(url_for("themes"))
-        if old_gid == 'undefined':
-            items = self.themesconfig["themes"]["items"]
-            self.themesconfig["themes"]["groups"][int(gid)]["items"].append(items[int(tid)])
-            self.themesconfig["themes"]["items"].pop(int(tid))
-        elif gid == 'undefined':
-            items = self.themesconfig["themes"]["groups"][int(old_gid)]["items"]
-            self.themesconfig["themes"]["items"].append(items[int(tid)])
-            self.themesconfig["themes"]["groups"][int(old_gid)]["items"].pop(int(tid))
-        else:
-            items = self.themesconfig["themes"]["groups"][int(old_gid)]["items"]
-            self.themesconfig["themes"]["groups"][int(gid)]["items"].append(items[int(tid)])
-            self.themesconfig["themes"]["groups"][int(old_gid)]["items"].pop(int(tid))
-        self.save_themesconfig()
+
+        def patch(themesconfig):
+            old_items = self.theme_items(
+                themesconfig, None if old_gid == 'undefined' else int(old_gid)
+            )
+            items = self.theme_items(
+                themesconfig, None if gid == 'undefined' else int(gid)
+            )
+            items.append(old_items.pop(int(tid)))
+
+        self.update_themesconfig(patch, request.values.get('revision'))
         return redirect(url_for("themes"))
 
     def add_theme_group(self):
-        self.themesconfig["themes"]["groups"] = self.themesconfig["themes"].get("groups", [])
-        self.themesconfig["themes"]["groups"].append({
-            "title": i18n('plugins.themes.themes.new_group'),
-            "items": []
-        })
-        self.save_themesconfig()
+        def patch(themesconfig):
+            themesconfig["themes"]["groups"] = themesconfig["themes"].get("groups", [])
+            themesconfig["themes"]["groups"].append({
+                "title": i18n('plugins.themes.themes.new_group'),
+                "items": []
+            })
+
+        # NOTE: appending does not conflict with concurrent changes
+        self.update_themesconfig(patch)
         return redirect(url_for("themes"))
 
     def delete_theme_group(self, gid):
-        self.themesconfig["themes"]["groups"].pop(gid)
-        self.save_themesconfig()
+        def patch(themesconfig):
+            themesconfig["themes"]["groups"].pop(gid)
+
+        self.update_themesconfig(patch, request.values.get('revision'))
         return redirect(url_for("themes"))
 
     def update_theme_group(self, gid):
-        self.themesconfig["themes"]["groups"][gid]["title"] = request.form[
-            "group_title"]
-        self.save_themesconfig()
+        title = request.form["group_title"]
+
+        def patch(themesconfig):
+            themesconfig["themes"]["groups"][gid]["title"] = title
+
+        self.update_themesconfig(patch, request.values.get('revision'))
         return redirect(url_for("themes"))
 
     def move_theme_group(self, gid, direction):
-        groups = self.themesconfig["themes"]["groups"]
+        def patch(themesconfig):
+            groups = themesconfig["themes"]["groups"]
 
-        if direction == "up" and gid > 1:
-            groups[gid-1], groups[gid] = groups[gid], groups[gid-1]
+            if direction == "up" and gid > 1:
+                groups[gid-1], groups[gid] = groups[gid], groups[gid-1]
 
-        elif direction == "down" and len(groups) > gid:
-            groups[gid], groups[gid-1] = groups[gid-1], groups[gid]
+            elif direction == "down" and len(groups) > gid:
+                groups[gid], groups[gid-1] = groups[gid-1], groups[gid]
 
-        self.themesconfig["themes"]["groups"] = groups
-        self.save_themesconfig()
+        self.update_themesconfig(patch, request.values.get('revision'))
         return redirect(url_for("themes"))
 
+    def update_themesconfig(self, patch, revision=None):
+        """Apply changes to the themesconfig and return whether it was saved.
+
+        The changes are rejected if the themesconfig was modified since the
+        revision.
+
+        :param func patch: Function modifying the themesconfig
+        :param str revision: Revision the changes are based on
+                             (None to apply changes regardless of
+                             concurrent modifications)
+        """
+        try:
+            saved = ThemeUtils.update_themesconfig(
+                self.app, self.handler, patch, revision
+            )
+        except ThemesConfigConflict as e:
+            self.app.logger.warning(e)
+            flash(i18n('plugins.themes.common.conflict_message'), "warning")
+            return False
+
+        if saved:
+            flash(i18n('plugins.themes.themes.save_theme_message_success'), "success")
+        else:
+            flash(i18n('plugins.themes.themes.save_theme_message_error'),
+                  "error")
+
+        return saved
+
     def save_themesconfig(self):
-        if ThemeUtils.save_themesconfig(self.themesconfig, self.app, self.handler):
+        # NOTE: changes are saved immediately, check themesconfig is valid
+        _themesconfig, revision = ThemeUtils.load_themesconfig_revision(
+            self.app, self.handler
+        )
+        if revision is not None:
             flash(i18n('plugins.themes.themes.save_theme_message_success'), "success")
         else:
             flash(i18n('plugins.themes.themes.save_theme_message_error'),
@@ -381,21 +416,33 @@ class ThemesController:
         return redirect(url_for("themes"))
 
     def reset_themesconfig(self):
-        self.themesconfig = ThemeUtils.load_themesconfig(self.app, self.handler)
+        # NOTE: themesconfig is reloaded on each request
         flash(i18n('plugins.themes.themes.reload_theme_message'), "warning")
         return redirect(url_for("themes"))
 
-    def find_theme(self, tid, gid=None):
+    def theme_items(self, themesconfig, gid=None):
+        """Return list of themes at top level or of a theme group.
+
+        :param obj themesconfig: Themes config
+        :param int gid: Optional theme group ID
+        """
+        if gid is None:
+            return themesconfig["themes"]["items"]
+        else:
+            return themesconfig["themes"]["groups"][gid]["items"]
+
+    def find_theme(self, themesconfig, tid, gid=None):
         """Find theme by ID.
 
+        :param obj themesconfig: Themes config
         :param int id: Theme ID
         """
         if gid is None:
-            for i, item in enumerate(self.themesconfig["themes"]["items"]):
+            for i, item in enumerate(themesconfig["themes"]["items"]):
                 if i == tid:
                     return item
         else:
-            for i, group in enumerate(self.themesconfig["themes"]["groups"]):
+            for i, group in enumerate(themesconfig["themes"]["groups"]):
                 if i == gid:
                     for j, item in enumerate(group["items"]):
                         if j == tid:
@@ -403,9 +450,10 @@ class ThemesController:
 
         return None
 
-    def create_form(self, theme=None):
+    def create_form(self, themesconfig, theme=None):
         """Return form with fields loaded from themesConfig.json.
 
+        :param obj themesconfig: Themes config
         :param object theme: Optional theme object
         """
         form = ThemeForm()
@@ -413,7 +461,7 @@ class ThemesController:
             form = ThemeForm(url=theme["url"])
 
         crslist = ThemeUtils.get_crs(self.app, self.handler)
-        defaultSearchProvidersList = self.themesconfig.get('defaultSearchProviders', [])
+        defaultSearchProvidersList = themesconfig.get('defaultSearchProviders', [])
 
         form.url.choices = [("", "---")] + ThemeUtils.get_projects(self.app, self.handler)
         form.thumbnail.choices = ThemeUtils.get_mapthumbs(self.app, self.handler)
@@ -421,11 +469,11 @@ class ThemesController:
         form.mapCrs.choices = crslist
         form.additionalMouseCrs.choices = crslist
         form.searchProviders.choices = defaultSearchProvidersList
-        form.backgroundLayersList = self.get_backgroundlayers()
+        form.backgroundLayersList = self.get_backgroundlayers(themesconfig)
 
         if form.backgroundLayers.data:
             for i in range(len(form.backgroundLayers.data)):
-                form.backgroundLayers[i].layerName.choices = self.get_backgroundlayers()
+                form.backgroundLayers[i].layerName.choices = self.get_backgroundlayers(themesconfig)
 
         if theme is None:
             return form
@@ -515,7 +563,7 @@ class ThemesController:
                         "visibility": False
                     }
 
-                    for l in self.get_backgroundlayers():
+                    for l in self.get_backgroundlayers(themesconfig):
                         if layer["name"] == l[0]:
                             data["layerName"] = l
 
@@ -526,7 +574,7 @@ class ThemesController:
                         data["visibility"] = layer["visibility"]
 
                     form.backgroundLayers.append_entry(data)
-                    form.backgroundLayers[i].layerName.choices = self.get_backgroundlayers()
+                    form.backgroundLayers[i].layerName.choices = self.get_backgroundlayers(themesconfig)
                     form.backgroundLayers[i].layerName.data = layer["name"]
             qgis_search = [provider for provider in theme.get("searchProviders", []) if "provider" in provider and provider.get("provider") == "qgis"]
             if qgis_search :
@@ -561,12 +609,17 @@ class ThemesController:
 
             return form
 
-    def create_or_update_theme(self, theme, form, tid=None, gid=None):
-        """Create or update theme records in Themesconfig.
+    def create_or_update_theme(self, theme, form, tid=None, gid=None,
+                               revision=None):
+        """Create or update theme records in Themesconfig and return whether
+        it was saved.
 
         :param object theme: Optional theme object
                                 (None for create)
         :param FlaskForm form: Form for theme
+        :param int tid: Theme ID (None for create)
+        :param int gid: Optional theme group ID
+        :param str revision: Themesconfig revision of edited theme
         """
         item = OrderedDict()
         item["url"] = form.url.data
@@ -750,45 +803,47 @@ class ThemesController:
             if "backgroundLayers" in item: del item["backgroundLayers"]
 
         new_name = form.url.data.split("/")[-1]
+        replaced = []
+        if theme:
+            def patch(themesconfig):
+                items = self.theme_items(themesconfig, gid)
+                replaced.append(items[tid])
+                items[tid] = item
+        else:
+            # NOTE: appending does not conflict with concurrent changes
+            revision = None
+
+            def patch(themesconfig):
+                self.theme_items(themesconfig, gid).append(item)
+
+        if not self.update_themesconfig(patch, revision):
+            return False
+
         with self.config_models.session() as session, session.begin():
             # edit theme
             if theme:
-                if gid is None:
-                    name = self.themesconfig["themes"]["items"][tid]["url"]
-                    self.themesconfig["themes"]["items"][tid] = item
-                else:
-                    name = self.themesconfig["themes"]["groups"][gid]["items"][tid]["url"]
-                    self.themesconfig["themes"]["groups"][gid]["items"][tid] = item
-
-                name = name.split("/")[-1]
+                name = replaced[0]["url"].split("/")[-1]
                 resource = session.query(self.resources).filter_by(name=name).first()
                 if resource:
                     resource.name = new_name
 
             # new theme
             else:
-                resource = self.resources()
-                resource.type = "map"
-                resource.name = new_name
                 try:
-                    session.add(resource)
+                    upsert_resources(self.resources, [
+                        {"type": "map", "name": new_name, "parent_id": None}
+                    ], session)
                 except InternalError as e:
                     flash("InternalError: {0}".format(e.orig), "error")
                 except IntegrityError as e:
                     flash("{0}: '{1}'!".format(
-                        i18n('plugins.themes.themes.create_theme_message_integrity_error'), resource.name), 
+                        i18n('plugins.themes.themes.create_theme_message_integrity_error'), new_name), 
                         "warning")
 
-                if gid is None:
-                    self.themesconfig["themes"]["items"].append(item)
-                else:
-                    self.themesconfig["themes"]["groups"][gid]["items"].append(
-                        item)
-
-        self.save_themesconfig()
+        return True
 
-    def get_backgroundlayers(self):
+    def get_backgroundlayers(self, themesconfig):
         layers = []
-        for layer in self.themesconfig["themes"]["backgroundLayers"]:
+        for layer in themesconfig["themes"]["backgroundLayers"]:
             layers.append((layer["name"], layer["name"]))
         return layers
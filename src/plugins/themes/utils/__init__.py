@@ -1 +1 @@
-from .themes import ThemeUtils
+from .themes import ThemeUtils, ThemesConfigConflict
@@ -0,0 +1,232 @@
+import os
+import threading
+import time
+
+
+class FileIndex:
+    """In-memory index of the file names in directory trees, e.g. the QGIS
+    resources, info templates and mapthumbs.
+
+    Each tree is scanned once with os.scandir. After the check interval, the
+    modification times of the indexed directories are compared, which change
+    if entries are added, removed or renamed, and only changed directories
+    are listed again. Hidden files and directories and symlinks to
+    directories are ignored.
+    """
+
+    # default interval in seconds between checks for changed directories
+    DEFAULT_CHECK_INTERVAL = 30
+
+    def __init__(self, logger):
+        """Constructor
+
+        :param Logger logger: Application logger
+        """
+        self.logger = logger
+
+        # lookup for indexed trees as
+        #   {<root path>: {
+        #       'dirs': {<relative dir path>: {
+        #           'mtime_ns': <mtime_ns>,
+        #           'files': [<file name>],
+        #           'subdirs': [<dir name>]
+        #       }},
+        #       'checked_at': <timestamp>,
+        #       'results': {(<extensions>, <recursive>): [<relative path>]}
+        #   }}
+        self.roots = {}
+        self.lock = threading.Lock()
+
+    def files(self, root, extensions=None, recursive=True,
+              check_interval=DEFAULT_CHECK_INTERVAL):
+        """Return sorted relative paths of files in a directory tree.
+
+        :param str root: Root directory
+        :param tuple extensions: Optional file extensions, e.g. ('.shp',)
+        :param bool recursive: Set to False to only list files in root
+        :param int check_interval: Interval in seconds between checks for
+                                   changed directories
+        """
+        root = os.path.normpath(root)
+        key = (tuple(extensions) if extensions else None, recursive)
+
+        with self.lock:
+            entry = self.roots.get(root)
+            if entry is None:
+                entry = self.scan(root)
+                self.roots[root] = entry
+            elif time.time() > entry['checked_at'] + check_interval:
+                self.update(root, entry)
+
+            files = entry['results'].get(key)
+            if files is None:
+                files = self.collect(entry['dirs'], extensions, recursive)
+                entry['results'][key] = files
+
+        return list(files)
+
+    def refresh(self, root=None):
+        """Check a directory tree, or all trees if None, for changes on next
+        access, e.g. after uploading or deleting files.
+
+        :param str root: Root directory
+        """
+        with self.lock:
+            for path, entry in self.roots.items():
+                if root is None or path == os.path.normpath(root):
+                    entry['checked_at'] = 0
+
+    def scan(self, root):
+        """Scan directory tree and return new index entry.
+
+        :param str root: Root directory
+        """
+        start = time.perf_counter()
+        dirs = {}
+        self.scan_dir(root, '', dirs)
+
+        self.logger.info(
+            "Indexed %d files in %d directories of %s in %.3fs" % (
+                sum([len(d['files']) for d in dirs.values()]), len(dirs),
+                root, time.perf_counter() - start
+            )
+        )
+
+        return {
+            'dirs': dirs,
+            'checked_at': time.time(),
+            'results': {}
+        }
+
+    def update(self, root, entry):
+        """List changed directories again and update index entry.
+
+        :param str root: Root directory
+        :param obj entry: Index entry
+        """
+        start = time.perf_counter()
+        dirs = entry['dirs']
+        changed = 0
+
+        if '' not in dirs:
+            # root was missing or unreadable, scan it if it exists now
+            self.scan_dir(root, '', dirs)
+            if '' in dirs:
+                changed += 1
+
+        for rel_path in sorted(dirs.keys()):
+            current = dirs.get(rel_path)
+            if current is None:
+                # removed with parent
+                continue
+
+            try:
+                mtime_ns = os.stat(os.path.join(root, rel_path)).st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            if mtime_ns == current['mtime_ns']:
+                continue
+
+            changed += 1
+            listing = self.list_dir(root, rel_path)
+            if listing is None:
+                self.remove_dir(rel_path, dirs)
+                continue
+
+            # update subdirs
+            subdirs = set(listing['subdirs'])
+            for name in current['subdirs']:
+                if name not in subdirs:
+                    self.remove_dir(os.path.join(rel_path, name), dirs)
+            for name in listing['subdirs']:
+                if os.path.join(rel_path, name) not in dirs:
+                    self.scan_dir(root, os.path.join(rel_path, name), dirs)
+            dirs[rel_path] = listing
+
+        entry['checked_at'] = time.time()
+        if changed:
+            entry['results'] = {}
+            self.logger.info(
+                "Updated %d changed of %d directories of %s in %.3fs" % (
+                    changed, len(dirs), root, time.perf_counter() - start
+                )
+            )
+
+    def scan_dir(self, root, rel_path, dirs):
+        """Add directory and its subdirs to index.
+
+        :param str root: Root directory
+        :param str rel_path: Directory path relative to root
+        :param dict dirs: Indexed directories
+        """
+        pending = [rel_path]
+        while pending:
+            rel_path = pending.pop()
+            listing = self.list_dir(root, rel_path)
+            if listing is not None:
+                dirs[rel_path] = listing
+                for name in listing['subdirs']:
+                    pending.append(os.path.join(rel_path, name))
+
+    def list_dir(self, root, rel_path):
+        """Return directory listing as
+        {'mtime_ns': <mtime_ns>, 'files': [<name>], 'subdirs': [<name>]},
+        or None if the directory is missing or unreadable.
+
+        :param str root: Root directory
+        :param str rel_path: Directory path relative to root
+        """
+        path = os.path.join(root, rel_path)
+        files = []
+        subdirs = []
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            with os.scandir(path) as entries:
+                for dir_entry in entries:
+                    if dir_entry.name.startswith('.'):
+                        continue
+                    if dir_entry.is_dir(follow_symlinks=False):
+                        subdirs.append(dir_entry.name)
+                    elif dir_entry.is_dir():
+                        # skip symlinked dirs, which may form loops
+                        continue
+                    else:
+                        files.append(dir_entry.name)
+        except OSError as e:
+            self.logger.warning("Could not index %s: %s" % (path, e))
+            return None
+
+        return {
+            'mtime_ns': mtime_ns,
+            'files': files,
+            'subdirs': subdirs
+        }
+
+    def remove_dir(self, rel_path, dirs):
+        """Remove directory and its subdirs from index.
+
+        :param str rel_path: Directory path relative to root
+        :param dict dirs: Indexed directories
+        """
+        prefix = os.path.join(rel_path, '')
+        for path in list(dirs.keys()):
+            if path == rel_path or path.startswith(prefix):
+                del dirs[path]
+
+    def collect(self, dirs, extensions, recursive):
+        """Return sorted relative paths of indexed files.
+
+        :param dict dirs: Indexed directories
+        :param tuple extensions: Optional file extensions
+        :param bool recursive: Set to False to only list files in root
+        """
+        extensions = tuple(extensions) if extensions else None
+        files = []
+        for rel_path, indexed_dir in dirs.items():
+            if not recursive and rel_path != '':
+                continue
+            for name in indexed_dir['files']:
+                if extensions is None or name.endswith(extensions):
+                    files.append(os.path.join(rel_path, name))
+
+        return sorted(files)
@@ -0,0 +1,157 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+from sqlalchemy.sql import text as sql_text
+
+
+class ProjectCatalog:
+    """Per-tenant catalog of QGIS projects in the filesystem and the
+    QGIS projects DB.
+
+    The filesystem projects are listed from the shared FileIndex of the
+    QGIS resources. The DB projects are cached and queried again after the
+    cache TTL.
+    """
+
+    # default time in seconds before querying the QGIS projects DB again
+    DEFAULT_CACHE_TTL = 30
+
+    # DB connection for QGIS projects stored in PostgreSQL
+    QGIS_PROJECTS_DB_URL = 'postgresql:///?service=qgisprojects'
+
+    def __init__(self, db_engine, file_index):
+        """Constructor
+
+        :param DatabaseEngine db_engine: Database engine with DB connections
+        :param FileIndex file_index: Index of QGIS resources
+        """
+        self.db_engine = db_engine
+        self.file_index = file_index
+
+        # lookup for cached DB projects as
+        #   {<tenant>: {
+        #       'ows_prefix': <ows prefix>,
+        #       'db_projects': [(<url>, <title>)],
+        #       'expires': <timestamp>
+        #   }}
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def projects(self, tenant, config, logger):
+        """Return sorted list of QGIS projects as [(<url>, <title>)].
+
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        :param Logger logger: Application logger
+        """
+        resources_path = config.get("qgs_resources_path")
+        project_ext = config.get("qgis_project_extension", ".qgs")
+        ows_prefix = config.get(
+            "ows_prefix", urlparse(config.get("ogc_service_url", "")).path
+        )
+
+        projects = []
+        for path in self.file_index.files(
+            resources_path, [project_ext], check_interval=config.get(
+                "resources_index_check_interval",
+                self.file_index.DEFAULT_CHECK_INTERVAL
+            )
+        ):
+            project = path[:-len(project_ext)].replace("\\", "/")
+            url = ows_prefix.rstrip("/") + "/" + project
+            projects.append((url, project))
+
+        return sorted(
+            projects + self.db_projects(tenant, config, ows_prefix, logger)
+        )
+
+    def db_projects(self, tenant, config, ows_prefix, logger):
+        """Return cached QGIS projects from the QGIS projects DB as
+        [(<url>, <title>)].
+
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        :param str ows_prefix: OWS service prefix
+        :param Logger logger: Application logger
+        """
+        ttl = config.get("projects_cache_ttl", self.DEFAULT_CACHE_TTL)
+
+        entry = self.entries.get(tenant)
+        if (
+            entry is not None and entry['ows_prefix'] == ows_prefix and
+            time.time() < entry['expires']
+        ):
+            # cache hit
+            return entry['db_projects']
+
+        with self.lock:
+            entry = self.entries.get(tenant)
+            if (
+                entry is None or entry['ows_prefix'] != ows_prefix or
+                time.time() >= entry['expires']
+            ):
+                entry = {
+                    'ows_prefix': ows_prefix,
+                    'db_projects': self.query_db_projects(ows_prefix, logger),
+                    'expires': time.time() + ttl
+                }
+                self.entries[tenant] = entry
+
+            return entry['db_projects']
+
+    def invalidate(self, tenant=None):
+        """Drop cached DB projects of a tenant, or of all tenants if None.
+
+        :param str tenant: Tenant ID
+        """
+        with self.lock:
+            if tenant is None:
+                self.entries = {}
+            else:
+                self.entries.pop(tenant, None)
+
+    def query_db_projects(self, ows_prefix, logger):
+        """Return QGIS projects stored in the QGIS projects DB as
+        [(<url>, <title>)].
+
+        :param str ows_prefix: OWS service prefix
+        :param Logger logger: Application logger
+        """
+        projects = []
+        try:
+            db = self.db_engine.db_engine(self.QGIS_PROJECTS_DB_URL)
+            with db.connect() as connection:
+                # find schemas with a qgis_projects table
+                sql = sql_text("""
+                    SELECT table_schema
+                    FROM information_schema.tables
+                    WHERE table_name = 'qgis_projects'
+                    ORDER BY table_schema
+                """)
+                schemas = connection.execute(sql).scalars().all()
+                if not schemas:
+                    return []
+
+                sql = sql_text(" UNION ALL ".join([
+                    'SELECT :schema_{index} AS schema_name, name '
+                    'FROM "{schema}"."qgis_projects"'.format(
+                        index=index, schema=schema.replace('"', '""')
+                    )
+                    for index, schema in enumerate(schemas)
+                ]))
+                params = dict([
+                    ('schema_%d' % index, schema)
+                    for index, schema in enumerate(schemas)
+                ])
+                for row in connection.execute(sql, params).mappings():
+                    url = "%s/pg/%s/%s" % (
+                        ows_prefix.rstrip("/"), row["schema_name"],
+                        row["name"]
+                    )
+                    projects.append((url, row["name"] + " (DB)"))
+        except Exception as e:
+            # QGIS projects DB is optional
+            logger.debug("Could not query QGIS projects DB: %s" % e)
+
+        return projects
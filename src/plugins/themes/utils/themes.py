@@ -1,111 +1,363 @@
 import os
+import copy
+import glob
+import hashlib
 import json
-import pathlib
 import datetime
+import shutil
+import tempfile
+import threading
+import time
 from collections import OrderedDict
-from sqlalchemy.sql import text as sql_text
-from urllib.parse import urlparse
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # no file locks on Windows
+    fcntl = None
 
 from qwc_services_core.database import DatabaseEngine
 
+from .file_index import FileIndex
+from .project_catalog import ProjectCatalog
+
 db_engine = DatabaseEngine()
 
+
+class ThemesConfigConflict(Exception):
+    """Raised if the themes config was modified since the edited revision."""
+
+
 class ThemeUtils():
     """ Utils for Themes"""
 
+    # default min interval in seconds between backups of a config file
+    DEFAULT_BACKUP_INTERVAL = 60
+
+    # lookup for parsed JSON files as
+    # {<path>: {'stat': (<mtime_ns>, <size>), 'revision': <hash>,
+    #           'data': <JSON>}}
+    json_cache = {}
+    lock = threading.RLock()
+
+    # shared index of QGIS resources, info templates and mapthumbs,
+    # set in init_indexes()
+    file_index = None
+    # cached QGIS projects, set in init_indexes()
+    project_catalog = None
+
+    # extensions of geospatial files in QGIS_RESOURCES_PATH
+    LAYER_EXTENSIONS = ['.geojson', '.kml', '.gpkg', '.shp']
+
+    @staticmethod
+    def init_indexes(app):
+        """Create shared file index and QGIS project catalog.
+
+        :param Flask app: Flask application
+        """
+        ThemeUtils.file_index = FileIndex(app.logger)
+        ThemeUtils.project_catalog = ProjectCatalog(
+            db_engine, ThemeUtils.file_index
+        )
+
+    @staticmethod
+    def indexed_files(handler, root, extensions=None, recursive=True):
+        """Return sorted relative paths of files from shared file index.
+
+        :param handler: Tenant config handler
+        :param str root: Root directory
+        :param list extensions: Optional file extensions
+        :param bool recursive: Set to False to only list files in root
+        """
+        check_interval = handler().config().get(
+            "resources_index_check_interval",
+            FileIndex.DEFAULT_CHECK_INTERVAL
+        )
+        return ThemeUtils.file_index.files(
+            root, extensions, recursive, check_interval
+        )
+
+    @staticmethod
+    def read_json(path):
+        """Return parsed JSON file.
+
+        NOTE: the returned object is cached and shared, do not modify it
+
+        :param str path: File path
+        """
+        return ThemeUtils.read_json_revision(path)[0]
+
+    @staticmethod
+    def read_json_revision(path, force=False):
+        """Return parsed JSON file and its revision as (data, revision).
+
+        The parsed JSON is cached and revalidated using the mtime and size
+        of the file. The revision is the hash of the file content.
+
+        NOTE: the returned object is cached and shared, do not modify it
+
+        :param str path: File path
+        :param bool force: Set to True to always read the file
+        """
+        stat = os.stat(path)
+        entry = ThemeUtils.json_cache.get(path)
+        if (
+            not force and entry is not None and
+            entry['stat'] == (stat.st_mtime_ns, stat.st_size)
+        ):
+            return entry['data'], entry['revision']
+
+        with open(path, 'rb') as fh:
+            content = fh.read()
+            stat = os.fstat(fh.fileno())
+        data = json.loads(content.decode('utf-8'), object_pairs_hook=OrderedDict)
+        revision = hashlib.sha1(content).hexdigest()
+        ThemeUtils.json_cache[path] = {
+            'stat': (stat.st_mtime_ns, stat.st_size),
+            'revision': revision,
+            'data': data
+        }
+        return data, revision
+
+    @staticmethod
+    @contextmanager
+    def file_lock(path):
+        """Lock a file exclusively across threads and worker processes.
+
+        A hidden lock file next to the file is used, as the file itself is
+        replaced on write.
+
+        :param str path: File path
+        """
+        lock_path = os.path.join(
+            os.path.dirname(path), ".%s.lock" % os.path.basename(path)
+        )
+        with ThemeUtils.lock:
+            if fcntl is None:
+                yield
+                return
+            with open(lock_path, 'a') as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    @staticmethod
+    def write_json(app, path, data, backup_interval=0):
+        """Write JSON file atomically and return whether it was written.
+
+        The current file is backed up, unless there is a backup younger
+        than backup_interval, so that consecutive changes are backed up
+        once.
+
+        NOTE: lock the file using file_lock() while reading and writing
+
+        :param Flask app: Flask application
+        :param str path: File path
+        :param obj data: JSON data
+        :param float backup_interval: Min interval in seconds between backups
+        """
+        try:
+            content = json.dumps(
+                data, indent=2, separators=(',', ': ')
+            ).encode('utf-8')
+            if os.path.exists(path):
+                backups = glob.glob(glob.escape(path) + "-*.bak")
+                if backup_interval <= 0 or not backups or (
+                    time.time() - max(map(os.path.getmtime, backups)) >
+                    backup_interval
+                ):
+                    baksuffix = "%s.bak" % datetime.datetime.now(
+                        datetime.UTC
+                    ).strftime("-%Y%m%d-%H%M%S")
+                    shutil.copyfile(path, path + baksuffix)
+            ThemeUtils.atomic_write(path, content)
+
+            stat = os.stat(path)
+            ThemeUtils.json_cache[path] = {
+                'stat': (stat.st_mtime_ns, stat.st_size),
+                'revision': hashlib.sha1(content).hexdigest(),
+                'data': data
+            }
+        except (IOError, TypeError, ValueError) as e:
+            app.logger.error("Failed to backup/save %s: %s" % (path, e))
+            return False
+
+        return True
+
+    @staticmethod
+    def atomic_write(path, content):
+        """Replace file content atomically.
+
+        :param str path: File path
+        :param bytes content: File content
+        """
+        dirname = os.path.dirname(path) or '.'
+        fd, tmp_path = tempfile.mkstemp(
+            dir=dirname, prefix=".%s." % os.path.basename(path),
+            suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(content)
+                fh.flush()
+                os.fsync(fh.fileno())
+            if os.path.exists(path):
+                # keep permissions of current file
+                shutil.copymode(path, tmp_path)
+            else:
+                umask = os.umask(0)
+                os.umask(umask)
+                os.chmod(tmp_path, 0o666 & ~umask)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if os.name == 'posix':
+            # persist rename
+            dir_fd = os.open(dirname, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+    @staticmethod
+    def themes_config_path(tenant_config, config_in_path):
+        """Return path of separate themes config file, or None if the
+        themes config is in tenantConfig.json.
+
+        :param dict tenant_config: Tenant config
+        :param str config_in_path: Input config path of tenant
+        """
+        themes_config_path = tenant_config.get("themesConfig", None)
+        if not isinstance(themes_config_path, str):
+            return None
+        if not os.path.isabs(themes_config_path):
+            themes_config_path = os.path.join(config_in_path, themes_config_path)
+        return themes_config_path
+
     @staticmethod
     def load_themesconfig(app, handler):
-        """Return themesconfig"""
+        """Return themesconfig
+
+        NOTE: the returned object is cached and shared, do not modify it
+        """
+        return ThemeUtils.load_themesconfig_revision(app, handler)[0]
+
+    @staticmethod
+    def load_themesconfig_revision(app, handler):
+        """Return themesconfig and its revision as (themesconfig, revision).
+
+        The revision is None if the themesconfig could not be loaded.
+
+        NOTE: the returned object is cached and shared, do not modify it
+        """
         current_handler = handler()
         config_in_path = os.path.join(current_handler.config().get("input_config_path"), current_handler.tenant)
         tenant_config_path = os.path.join(config_in_path, 'tenantConfig.json')
 
         try:
-            with open(tenant_config_path, encoding='utf-8') as fh:
-                tenant_config = json.load(fh, object_pairs_hook=OrderedDict)
-        except IOError as e:
-            app.logger.error("Error reading tenantConfig.json: {}".format(
-                e.strerror))
-            return {}
-
-        themes_config = tenant_config.get("themesConfig", None)
-
-        if isinstance(themes_config, str):
-            themes_config_path = themes_config
+            tenant_config, revision = ThemeUtils.read_json_revision(
+                tenant_config_path
+            )
+        except (IOError, ValueError) as e:
+            app.logger.error("Error reading tenantConfig.json: {}".format(e))
+            return {}, None
+
+        themes_config_path = ThemeUtils.themes_config_path(
+            tenant_config, config_in_path
+        )
+        if themes_config_path is not None:
             try:
-                if not os.path.isabs(themes_config_path):
-                    themes_config_path = os.path.join(config_in_path, themes_config_path)
-                with open(themes_config_path) as f:
-                    themes_config = json.load(f)
-            except:
+                themes_config, revision = ThemeUtils.read_json_revision(
+                    themes_config_path
+                )
+            except (IOError, ValueError):
                 msg = "Failed to read themes configuration %s" % themes_config_path
                 app.logger.error(msg)
-                return {}
-        elif not isinstance(themes_config, dict):
-            msg = "Missing or invalid themes configuration in tenantConfig.json"
-            app.logger.error(msg)
-            return {}
+                return {}, None
+        else:
+            themes_config = tenant_config.get("themesConfig", None)
+            if not isinstance(themes_config, dict):
+                msg = "Missing or invalid themes configuration in tenantConfig.json"
+                app.logger.error(msg)
+                return {}, None
 
-        return themes_config
+        return themes_config, revision
 
     @staticmethod
-    def save_themesconfig(new_themes_config, app, handler):
-        """Save themesconfig
+    def update_themesconfig(app, handler, patch, revision=None):
+        """Apply changes to the latest revision of the themesconfig and
+        return whether it was saved.
+
+        The themesconfig file is locked, reloaded and updated by the patch
+        function, so that concurrent changes by other workers are kept.
 
-        :param Dict new_themes_config: new themesConfig Dictionary
         :param Flask app: Flask application
+        :param handler: Tenant config handler
+        :param func patch: Function modifying the themesconfig passed as
+                           argument
+        :param str revision: Revision the changes are based on, raises
+                             ThemesConfigConflict if the themesconfig was
+                             modified since (None to skip check)
         """
         current_handler = handler()
         config_in_path = os.path.join(current_handler.config().get("input_config_path"), current_handler.tenant)
         tenant_config_path = os.path.join(config_in_path, 'tenantConfig.json')
+        backup_interval = current_handler.config().get(
+            "themes_config_backup_interval", ThemeUtils.DEFAULT_BACKUP_INTERVAL
+        )
 
         try:
-            with open(tenant_config_path, encoding='utf-8') as fh:
-                tenant_config = json.load(fh, object_pairs_hook=OrderedDict)
-        except IOError as e:
-            app.logger.error("Error reading tenantConfig.json: {}".format(
-                e.strerror))
+            tenant_config = ThemeUtils.read_json(tenant_config_path)
+        except (IOError, ValueError) as e:
+            app.logger.error("Error reading tenantConfig.json: {}".format(e))
             return False
 
-        baksuffix = "%s.bak" % datetime.datetime.now(datetime.UTC).strftime("-%Y%m%d-%H%M%S")
-        themes_config = tenant_config.get("themesConfig", None)
+        themes_config_path = ThemeUtils.themes_config_path(
+            tenant_config, config_in_path
+        )
+        path = themes_config_path or tenant_config_path
 
-        if isinstance(themes_config, str):
-            themes_config_path = themes_config
+        with ThemeUtils.file_lock(path):
             try:
-                if not os.path.isabs(themes_config_path):
-                    themes_config_path = os.path.join(config_in_path, themes_config_path)
-                with open(themes_config_path) as f:
-                    themes_config = json.load(f)
-
-                with open(themes_config_path + baksuffix, "w", encoding="utf-8") as fh:
-                    json.dump(themes_config, fh, indent=2, separators=(',', ': '))
-
-                with open(themes_config_path, "w", encoding="utf-8") as fh:
-                    json.dump(new_themes_config, fh, indent=2, separators=(',', ': '))
-
-            except IOError as e:
-                msg = "Failed to backup/save themes configuration %s: %s" % (themes_config_path, e.strerror)
+                data, current_revision = ThemeUtils.read_json_revision(
+                    path, force=True
+                )
+            except (IOError, ValueError) as e:
+                msg = "Failed to read themes configuration %s: %s" % (path, e)
                 app.logger.error(msg)
                 return False
-        elif isinstance(themes_config, dict):
-            try:
-                with open(tenant_config_path + baksuffix, "w", encoding="utf-8") as fh:
-                    json.dump(tenant_config, fh, indent=2, separators=(',', ': '))
-
-                tenant_config["themesConfig"] = new_themes_config
-                with open(tenant_config_path, "w", encoding="utf-8") as fh:
-                    json.dump(tenant_config, fh, indent=2, separators=(',', ': '))
-            except IOError as e:
-                msg = "Failed to backup/save themes configuration %s: %s" % (tenant_config_path, e.strerror)
+
+            if revision is not None and revision != current_revision:
+                raise ThemesConfigConflict(
+                    "Revision %s of %s is outdated" % (revision, path)
+                )
+
+            # NOTE: keep cached data unchanged until saved
+            data = copy.deepcopy(data)
+            if themes_config_path is not None:
+                themes_config = data
+            else:
+                themes_config = data.get("themesConfig", None)
+            if not isinstance(themes_config, dict):
+                msg = "Missing or invalid themes configuration in tenantConfig.json"
                 app.logger.error(msg)
                 return False
-        else:
-            msg = "Missing or invalid themes configuration in tenantConfig.json"
-            app.logger.error(msg)
-            return False
 
-        return True
+            try:
+                patch(themes_config)
+            except (IndexError, KeyError, ValueError) as e:
+                # changed or missing entries
+                raise ThemesConfigConflict(
+                    "Could not update %s: %s" % (path, e)
+                ) from e
+
+            return ThemeUtils.write_json(app, path, data, backup_interval)
 
     @staticmethod
     def load_featureinfo_config(app, handler):
@@ -116,16 +368,16 @@ class ThemeUtils():
         tenant_config_path = os.path.join(config_in_path, 'tenantConfig.json')
 
         try:
-            with open(tenant_config_path, encoding='utf-8') as fh:
-                tenant_config = json.load(fh, object_pairs_hook=OrderedDict)
-        except IOError as e:
-            app.logger.error("Error reading tenantConfig.json: {}".format(e.strerror))
+            tenant_config = ThemeUtils.read_json(tenant_config_path)
+        except (IOError, ValueError) as e:
+            app.logger.error("Error reading tenantConfig.json: {}".format(e))
             return {}
         services = tenant_config.get("services", [])
         for service in services:
             if service.get("name") == "featureInfo":
-                resources_config = service.get("resources", {})
-                return resources_config
+                # NOTE: return a copy, as callers modify the config in place
+                #       and tenant_config is shared via the read_json cache
+                return copy.deepcopy(service.get("resources", {}))
 
         return {}
 
@@ -140,14 +392,33 @@ class ThemeUtils():
         config_in_path = os.path.join(current_handler.config().get("input_config_path"), current_handler.tenant)
         tenant_config_path = os.path.join(config_in_path, 'tenantConfig.json')
 
-        try:
-            with open(tenant_config_path, encoding='utf-8') as fh:
-                tenant_config = json.load(fh, object_pairs_hook=OrderedDict)
-        except IOError as e:
-            app.logger.error("Error reading tenantConfig.json: {}".format(e.strerror))
-            return False
+        with ThemeUtils.file_lock(tenant_config_path):
+            try:
+                tenant_config, _revision = ThemeUtils.read_json_revision(
+                    tenant_config_path, force=True
+                )
+            except (IOError, ValueError) as e:
+                app.logger.error("Error reading tenantConfig.json: {}".format(e))
+                return False
+
+            # NOTE: keep cached data unchanged until saved
+            return ThemeUtils.write_featureinfo_config(
+                copy.deepcopy(tenant_config), new_featureinfo_config,
+                tenant_config_path, config_in_path, app
+            )
 
-        baksuffix = "%s.bak" % datetime.datetime.now(datetime.UTC).strftime("-%Y%m%d-%H%M%S")
+    @staticmethod
+    def write_featureinfo_config(tenant_config, new_featureinfo_config,
+                                 tenant_config_path, config_in_path, app):
+        """Write featureInfo configuration to tenantConfig.json or its
+        separate file.
+
+        :param dict tenant_config: Tenant config
+        :param Dict new_featureinfo_config: New featureInfo configuration dictionary
+        :param str tenant_config_path: Path of tenantConfig.json
+        :param str config_in_path: Input config path of tenant
+        :param Flask app: Flask application
+        """
         services = tenant_config.get("services", [])
 
         for service in services:
@@ -155,146 +426,56 @@ class ThemeUtils():
                 featureinfo_config = service.get("resources")
                 if isinstance(featureinfo_config, str):
                     featureinfo_config_path = featureinfo_config
-                    try:
-                        if not os.path.isabs(featureinfo_config_path):
-                            featureinfo_config_path = os.path.join(config_in_path, featureinfo_config_path)
-
-                        with open(featureinfo_config_path) as f:
-                            featureinfo_config = json.load(f)
+                    if not os.path.isabs(featureinfo_config_path):
+                        featureinfo_config_path = os.path.join(config_in_path, featureinfo_config_path)
 
-                        with open(featureinfo_config_path + baksuffix, "w", encoding="utf-8") as fh:
-                            json.dump(featureinfo_config, fh, indent=2, separators=(',', ': '))
-
-                        with open(featureinfo_config_path, "w", encoding="utf-8") as fh:
-                            json.dump(new_featureinfo_config, fh, indent=2, separators=(',', ': '))
-
-                    except IOError as e:
-                        msg = "Failed to backup/save featureInfo configuration {}: {}".format(
-                            featureinfo_config_path, e.strerror)
-                        app.logger.error(msg)
+                    if not ThemeUtils.write_json(app, featureinfo_config_path, new_featureinfo_config):
                         return False
                 elif isinstance(featureinfo_config, dict):
-                    try:
-                        with open(tenant_config_path + baksuffix, "w", encoding="utf-8") as fh:
-                            json.dump(tenant_config, fh, indent=2, separators=(',', ': '))
-
-                        service["resources"] = new_featureinfo_config
-                        with open(tenant_config_path, "w", encoding="utf-8") as fh:
-                            json.dump(tenant_config, fh, indent=2, separators=(',', ': '))
-
-                    except IOError as e:
-                        msg = "Failed to backup/save featureInfo configuration {}: {}".format(
-                            tenant_config_path, e.strerror)
-                        app.logger.error(msg)
+                    service["resources"] = new_featureinfo_config
+                    if not ThemeUtils.write_json(app, tenant_config_path, tenant_config):
                         return False
                 else:
                     msg = "Missing or invalid featureInfo configuration in tenantConfig.json"
                     app.logger.error(msg)
                     return False
-            try:
-                with open(tenant_config_path + baksuffix, "w", encoding="utf-8") as fh:
-                    json.dump(tenant_config, fh, indent=2, separators=(',', ': '))
-
-                with open(tenant_config_path, "w", encoding="utf-8") as fh:
-                    json.dump(tenant_config, fh, indent=2, separators=(',', ': '))
-            except IOError as e:
-                msg = "Failed to backup/save featureInfo configuration {}: {}".format(
-                    tenant_config_path, e.strerror)
-                app.logger.error(msg)
-                return False
 
         return True
 
     @staticmethod
     def get_layers(app, handler):
         """Return geospatial file names from QGIS_RESOURCES_PATH"""
-        current_handler = handler()
-        resources_path = current_handler.config().get("qgs_resources_path")
-
-        layers = []
-        app.logger.info(resources_path)
-        for ext in ['*.geojson', '*.kml', '*.gpkg', '*.shp']:
-            for path in pathlib.Path(resources_path).rglob(ext):
-                app.logger.info(str(path))
-                app.logger.info(path.relative_to(resources_path))
-                layer = str(path.relative_to(resources_path))
-                if not layer.startswith("."):
-                    layers.append(layer)
-        return sorted(layers)
+        resources_path = handler().config().get("qgs_resources_path")
+        return ThemeUtils.indexed_files(
+            handler, resources_path, ThemeUtils.LAYER_EXTENSIONS
+        )
 
     @staticmethod
     def get_projects(app, handler):
-        """Return QGIS project file names from QGIS_RESOURCES_PATH"""
+        """Return QGIS project file names from QGIS_RESOURCES_PATH and
+        QGIS projects from the QGIS projects DB"""
         current_handler = handler()
-        resources_path = current_handler.config().get("qgs_resources_path")
-        ogc_service_url = current_handler.config().get("ogc_service_url")
-        ows_prefix = current_handler.config().get("ows_prefix", urlparse(ogc_service_url).path)
-        project_ext = current_handler.config().get("qgis_project_extension", ".qgs")
-
-        projects = []
-        app.logger.info(resources_path)
-        for path in pathlib.Path(resources_path).rglob("*" + project_ext):
-            app.logger.info(str(path))
-            app.logger.info(path.relative_to(resources_path))
-            project = str(path.relative_to(resources_path))[:-4].replace("\\", "/")
-            url = ows_prefix.rstrip("/") + "/" + project
-            projects.append((url, project))
-
-        # Look in database
-        db_url = 'postgresql:///?service=qgisprojects'
-        db = db_engine.db_engine(db_url)
-        db_projects = []
-        sql = sql_text("SELECT schema_name FROM information_schema.schemata")
-        try:
-            with db.begin() as connection:
-                schema_rows = connection.execute(sql).mappings()
-            for schema_row in schema_rows:
-                try:
-                    sql = sql_text('SELECT name FROM "{schema}"."qgis_projects"'.format(schema=schema_row["schema_name"]))
-                    with db.begin() as connection:
-                        db_project_rows = connection.execute(sql).mappings()
-                    for db_project_row in db_project_rows:
-                        db_projects.append({"name": db_project_row["name"], "schema": schema_row["schema_name"]})
-                except Exception as e:
-                    pass
-        except Exception as e:
-            pass
-
-        for project in db_projects:
-            url = ows_prefix.rstrip("/") + "/pg/" + project["schema"] + "/" + project["name"]
-            projects.append((url, project["name"] + " (DB)"))
-
-        return sorted(projects)
-    
+        return ThemeUtils.project_catalog.projects(
+            current_handler.tenant, current_handler.config(), app.logger
+        )
+
     @staticmethod
     def get_info_templates(app, handler):
         """Return templates file names from INFO_TEMPLATES_PATH"""
-        current_handler = handler()
-        info_templates_path = current_handler.config().get("info_templates_path")
-
-        info_templates = []
-        app.logger.info(info_templates_path)
-        for ext in ['*.html']:
-            for path in pathlib.Path(info_templates_path).rglob(ext):
-                app.logger.info(str(path))
-                app.logger.info(path.relative_to(info_templates_path))
-                template = str(path.relative_to(info_templates_path))
-                if not template.startswith("."):
-                    info_templates.append(template)
-        return sorted(info_templates)
+        info_templates_path = handler().config().get("info_templates_path")
+        return ThemeUtils.indexed_files(
+            handler, info_templates_path, ['.html']
+        )
 
     @staticmethod
     def get_mapthumbs(app, handler):
         """Return mapthumbs from qwc2 assets path"""
-        current_handler = handler()
-        qwc2_path = current_handler.config().get("qwc2_path")
-        mapthumbs = []
+        qwc2_path = handler().config().get("qwc2_path")
         thumbs_path = os.path.join(qwc2_path, "assets/img/mapthumbs")
-        for mapthumb in os.listdir(thumbs_path):
-            if not mapthumb.startswith("."):
-                mapthumbs.append(mapthumb)
-        mapthumbs.append("")
-        return sorted(mapthumbs)
+        mapthumbs = ThemeUtils.indexed_files(
+            handler, thumbs_path, recursive=False
+        )
+        return sorted(mapthumbs + [""])
 
     @staticmethod
     def get_format():
@@ -317,15 +498,15 @@ class ThemeUtils():
 
         qwc2_config = tenant_qwc2_config if os.path.isfile(tenant_qwc2_config) else master_qwc2_config
 
-        with open(qwc2_config, encoding="utf-8") as fh:
-            config = json.load(fh)
-            if "projections" in config:
-                projections = config["projections"]
-                result = [["EPSG:3857", "EPSG:3857"]]
-                for p in projections:
-                    code = p["code"]
-                    result.append([code, code])
-                return tuple(result)
+        config = ThemeUtils.read_json(qwc2_config)
+        if "projections" in config:
+            projections = config["projections"]
+            result = [["EPSG:3857", "EPSG:3857"]]
+            for p in projections:
+                code = p["code"]
+                result.append([code, code])
+            return tuple(result)
         return (["EPSG:3857", "EPSG:3857"],
                 ["EPSG:4647", "EPSG:4647"],
                 ["EPSG:25832", "EPSG:25832"])
+
@@ -0,0 +1,714 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from zipfile import BadZipFile, ZipFile
+
+from werkzeug.utils import secure_filename
+
+try:
+    import fcntl
+except ImportError:
+    # no file locks on Windows
+    fcntl = None
+
+
+class UploadError(Exception):
+    """Raised for invalid upload requests."""
+
+
+class UploadQuotaExceeded(UploadError):
+    """Raised if an upload exceeds the max file size or the tenant quota."""
+
+
+class UploadConflict(UploadError):
+    """Raised if a chunk does not continue an upload in progress."""
+
+
+class ChunkedUploads:
+    """Resumable chunked uploads of QGIS projects, layers and info templates.
+
+    Each chunk is streamed from the request to a hidden part file in the
+    target dir, while updating a running SHA-256 checksum. Once complete,
+    the file is moved into place atomically. Zipped layers are extracted in
+    a background thread with progress reporting.
+
+    The upload state is persisted as JSON file in the uploads dir, so that
+    an interrupted upload can be resumed from its last offset, also in
+    another worker process.
+    """
+
+    # default dir for persisted upload states
+    DEFAULT_UPLOADS_DIR = os.path.join(
+        tempfile.gettempdir(), 'qwc-admin-gui-uploads'
+    )
+    # default chunk size in bytes for clients
+    DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+    # buffer size in bytes for streaming and extracting files
+    BUFFER_SIZE = 1024 * 1024
+    # time in seconds after which unfinished uploads and finished upload
+    # states are removed
+    UPLOAD_RETENTION = 86400
+    # time in seconds without progress after which an extraction is
+    # considered as interrupted (e.g. if its worker process has been killed)
+    STALE_TIMEOUT = 600
+    # time in seconds for caching the disk usage of a tenant
+    USAGE_CACHE_TTL = 30
+
+    # upload targets as {<target>: (<target dir setting>, <extensions>)}
+    TARGETS = {
+        'project': ('qgs_resources_path', ['.qgs']),
+        'layer': ('qgs_resources_path', [
+            '.geojson', '.kml', '.gpkg', '.shp', '.dbf', '.shx', '.cpg',
+            '.prj', '.zip'
+        ]),
+        'template': ('info_templates_path', ['.html'])
+    }
+    # extensions of files extracted from zipped layers
+    ZIP_MEMBER_EXTENSIONS = (
+        '.shp', '.shx', '.dbf', '.prj', '.cpg', '.geojson', '.kml', '.gpkg'
+    )
+
+    # upload status values
+    UPLOADING = 'uploading'
+    EXTRACTING = 'extracting'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    ACTIVE_STATUSES = [UPLOADING, EXTRACTING]
+
+    def __init__(self, logger, on_change=None):
+        """Constructor
+
+        :param Logger logger: Application logger
+        :param func on_change: Optional function called with the target dir
+                               after files have been added
+        """
+        self.logger = logger
+        self.on_change = on_change
+
+        # running checksums of uploads in this process as
+        # {<upload ID>: (<offset>, <sha256>)}
+        self.hashers = {}
+        # cached disk usage as {<tenant>: (<bytes>, <expires>)}
+        self.usage_cache = {}
+        self.lock = threading.Lock()
+        # lock for upload states if there are no file locks
+        self.state_mutex = threading.Lock()
+
+    def start(self, tenant, config, target, filename, size, checksum=None):
+        """Start upload and return its state.
+
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        :param str target: Upload target ('project', 'layer' or 'template')
+        :param str filename: File name
+        :param int size: File size in bytes
+        :param str checksum: Optional expected SHA-256 hex digest
+        """
+        if target not in self.TARGETS:
+            raise UploadError("Invalid upload target '%s'" % target)
+        dir_setting, extensions = self.TARGETS[target]
+        target_dir = config.get(dir_setting)
+
+        filename = secure_filename(filename or '')
+        if os.path.splitext(filename)[1].lower() not in extensions:
+            raise UploadError(
+                "Invalid file type, allowed: %s" % ", ".join(extensions)
+            )
+        if size is None or size < 0:
+            raise UploadError("Invalid file size")
+        max_size = config.get('upload_max_size')
+        if max_size is not None and size > max_size:
+            raise UploadQuotaExceeded(
+                "File size of %d bytes exceeds max size of %d bytes" %
+                (size, max_size)
+            )
+
+        uploads_dir = self.uploads_dir(tenant, config)
+        with self.lock:
+            self.cleanup(uploads_dir)
+            # NOTE: reserve full size for extracted files of zipped layers
+            #       only once the uncompressed size is known
+            self.check_quota(tenant, config, size)
+
+            upload = {
+                'upload_id': uuid.uuid4().hex,
+                'tenant': tenant,
+                'target': target,
+                'target_dir': target_dir,
+                'filename': filename,
+                'size': size,
+                'offset': 0,
+                'chunk_size': config.get(
+                    'upload_chunk_size', self.DEFAULT_CHUNK_SIZE
+                ),
+                'checksum': checksum.lower() if checksum else None,
+                'sha256': None,
+                'status': self.UPLOADING,
+                'progress': 0,
+                'message': None,
+                'cancel_requested': False,
+                'created_at': time.time(),
+                'updated_at': time.time()
+            }
+            # create empty part file
+            with open(self.part_path(upload), 'wb'):
+                pass
+            self.save(uploads_dir, upload)
+
+        self.logger.info(
+            "Starting upload %s of '%s' (%d bytes) for tenant '%s'" %
+            (upload['upload_id'], filename, size, tenant)
+        )
+
+        if size == 0:
+            # finish empty file, as there are no chunks to upload
+            with self.state_lock(uploads_dir):
+                self.finish(uploads_dir, upload, config, hashlib.sha256())
+
+        return upload
+
+    def status(self, tenant, config, upload_id):
+        """Return upload state of a tenant, or None if not found.
+
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        :param str upload_id: Upload ID
+        """
+        upload = self.load(self.uploads_dir(tenant, config), upload_id)
+        if upload is None or upload['tenant'] != tenant:
+            return None
+
+        if (
+            upload['status'] == self.EXTRACTING and
+            time.time() - upload['updated_at'] > self.STALE_TIMEOUT
+        ):
+            # extraction of another process without heartbeat
+            upload['status'] = self.FAILED
+            upload['message'] = "Extraction has been interrupted"
+
+        return upload
+
+    def write_chunk(self, tenant, config, upload_id, offset, stream, length):
+        """Append chunk from stream at offset and return upload state.
+
+        Bytes after the offset, e.g. from an interrupted chunk, are
+        discarded, so the client can resume at the offset of the upload
+        state.
+
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        :param str upload_id: Upload ID
+        :param int offset: Offset of chunk in bytes
+        :param file stream: Input stream with chunk data
+        :param int length: Chunk size in bytes
+        """
+        uploads_dir = self.uploads_dir(tenant, config)
+        upload = self.load(uploads_dir, upload_id)
+        if upload is None or upload['tenant'] != tenant:
+            return None
+        if length is None or length < 0:
+            raise UploadError("Missing chunk size")
+        if offset + length > upload['size']:
+            raise UploadError("Chunk exceeds file size")
+
+        part_path = self.part_path(upload)
+        try:
+            fh = open(part_path, 'r+b')
+        except OSError:
+            raise UploadConflict("Upload is not in progress")
+        with fh:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    raise UploadConflict("Another chunk is being uploaded")
+
+            # reload state while locked
+            upload = self.load(uploads_dir, upload_id)
+            if upload is None or upload['status'] != self.UPLOADING:
+                raise UploadConflict("Upload is not in progress")
+            if offset != upload['offset']:
+                raise UploadConflict(
+                    "Chunk offset %d does not match upload offset %d" %
+                    (offset, upload['offset'])
+                )
+
+            hasher = self.hasher(upload, fh)
+            fh.seek(offset)
+            fh.truncate(offset)
+            written = 0
+            while written < length:
+                data = stream.read(min(self.BUFFER_SIZE, length - written))
+                if not data:
+                    # client disconnected, keep received bytes
+                    break
+                fh.write(data)
+                hasher.update(data)
+                written += len(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+            upload['offset'] = offset + written
+            upload['progress'] = int(
+                100 * upload['offset'] / max(upload['size'], 1)
+            )
+            upload['updated_at'] = time.time()
+            self.hashers[upload_id] = (upload['offset'], hasher)
+
+            with self.state_lock(uploads_dir):
+                persisted = self.load(uploads_dir, upload_id)
+                if persisted is None or \
+                        persisted['status'] != self.UPLOADING:
+                    # cancelled while writing the chunk
+                    self.hashers.pop(upload_id, None)
+                    raise UploadConflict("Upload is not in progress")
+
+                if upload['offset'] == upload['size']:
+                    self.finish(uploads_dir, upload, config, hasher)
+                else:
+                    self.save(uploads_dir, upload)
+
+        return upload
+
+    def cancel(self, tenant, config, upload_id):
+        """Cancel upload or extraction and return its state, or None if not
+        found.
+
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        :param str upload_id: Upload ID
+        """
+        uploads_dir = self.uploads_dir(tenant, config)
+        with self.state_lock(uploads_dir):
+            upload = self.load(uploads_dir, upload_id)
+            if upload is None or upload['tenant'] != tenant:
+                return None
+            if upload['status'] == self.UPLOADING:
+                self.remove_part(upload)
+                upload['status'] = self.CANCELLED
+                upload['message'] = "Upload has been cancelled"
+            elif upload['status'] == self.EXTRACTING:
+                upload['cancel_requested'] = True
+            upload['updated_at'] = time.time()
+            self.save(uploads_dir, upload)
+
+        self.hashers.pop(upload_id, None)
+        return upload
+
+    def hasher(self, upload, fh):
+        """Return running checksum at the upload offset, recomputing it
+        from the part file if the previous chunk was written by another
+        process.
+
+        :param dict upload: Upload state
+        :param file fh: Open part file
+        """
+        cached = self.hashers.get(upload['upload_id'])
+        if cached is not None and cached[0] == upload['offset']:
+            return cached[1]
+
+        hasher = hashlib.sha256()
+        fh.seek(0)
+        remaining = upload['offset']
+        while remaining > 0:
+            data = fh.read(min(self.BUFFER_SIZE, remaining))
+            if not data:
+                break
+            hasher.update(data)
+            remaining -= len(data)
+        return hasher
+
+    def finish(self, uploads_dir, upload, config, hasher):
+        """Verify checksum of a complete upload and move it into place, or
+        start extraction of a zipped layer.
+
+        :param str uploads_dir: Dir for persisted upload states
+        :param dict upload: Upload state
+        :param obj config: Tenant config
+        :param sha256 hasher: Running checksum
+        """
+        self.hashers.pop(upload['upload_id'], None)
+        upload['sha256'] = hasher.hexdigest()
+        if upload['checksum'] and upload['checksum'] != upload['sha256']:
+            self.remove_part(upload)
+            upload['status'] = self.FAILED
+            upload['message'] = "Checksum mismatch"
+            self.save(uploads_dir, upload)
+            raise UploadError(
+                "Checksum %s does not match expected checksum %s" %
+                (upload['sha256'], upload['checksum'])
+            )
+
+        if upload['target'] == 'layer' and \
+                upload['filename'].lower().endswith('.zip'):
+            upload['status'] = self.EXTRACTING
+            upload['progress'] = 0
+            self.save(uploads_dir, upload)
+            thread = threading.Thread(
+                target=self.extract, args=(uploads_dir, dict(upload), config),
+                name="upload-extract-%s" % upload['upload_id'], daemon=True
+            )
+            thread.start()
+            return
+
+        os.replace(
+            self.part_path(upload),
+            os.path.join(upload['target_dir'], upload['filename'])
+        )
+        upload['status'] = self.SUCCEEDED
+        upload['progress'] = 100
+        self.save(uploads_dir, upload)
+        self.changed(upload)
+        self.logger.info(
+            "Uploaded '%s' (sha256 %s) for tenant '%s'" %
+            (upload['filename'], upload['sha256'], upload['tenant'])
+        )
+
+    def extract(self, uploads_dir, upload, config):
+        """Extract geospatial files of a zipped layer in a single pass over
+        its members.
+
+        :param str uploads_dir: Dir for persisted upload states
+        :param dict upload: Upload state
+        :param obj config: Tenant config
+        """
+        part_path = self.part_path(upload)
+        try:
+            with ZipFile(part_path) as zip_file:
+                members = self.zip_members(zip_file)
+                total = sum([member.file_size for member, _ in members])
+                with self.lock:
+                    # replace size of zip file with size of extracted files
+                    self.usage_cache.pop(upload['tenant'], None)
+                    self.check_quota(
+                        upload['tenant'], config, total - upload['size'],
+                    )
+
+                extracted = 0
+                last_update = time.time()
+                for member, path in members:
+                    persisted = self.load(uploads_dir, upload['upload_id'])
+                    if persisted is None or persisted['cancel_requested']:
+                        upload['status'] = self.CANCELLED
+                        upload['message'] = "Extraction has been cancelled"
+                        break
+
+                    self.extract_member(
+                        zip_file, member,
+                        os.path.join(upload['target_dir'], path)
+                    )
+                    extracted += member.file_size
+                    if time.time() - last_update > 1:
+                        # report progress
+                        upload['progress'] = int(
+                            100 * extracted / max(total, 1)
+                        )
+                        upload['updated_at'] = time.time()
+                        self.update(uploads_dir, upload)
+                        last_update = time.time()
+                else:
+                    upload['status'] = self.SUCCEEDED
+                    upload['progress'] = 100
+                    upload['message'] = "Extracted %d files" % len(members)
+
+            self.logger.info(
+                "%s: %s for tenant '%s'" % (
+                    upload['filename'], upload['message'], upload['tenant']
+                )
+            )
+        except (BadZipFile, OSError, UploadError) as e:
+            upload['status'] = self.FAILED
+            upload['message'] = "Could not extract files: %s" % e
+            self.logger.error(
+                "%s: %s" % (upload['filename'], upload['message'])
+            )
+        finally:
+            self.remove_part(upload)
+            upload['updated_at'] = time.time()
+            self.update(uploads_dir, upload)
+            self.changed(upload)
+
+    def zip_members(self, zip_file):
+        """Return geospatial files in a zip file as
+        [(<ZipInfo>, <relative target path>)].
+
+        Directories, hidden files and other file types are skipped, and
+        paths are sanitized.
+
+        :param ZipFile zip_file: Zip file
+        """
+        members = []
+        for member in zip_file.infolist():
+            if member.is_dir() or not member.filename.lower().endswith(
+                self.ZIP_MEMBER_EXTENSIONS
+            ):
+                continue
+            parts = [
+                part for part in member.filename.replace('\\', '/').split('/')
+                if part not in ('', '.', '..')
+            ]
+            if not parts or any([part.startswith('.') for part in parts]):
+                continue
+            members.append((member, os.path.join(*parts)))
+
+        return members
+
+    def extract_member(self, zip_file, member, path):
+        """Extract zip member to a temp file and move it into place.
+
+        :param ZipFile zip_file: Zip file
+        :param ZipInfo member: Zip member
+        :param str path: Target path
+        """
+        target_dir = os.path.dirname(path)
+        os.makedirs(target_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=target_dir, prefix=".extract-", suffix=".part"
+        )
+        try:
+            with os.fdopen(fd, 'wb') as fh, zip_file.open(member) as src:
+                while True:
+                    data = src.read(self.BUFFER_SIZE)
+                    if not data:
+                        break
+                    fh.write(data)
+            os.chmod(tmp_path, 0o666 & ~self.umask())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def extract_zip(self, tenant, config, path, target_dir):
+        """Extract geospatial files of a zip file synchronously, e.g. for
+        uploads without JavaScript, and return number of extracted files.
+
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        :param str path: Path of zip file
+        :param str target_dir: Target dir
+        """
+        with ZipFile(path) as zip_file:
+            members = self.zip_members(zip_file)
+            with self.lock:
+                self.check_quota(
+                    tenant, config,
+                    sum([member.file_size for member, _ in members])
+                )
+            for member, rel_path in members:
+                self.extract_member(
+                    zip_file, member, os.path.join(target_dir, rel_path)
+                )
+
+        self.usage_cache.pop(tenant, None)
+        return len(members)
+
+    def check_quota(self, tenant, config, size):
+        """Raise UploadQuotaExceeded if adding a file would exceed the
+        tenant quota.
+
+        NOTE: call with lock held
+
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        :param int size: Additional size in bytes
+        """
+        quota = config.get('upload_quota')
+        if quota is None:
+            return
+
+        # reserve remaining size of uploads in progress
+        reserved = 0
+        uploads_dir = self.uploads_dir(tenant, config)
+        for entry in os.scandir(uploads_dir):
+            if entry.name.endswith('.json'):
+                upload = self.load(uploads_dir, entry.name[:-len('.json')])
+                if upload is not None and \
+                        upload['status'] in self.ACTIVE_STATUSES:
+                    reserved += upload['size'] - upload['offset']
+
+        used = self.usage(tenant, config)
+        if used + reserved + size > quota:
+            raise UploadQuotaExceeded(
+                "Upload of %d bytes exceeds quota of %d bytes "
+                "(%d bytes used)" % (size, quota, used + reserved)
+            )
+
+    def usage(self, tenant, config):
+        """Return cached total size in bytes of the upload target dirs of a
+        tenant.
+
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        """
+        cached = self.usage_cache.get(tenant)
+        if cached is not None and time.time() < cached[1]:
+            return cached[0]
+
+        used = 0
+        target_dirs = set([
+            config.get(dir_setting)
+            for dir_setting, _ in self.TARGETS.values()
+        ])
+        for target_dir in filter(None, target_dirs):
+            pending = [target_dir]
+            while pending:
+                path = pending.pop()
+                try:
+                    with os.scandir(path) as entries:
+                        for entry in entries:
+                            if entry.is_dir(follow_symlinks=False):
+                                pending.append(entry.path)
+                            elif entry.is_file(follow_symlinks=False):
+                                used += entry.stat().st_size
+                except OSError:
+                    pass
+
+        self.usage_cache[tenant] = (used, time.time() + self.USAGE_CACHE_TTL)
+        return used
+
+    def changed(self, upload):
+        """Notify about added files.
+
+        :param dict upload: Upload state
+        """
+        self.usage_cache.pop(upload['tenant'], None)
+        if self.on_change is not None:
+            self.on_change(upload['target_dir'])
+
+    def umask(self):
+        """Return current umask."""
+        umask = os.umask(0)
+        os.umask(umask)
+        return umask
+
+    def uploads_dir(self, tenant, config):
+        """Return dir for persisted upload states of a tenant, creating it if
+        required.
+
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        """
+        uploads_dir = os.path.join(
+            config.get('uploads_dir', self.DEFAULT_UPLOADS_DIR), tenant
+        )
+        os.makedirs(uploads_dir, exist_ok=True)
+        return uploads_dir
+
+    def part_path(self, upload):
+        """Return path of hidden part file in the target dir.
+
+        :param dict upload: Upload state
+        """
+        return os.path.join(
+            upload['target_dir'], ".upload-%s.part" % upload['upload_id']
+        )
+
+    def remove_part(self, upload):
+        """Remove part file of an upload.
+
+        :param dict upload: Upload state
+        """
+        try:
+            os.remove(self.part_path(upload))
+        except OSError:
+            pass
+
+    def state_path(self, uploads_dir, upload_id):
+        """Return path of persisted upload state.
+
+        :param str uploads_dir: Dir for persisted upload states
+        :param str upload_id: Upload ID
+        """
+        # NOTE: upload IDs are hex UUIDs
+        return os.path.join(
+            uploads_dir, "%s.json" % "".join(
+                c for c in upload_id if c in '0123456789abcdef'
+            )
+        )
+
+    def load(self, uploads_dir, upload_id):
+        """Return persisted upload state, or None if not found.
+
+        :param str uploads_dir: Dir for persisted upload states
+        :param str upload_id: Upload ID
+        """
+        try:
+            with open(self.state_path(uploads_dir, upload_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def update(self, uploads_dir, upload):
+        """Persist state of an extraction, keeping a cancel request saved
+        in the meantime.
+
+        :param str uploads_dir: Dir for persisted upload states
+        :param dict upload: Upload state
+        """
+        with self.state_lock(uploads_dir):
+            persisted = self.load(uploads_dir, upload['upload_id'])
+            if persisted is not None and persisted['cancel_requested']:
+                upload['cancel_requested'] = True
+            self.save(uploads_dir, upload)
+
+    @contextmanager
+    def state_lock(self, uploads_dir):
+        """Lock upload states of a tenant across threads and worker
+        processes while reading and modifying them.
+
+        :param str uploads_dir: Dir for persisted upload states
+        """
+        if fcntl is None:
+            with self.state_mutex:
+                yield
+            return
+        # NOTE: each open file has its own lock, so this also locks
+        #       against other threads
+        with open(os.path.join(uploads_dir, '.state.lock'), 'a') as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def save(self, uploads_dir, upload):
+        """Persist upload state atomically.
+
+        :param str uploads_dir: Dir for persisted upload states
+        :param dict upload: Upload state
+        """
+        path = self.state_path(uploads_dir, upload['upload_id'])
+        tmp_path = "%s.%d.tmp" % (path, threading.get_ident())
+        with open(tmp_path, 'w') as f:
+            json.dump(upload, f)
+        os.replace(tmp_path, path)
+
+    def cleanup(self, uploads_dir):
+        """Remove part files and states of uploads without changes for
+        UPLOAD_RETENTION.
+
+        :param str uploads_dir: Dir for persisted upload states
+        """
+        now = time.time()
+        for entry in os.scandir(uploads_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                if now - entry.stat().st_mtime > self.UPLOAD_RETENTION:
+                    upload = self.load(
+                        uploads_dir, entry.name[:-len('.json')]
+                    )
+                    if upload is not None:
+                        self.remove_part(upload)
+                    os.remove(entry.path)
+            except OSError:
+                pass
@@ -0,0 +1,250 @@
+from collections import Counter
+from fnmatch import fnmatchcase
+import re
+import threading
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+# max number of SQL statements per request by endpoint, as list of
+# (<endpoint pattern>, <budget>), first match wins
+QUERY_BUDGETS = [
+    # server
+    ('home', 5),
+    ('generate_configs*', 5),
+    ('qgis_server_logs*', 5),
+    ('update_solr_index*', 5),
+    ('proxy', 5),
+    ('upstream_metrics', 5),
+    ('metrics', 5),
+    ('ready', 0),
+    ('healthz', 0),
+    ('logout', 5),
+    ('static', 0),
+    ('plugin_static', 0),
+    ('bootstrap.static', 0),
+    # ResourcesController
+    ('destroy_cascaded_resource', 20),
+    ('destroy_multiple_resource', 20),
+    ('hierarchy_resource', 10),
+    ('unused_resource', 10),
+    ('import_resource', 10),
+    ('import_maps_resource', 50),
+    ('import_all_resource', 100),
+    ('import_children_resource', 50),
+    ('import_resource_from_parent_map', 50),
+    # UsersController
+    ('sendmail_user', 10),
+    # plugins (themes, alkis, config_editor, newspopup)
+    ('create_theme', 30),
+    ('themes', 5),
+    ('*_theme', 5),
+    ('*_theme_group', 5),
+    ('*_themesconfig', 5),
+    ('move_theme_to_group', 5),
+    ('backgroundlayers', 5),
+    ('*_backgroundlayer', 5),
+    ('files', 5),
+    ('upload_*', 5),
+    ('*_upload', 5),
+    ('delete_*', 5),
+    ('mapthumbs', 5),
+    ('load_mapthumb', 5),
+    ('info_templates', 5),
+    ('*info_template', 5),
+    ('alkis', 5),
+    ('*_alkis', 5),
+    ('config_editor*', 5),
+    ('newspopup*', 5),
+    # Controller.add_routes
+    ('users', 10),
+    ('groups', 10),
+    ('roles', 10),
+    ('resources', 10),
+    ('permissions', 10),
+    ('registrable_groups', 10),
+    ('registration_requests', 10),
+    ('new_*', 10),
+    ('edit_*', 10),
+    ('create_*', 30),
+    ('update_*', 30),
+    ('modify_*', 30),
+    ('destroy_*', 15),
+    # Controller.add_search_route
+    ('search_*', 5)
+]
+# budget for endpoints not in QUERY_BUDGETS
+DEFAULT_QUERY_BUDGET = 20
+
+# min number of statements with the same shape reported as N+1 query
+REPEATED_STATEMENT_THRESHOLD = 5
+
+
+def query_budget(endpoint):
+    """Return max number of SQL statements for an endpoint.
+
+    :param str endpoint: Flask endpoint
+    """
+    for pattern, budget in QUERY_BUDGETS:
+        if fnmatchcase(endpoint or '', pattern):
+            return budget
+    return DEFAULT_QUERY_BUDGET
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised if a request exceeds its query budget or repeats statements."""
+
+
+class QueryCounter:
+    """Context manager recording the shapes of SQL statements executed by
+    ORM sessions in the current thread.
+
+    Statements with the same shape differ only in their parameters, e.g.
+    lazy loads of a relation in a loop.
+
+    Usage:
+        with QueryCounter() as counter:
+            ...
+        assert counter.count <= 10
+        assert not counter.repeated()
+    """
+
+    # active counters per thread
+    local = threading.local()
+    lock = threading.Lock()
+
+    def __init__(self):
+        # list of statement shapes
+        self.statements = []
+
+    def __enter__(self):
+        QueryCounter.listen()
+        if not hasattr(self.local, 'counters'):
+            self.local.counters = []
+        self.local.counters.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.local.counters.remove(self)
+        return False
+
+    @property
+    def count(self):
+        """Return number of executed statements."""
+        return len(self.statements)
+
+    def repeated(self, threshold=REPEATED_STATEMENT_THRESHOLD):
+        """Return statements executed at least threshold times, as list of
+        (<statement shape>, <count>).
+
+        :param int threshold: Min number of executions
+        """
+        return [
+            (shape, count)
+            for shape, count in Counter(self.statements).most_common()
+            if count >= threshold
+        ]
+
+    def violations(self, budget, threshold=REPEATED_STATEMENT_THRESHOLD):
+        """Return list of budget violation messages.
+
+        :param int budget: Max number of statements
+        :param int threshold: Min number of executions of a statement shape
+                              reported as N+1 query
+        """
+        messages = []
+        if self.count > budget:
+            messages.append(
+                "%d SQL statements exceed budget of %d" % (self.count, budget)
+            )
+        for shape, count in self.repeated(threshold):
+            messages.append(
+                "Statement repeated %d times (N+1 query?): %s" %
+                (count, shape[:200])
+            )
+        return messages
+
+    @classmethod
+    def listen(cls):
+        """Register ORM execute listener for all sessions once."""
+        with cls.lock:
+            if not event.contains(Session, 'do_orm_execute', cls.record):
+                event.listen(Session, 'do_orm_execute', cls.record)
+
+    @classmethod
+    def record(cls, orm_execute_state):
+        """Record statement shape for active counters of current thread.
+
+        :param ORMExecuteState orm_execute_state: ORM execute state
+        """
+        counters = getattr(cls.local, 'counters', None)
+        if not counters:
+            return
+        shape = re.sub(r'\s+', ' ', str(orm_execute_state.statement))
+        for counter in counters:
+            counter.statements.append(shape)
+
+
+class QueryBudget:
+    """Development mode checking the SQL statements of each request against
+    the budget of its endpoint in QUERY_BUDGETS, and for repeated
+    statements with the same shape.
+
+    In mode 'log' violations are logged, in mode 'fail' the request fails
+    with QueryBudgetExceeded.
+    """
+
+    def __init__(self, app, mode, logger):
+        """Constructor
+
+        :param Flask app: Flask application
+        :param str mode: 'log' or 'fail'
+        :param Logger logger: Application logger
+        """
+        self.mode = mode
+        self.logger = logger
+
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.teardown_request(self.teardown_request)
+
+    def before_request(self):
+        """Start counting statements."""
+        g.query_counter = QueryCounter().__enter__()
+
+    def after_request(self, response):
+        """Check statements of request against budget.
+
+        :param Response response: Response
+        """
+        counter = g.pop('query_counter', None)
+        if counter is None:
+            return response
+        counter.__exit__(None, None, None)
+
+        messages = counter.violations(query_budget(request.endpoint))
+        if messages:
+            msg = "Query budget of %s %s (%s): %s" % (
+                request.method, request.path, request.endpoint,
+                "\n".join(messages)
+            )
+            if self.mode == 'fail':
+                raise QueryBudgetExceeded(msg)
+            self.logger.warning(msg)
+        else:
+            self.logger.debug(
+                "%s %s: %d SQL statements" %
+                (request.method, request.path, counter.count)
+            )
+        return response
+
+    def teardown_request(self, exc):
+        """Stop counting if the request failed before after_request.
+
+        :param Exception exc: Unhandled exception
+        """
+        counter = g.pop('query_counter', None)
+        if counter is not None:
+            counter.__exit__(None, None, None)
@@ -0,0 +1,90 @@
+from collections import OrderedDict
+
+from sqlalchemy import and_, insert, or_, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+
+# max number of rows per lookup query and INSERT statement
+CHUNK_SIZE = 1000
+
+
+def upsert_resources(resource_model, rows, session, chunk_size=CHUNK_SIZE):
+    """Insert resources which do not yet exist, keyed on
+    (type, name, parent_id), using multi-row INSERT statements.
+
+    Existing resources are looked up with one query per resource type and
+    chunk of rows. On PostgreSQL the INSERT additionally uses
+    ON CONFLICT DO NOTHING, so concurrent imports do not fail on unique
+    constraints of the resources table.
+
+    Returns the inserted rows with their new IDs as list of dicts.
+
+    :param object resource_model: ConfigModel for resources
+    :param list[dict] rows: Resources as
+                            [{'type': <type>, 'name': <name>,
+                              'parent_id': <parent ID or None>}]
+    :param Session session: DB session
+    :param int chunk_size: Max number of rows per statement
+    """
+    resources_table = resource_model.__table__
+
+    # group unique (parent ID, name) keys by type
+    groups = OrderedDict()
+    for row in rows:
+        groups.setdefault(row['type'], OrderedDict())[
+            (row.get('parent_id'), row['name'])
+        ] = True
+
+    new_rows = []
+    for type, keys in groups.items():
+        keys = list(keys.keys())
+
+        # find existing resources
+        existing = set()
+        for i in range(0, len(keys), chunk_size):
+            chunk = keys[i:i + chunk_size]
+            # NOTE: NULL parent IDs never match in a tuple IN comparison
+            root_names = [
+                name for parent_id, name in chunk if parent_id is None
+            ]
+            child_keys = [key for key in chunk if key[0] is not None]
+            conditions = []
+            if root_names:
+                conditions.append(and_(
+                    resource_model.parent_id.is_(None),
+                    resource_model.name.in_(root_names)
+                ))
+            if child_keys:
+                conditions.append(
+                    tuple_(resource_model.parent_id, resource_model.name)
+                    .in_(child_keys)
+                )
+            query = session.query(
+                resource_model.parent_id, resource_model.name
+            ).filter(resource_model.type == type).filter(or_(*conditions))
+            existing.update(tuple(key) for key in query.all())
+
+        new_rows += [
+            {'type': type, 'name': name, 'parent_id': parent_id}
+            for parent_id, name in keys
+            if (parent_id, name) not in existing
+        ]
+
+    inserted = []
+    dialect = session.get_bind().dialect.name
+    for i in range(0, len(new_rows), chunk_size):
+        chunk = new_rows[i:i + chunk_size]
+        if dialect == 'postgresql':
+            statement = pg_insert(resources_table).values(chunk) \
+                .on_conflict_do_nothing()
+        else:
+            statement = insert(resources_table).values(chunk)
+        statement = statement.returning(
+            resources_table.c.id, resources_table.c.type,
+            resources_table.c.name, resources_table.c.parent_id
+        )
+        inserted += [
+            dict(row._mapping) for row in session.execute(statement)
+        ]
+
+    return inserted
@@ -1,25 +1,31 @@
 from datetime import datetime
 import logging
 import os
-import re
-import requests
-from shutil import copyfile
+import threading
 import time
 import urllib.parse
 import importlib
 
-from flask import abort, Flask, json, redirect, render_template, request, \
+from flask import abort, Flask, redirect, render_template, request, \
     Response, stream_with_context, jsonify, send_from_directory
 from flask_bootstrap import Bootstrap5
 from flask_wtf.csrf import CSRFProtect
 from flask_mail import Mail
 
 from qwc_services_core.auth import auth_manager, optional_auth, get_identity
-from qwc_services_core.tenant_handler import TenantHandler, \
-    TenantPrefixMiddleware, TenantSessionInterface
+from qwc_services_core.tenant_handler import DEFAULT_TENANT, \
+    TenantHandler, TenantPrefixMiddleware, TenantSessionInterface
 from qwc_services_core.runtime_config import RuntimeConfig
 from qwc_services_core.database import DatabaseEngine
+from sqlalchemy.sql import text as sql_text
 from access_control import AccessControl
+from http_client import HttpClient
+from instrumentation import Instrumentation
+import log_tail
+from model_registry import ModelRegistry
+from query_budget import QueryBudget
+from service_proxy import ServiceProxy
+from solr_index_jobs import SolrIndexJobRunner
 from controllers import UsersController, GroupsController, RolesController, \
     ResourcesController, PermissionsController, RegistrableGroupsController, \
     RegistrationRequestsController
@@ -76,12 +82,30 @@ app.wsgi_app = TenantPrefixMiddleware(app.wsgi_app)
 app.session_interface = TenantSessionInterface()
 
 db_engine = DatabaseEngine()
+model_registry = ModelRegistry(db_engine, app.logger)
+http_client = HttpClient(app.logger)
+solr_index_jobs = SolrIndexJobRunner(app.logger, http_client)
+service_proxy = ServiceProxy(app.logger)
+
+# optional request metrics, served by /metrics
+if os.environ.get('INSTRUMENTATION_ENABLED', 'False').lower() == 'true':
+    Instrumentation(app, http_client)
+# serve /metrics without login, e.g. for a Prometheus scraper
+METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', 'False').lower() == 'true'
+
+# optional query budget checks for development ('log' or 'fail')
+QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', '').lower()
+if QUERY_BUDGET_MODE in ['log', 'fail']:
+    QueryBudget(app, QUERY_BUDGET_MODE, app.logger)
 
 
 class TenantConfigHandler:
-    def __init__(self, tenant, db_engine, logger):
+    def __init__(self, tenant, db_engine, model_registry, http_client,
+                 logger):
         self.tenant = tenant
         self._db_engine = db_engine
+        self._model_registry = model_registry
+        self._http_client = http_client
         self.logger = logger
 
         config_handler = RuntimeConfig("adminGui", logger)
@@ -100,17 +124,98 @@ class TenantConfigHandler:
     def qwc_config_schema(self):
         return self._config.get('qwc_config_schema', 'qwc_config')
 
+    def config_models(self):
+        """Return shared ConfigModels for this tenant."""
+        return self._model_registry.config_models(
+            self.tenant, self.conn_str(), self.qwc_config_schema(),
+            self._config.get(
+                'schema_version_check_interval',
+                ModelRegistry.DEFAULT_CHECK_INTERVAL
+            )
+        )
 
-def handler():
-    tenant = tenant_handler.tenant()
+    def http_client(self):
+        """Return shared HTTP client with the settings of this tenant."""
+        return self._http_client.for_tenant(self.tenant, self._config)
+
+
+def tenant_config_handler(tenant):
     handler = tenant_handler.handler('adminGui', 'handler', tenant)
     if handler is None:
         handler = tenant_handler.register_handler(
             'handler', tenant,
-            TenantConfigHandler(tenant, db_engine, app.logger))
+            TenantConfigHandler(
+                tenant, db_engine, model_registry, http_client, app.logger
+            ))
     return handler
 
 
+def handler():
+    return tenant_config_handler(tenant_handler.tenant())
+
+
+def configured_tenants():
+    """Return tenants with an Admin GUI config in $CONFIG_PATH."""
+    config_path = os.environ.get('CONFIG_PATH', 'config')
+    tenants = []
+    if os.path.isdir(config_path):
+        for tenant in sorted(os.listdir(config_path)):
+            if os.path.isfile(
+                RuntimeConfig.config_file_path('adminGui', tenant)
+            ):
+                tenants.append(tenant)
+    return tenants
+
+
+def warmup_tenant(tenant):
+    """Build ConfigDB models and open DB connections of a tenant.
+
+    :param str tenant: Tenant ID
+    """
+    config_handler = tenant_config_handler(tenant)
+    try:
+        config_models = config_handler.config_models()
+    except Exception as e:
+        app.logger.warning(
+            "Could not build ConfigDB models for tenant '%s': %s" %
+            (tenant, e)
+        )
+        return
+
+    # open DB connections, which are returned to the pool afterwards
+    connections = []
+    try:
+        for i in range(config_handler.config().get(
+            'warmup_db_connections', 1
+        )):
+            connection = config_models.engine.connect()
+            connections.append(connection)
+            connection.execute(sql_text("SELECT 1"))
+    except Exception as e:
+        app.logger.warning(
+            "Could not open ConfigDB connections for tenant '%s': %s" %
+            (tenant, e)
+        )
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def warmup():
+    """Warm up ConfigDB models and DB pools of all configured tenants."""
+    start = time.time()
+    try:
+        for tenant in configured_tenants():
+            warmup_tenant(tenant)
+        app.logger.info("Warmup finished in %.2fs" % (time.time() - start))
+    finally:
+        warmup_done.set()
+
+
+# set when warmup is finished and the service is ready
+warmup_done = threading.Event()
+
+
 def auth_path_prefix():
     tenant = tenant_handler.tenant()
     config_handler = RuntimeConfig("adminGui", app.logger)
@@ -132,35 +237,13 @@ if app.config.get('QWC_GROUP_REGISTRATION_ENABLED'):
 access_control = AccessControl(handler, app.logger)
 
 
-plugins_loaded = False
-@app.before_request
-def load_plugins():
-    global plugins_loaded
-    if not plugins_loaded:
-        # HACK to work around
-        #     The setup method 'add_url_rule' can no longer be called on the application.
-        #     It has already handled its first request, any changes will not be applied consistently.
-        # From the flask code, before_request is called immediately after _got_first_request=True, so
-        # there should be no harm clearing the flag again temporarily
-        app._got_first_request = False
-        plugins_loaded = True
-        app.config['PLUGINS'] = []
-        for plugin in handler().config().get("plugins", []):
-            app.logger.info("Loading plugin '%s'" % plugin)
-            try:
-                mod = importlib.import_module("plugins." + plugin)
-                mod.load_plugin(app, handler)
-                app.config['PLUGINS'].append({"id": plugin, "name": mod.name})
-            except Exception as e:
-                app.logger.warning("Could not load plugin %s: %s" % (plugin, str(e)))
-        app._got_first_request = True
-
-
 @app.before_request
 @optional_auth
 def assert_admin_role():
     if request.path.startswith(('/bootstrap/static/', '/ready', '/healthz')):
         return
+    if METRICS_PUBLIC and request.path == '/metrics':
+        return
 
     identity = get_identity()
     app.logger.debug("Access with identity %s" % identity)
@@ -227,16 +310,35 @@ def plugin_static(plugin, filename):
         os.path.join("plugins", plugin, "static"), filename)
 
 
-def proxy_config_generator(endpoint):
+def proxy_config_generator(endpoint, long_running=False):
+    """Forward request to ConfigGenerator service.
+
+    :param str endpoint: ConfigGenerator endpoint
+    :param bool long_running: Set to wait for the response without read
+                              timeout and retries, e.g. for a config
+                              generation run, which must not be restarted
+    """
     current_handler = handler()
-    req_url = current_handler.config().get(
+    config = current_handler.config()
+    req_url = config.get(
         "config_generator_service_url", "http://qwc-config-service:9090"
     ).rstrip('/') + endpoint
 
     params = {
         "tenant": current_handler.tenant,
     }
-    response = requests.get(req_url, params=params|request.args)
+    kwargs = {}
+    if long_running:
+        kwargs['retry'] = False
+        kwargs['timeout'] = (
+            config.get(
+                'http_connect_timeout', HttpClient.DEFAULT_CONNECT_TIMEOUT
+            ),
+            None
+        )
+    response = current_handler.http_client().get(
+        req_url, params=params|request.args, **kwargs
+    )
     return Response(
         response.content,
         status=response.status_code,
@@ -245,7 +347,7 @@ def proxy_config_generator(endpoint):
 
 @app.route('/generate_configs')
 def generate_configs_start():
-    return proxy_config_generator("/generate_configs")
+    return proxy_config_generator("/generate_configs", long_running=True)
 
 @app.route('/generate_configs_cancel')
 def generate_configs_cancel():
@@ -256,11 +358,12 @@ def generate_configs_status():
     return proxy_config_generator("/generate_configs_status")
 
 
-@app.route('/qgis_server_logs', methods=['POST'])
-def qgis_server_logs():
-    """ Return qgis server logs """
+def fetch_qgis_server_logs(current_handler, lines):
+    """Return status code and last log lines of QGIS Server.
 
-    current_handler = handler()
+    :param TenantConfigHandler current_handler: Tenant config handler
+    :param str lines: Number of log lines
+    """
     default_qgis_server_url = current_handler.config().get(
         "default_qgis_server_url",
         "http://qwc-qgis-server/ows").rstrip('/')
@@ -271,29 +374,107 @@ def qgis_server_logs():
         default_qgis_server_url = default_qgis_server_url[:-len(ows_prefix)]
 
     params = {
-        "n": request.args.get('qgis_server_log_lines', '100')
+        "n": lines
     }
-    response = requests.post(
+    response = current_handler.http_client().post(
         urllib.parse.urljoin(default_qgis_server_url, "logs"),
         params=params
     )
+    return response.status_code, log_tail.log_lines(response.text)
 
-    def colorize(line):
-        if line[9:16] == "WARNING":
-            return f'<b style="color: orange">{line}</b>'
-        elif line[9:17] == "CRITICAL" or line.startswith("Traceback"):
-            return f'<b style="color: red">{line}</b>'
-        else:
-            return line
-    text = "\n".join(map(colorize, response.text.split("\n")))
 
-    return (text, response.status_code)
+@app.route('/qgis_server_logs', methods=['POST'])
+def qgis_server_logs():
+    """ Return qgis server logs
+
+    Parameter:
+        qgis_server_log_lines: Number of log lines (default: 100)
+        cursor: Optional cursor from a previous response, to return only
+                lines logged since then
+    """
+    status_code, lines = fetch_qgis_server_logs(
+        handler(), request.args.get('qgis_server_log_lines', '100')
+    )
+
+    start, found = log_tail.new_lines_start(
+        lines, request.args.get('cursor')
+    )
+    response = Response(
+        log_tail.colorized_lines(lines, start), status=status_code
+    )
+    response.headers['X-Log-Cursor'] = log_tail.log_cursor(
+        lines, len(lines)
+    )
+    if request.args.get('cursor') and not found:
+        # lines between cursor and returned window are missing
+        response.headers['X-Log-Gap'] = '1'
+    return response
+
+
+@app.route('/qgis_server_logs/follow')
+def qgis_server_logs_follow():
+    """ Follow qgis server logs as Server-Sent Events
+
+    New lines are polled every 'qgis_server_logs_poll_interval' seconds.
+    The stream is closed after 'qgis_server_logs_follow_timeout' seconds,
+    the client then reconnects with the last event ID as cursor.
+
+    Parameter:
+        qgis_server_log_lines: Number of initial log lines and of polled
+                               lines (default: 100)
+    """
+    current_handler = handler()
+    config = current_handler.config()
+    log_lines = request.args.get('qgis_server_log_lines', '100')
+    poll_interval = config.get('qgis_server_logs_poll_interval', 2)
+    follow_timeout = config.get('qgis_server_logs_follow_timeout', 60)
+    cursor = request.headers.get('Last-Event-ID', '')
+
+    def events(cursor):
+        # reconnect delay in ms
+        yield "retry: %d\n\n" % int(poll_interval * 1000)
+
+        deadline = time.monotonic() + follow_timeout
+        while True:
+            status_code, lines = fetch_qgis_server_logs(
+                current_handler, log_lines
+            )
+            if status_code != 200:
+                yield "event: upstream_error\ndata: Status %d\n\n" % status_code
+                return
+
+            start, found = log_tail.new_lines_start(lines, cursor)
+            if cursor and not found:
+                yield "event: gap\ndata: \n\n"
+            if start < len(lines):
+                cursor = log_tail.log_cursor(lines, len(lines))
+                yield log_tail.sse_event(lines, start, cursor)
+            else:
+                # keepalive comment, also detects closed connections
+                yield ": \n\n"
+
+            if time.monotonic() + poll_interval > deadline:
+                return
+            time.sleep(poll_interval)
+
+    response = Response(
+        stream_with_context(events(cursor)), mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    # disable response buffering of nginx
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 
 @app.route('/update_solr_index', methods=['POST'])
 def update_solr_index():
-    """Update Solr index for a tenant."""
-    config = handler().config()
-    tenant = handler().tenant
+    """Start Solr index update for a tenant, or join its running update.
+
+    Returns the job state as JSON, use /update_solr_index_status for
+    polling the job status.
+    """
+    current_handler = handler()
+    config = current_handler.config()
 
     solr_service_url = config.get('solr_service_url', '')
     if not solr_service_url:
@@ -304,131 +485,78 @@ def update_solr_index():
     if not solr_tenant_dih:
         abort(500, "Missing config for 'solr_tenant_dih'")
 
-    # get optional source DataImportHandler config file for tenant
-    solr_tenant_dih_config_file = config.get('solr_tenant_dih_config_file', '')
-    # get optional target path for Solr configs
-    solr_config_path = config.get('solr_config_path', '')
-
-    if solr_tenant_dih_config_file and solr_config_path:
-        try:
-            # copy tenant config file to Solr configs dir
-            file_name = os.path.basename(solr_tenant_dih_config_file)
-            app.logger.info(
-                "Updating Solr config file '%s' for tenant '%s'" %
-                (file_name, tenant)
-            )
-            copyfile(
-                solr_tenant_dih_config_file,
-                os.path.join(solr_config_path, file_name)
-            )
-        except Exception as e:
-            msg = "Could not copy Solr tenant config:\n%s" % e
-            app.logger.error(msg)
-            abort(500, msg)
-
     try:
-        timeout = config.get('proxy_timeout', 60)
-
-        # clear search index for tenant
-        url = urllib.parse.urljoin(solr_service_url, "update?commitWithin=1000")
-        data = {'delete': {'query': "tenant:%s" % tenant}}
-        headers = {'content-type': 'application/json'}
-        app.logger.info("Clearing Solr search index for tenant '%s'" % tenant)
-        response = requests.post(
-            url, data=json.dumps(data), headers=headers, timeout=timeout
+        job = solr_index_jobs.start(
+            current_handler.tenant, config, current_handler.http_client()
         )
-        if response.status_code != 200:
-            abort(
-                response.status_code,
-                "Could not clear Solr search index:\n%s" % response.text
-            )
+    except Exception as e:
+        msg = "Could not start Solr search index update:\n%s" % e
+        app.logger.error(msg)
+        abort(500, msg)
 
-        # wait until index has been cleared
-        solr_update_check_max_retries = config.get(
-            'solr_update_check_max_retries', 10
-        )
-        solr_update_check_wait = config.get('solr_update_check_wait', 5)
-        num_found = -1
-        for i in range(solr_update_check_max_retries):
-            time.sleep(solr_update_check_wait)
-
-            # send dummy query with tenant filter
-            url = urllib.parse.urljoin(
-                solr_service_url,
-                "select?omitHeader=true&q=tenant:%s&rows=0" % tenant
-            )
-            app.logger.info("Checking result count for tenant '%s'" % tenant)
-            response = requests.get(url, timeout=timeout)
-
-            # check if result count is 0
-            num_found = json.loads(response.text) \
-                .get('response', {}).get('numFound', -1)
-            if num_found == 0:
-                break
-
-        if num_found != 0:
-            abort(
-                500,
-                "Solr search index could not be cleared (%s results)" %
-                num_found
-            )
+    return solr_index_job_response(job, 0, 202)
 
-        # update search index for tenant
-        url = urllib.parse.urljoin(
-            solr_service_url,
-            "%s?command=full-import&clean=false" % solr_tenant_dih
-        )
-        app.logger.info(
-            "Updating Solr search index for '%s' for tenant '%s'" %
-            (solr_tenant_dih, tenant)
-        )
-        response = requests.get(url, timeout=timeout)
-        if response.status_code != 200:
-            abort(
-                response.status_code,
-                "Could not create Solr search index:\n%s" % response.text
-            )
 
-        # wait until index has been updated
-        for i in range(solr_update_check_max_retries):
-            time.sleep(solr_update_check_wait)
+@app.route('/update_solr_index_status')
+def update_solr_index_status():
+    """Return state of a Solr index update job.
 
-            # check status for tenant
-            url = urllib.parse.urljoin(
-                solr_service_url,
-                "%s?command=status" % solr_tenant_dih
-            )
-            app.logger.info("Checking Solr status for tenant '%s'" % tenant)
-            response = requests.get(url, timeout=timeout)
-
-            status_response = json.loads(response.text)
-            status = status_response.get('status')
-            if status == 'idle':
-                import_failed = 'Full Import failed' in status_response.get(
-                    'statusMessages', {}
-                )
-                if not import_failed:
-                    msg = (
-                        "Solr search index for tenant '%s' "
-                        "has been successfully updated" % tenant
-                    )
-                    app.logger.info(msg)
-                    return (msg)
-                else:
-                    abort(
-                        500,
-                        "Solr full import failed. Check Solr logs for errors."
-                    )
-
-        # if still updating
-        return ("Started Solr search index update for tenant '%s'" % tenant)
-    except Exception as e:
-        msg = "Could not update Solr search index:\n%s" % e
-        app.logger.error(msg)
-        abort(500, msg)
+    Parameter:
+        job_id: Job ID
+        start: Index of first returned log line (default: 0)
+    """
+    current_handler = handler()
+    job = solr_index_jobs.status(
+        current_handler.tenant, current_handler.config(),
+        request.args.get('job_id', '')
+    )
+    if job is None:
+        abort(404, "Solr index update job not found")
+
+    return solr_index_job_response(job, request.args.get('start', 0, int))
 
 
-@app.route("/proxy", methods=['GET', 'POST', 'PUT', 'DELETE'])
+@app.route('/update_solr_index_cancel', methods=['POST'])
+def update_solr_index_cancel():
+    """Cancel a Solr index update job.
+
+    Parameter:
+        job_id: Job ID
+    """
+    current_handler = handler()
+    job = solr_index_jobs.cancel(
+        current_handler.tenant, current_handler.config(),
+        request.args.get('job_id', '')
+    )
+    if job is None:
+        abort(404, "Solr index update job not found")
+
+    return solr_index_job_response(job, len(job['logs']))
+
+
+def solr_index_job_response(job, start, status_code=200):
+    """Return JSON response for a Solr index update job.
+
+    :param dict job: Job state
+    :param int start: Index of first returned log line
+    :param int status_code: HTTP status code
+    """
+    logs = job['logs'][start:]
+    return jsonify({
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'running': job['status'] in SolrIndexJobRunner.ACTIVE_STATUSES,
+        'joined': job.get('joined', False),
+        'step': job['step'],
+        'progress': job['progress'],
+        'message': job['message'],
+        'cancel_requested': job['cancel_requested'],
+        'logs': logs,
+        'log_linecount': len(logs)
+    }), status_code
+
+
+@app.route("/proxy", methods=ServiceProxy.METHODS)
 def proxy():
     """Proxy for calling whitelisted internal services.
 
@@ -442,12 +570,9 @@ def proxy():
         "proxy_url_whitelist", [])
 
     # check if URL is in whitelist
-    url_permitted = False
-    for expr in PROXY_URL_WHITELIST:
-        if re.match(expr, url):
-            url_permitted = True
-            break
-    if not url_permitted:
+    if not service_proxy.url_permitted(
+        current_handler.tenant, PROXY_URL_WHITELIST, url
+    ):
         app.logger.info("Proxy forbidden for URL '%s'" % url)
         abort(403)
 
@@ -456,29 +581,22 @@ def proxy():
         "proxy_timeout", 60)
 
     # forward request
-    if request.method == 'GET':
-        res = requests.get(url, stream=True, timeout=PROXY_TIMEOUT)
-    elif request.method == 'POST':
-        headers = {'content-type': request.headers['content-type']}
-        res = requests.post(url, stream=True, timeout=PROXY_TIMEOUT,
-                            data=request.get_data(), headers=headers)
-    elif request.method == 'PUT':
-        headers = {'content-type': request.headers['content-type']}
-        res = requests.put(url, stream=True, timeout=PROXY_TIMEOUT,
-                           data=request.get_data(), headers=headers)
-    elif request.method == 'DELETE':
-        res = requests.delete(url, stream=True, timeout=PROXY_TIMEOUT)
-    else:
-        raise "Invalid operation"
-    response = Response(stream_with_context(res.iter_content(chunk_size=1024)),
-                        status=res.status_code)
-    response.headers['content-type'] = res.headers['content-type']
-    return response
+    return service_proxy.forward(
+        current_handler.http_client(), url, request, PROXY_TIMEOUT
+    )
+
+
+@app.route("/upstream_metrics", methods=['GET'])
+def upstream_metrics():
+    """Return request metrics per upstream service."""
+    return jsonify(http_client.metrics())
 
 
 """ readyness probe endpoint """
 @app.route("/ready", methods=['GET'])
 def ready():
+    if not warmup_done.is_set():
+        return jsonify({"status": "STARTING"}), 503
     return jsonify({"status": "OK"})
 
 
@@ -488,6 +606,105 @@ def healthz():
     return jsonify({"status": "OK"})
 
 
+def load_plugins():
+    """Load plugins of the current tenant and register their routes.
+
+    Returns False if the plugin config could not be read.
+    """
+    app.config['PLUGINS'] = []
+    try:
+        plugins = handler().config().get("plugins", [])
+    except Exception as e:
+        app.logger.warning("Could not load plugins: %s" % e)
+        return False
+
+    for plugin in plugins:
+        app.logger.info("Loading plugin '%s'" % plugin)
+        try:
+            mod = importlib.import_module("plugins." + plugin)
+            mod.load_plugin(app, handler)
+            app.config['PLUGINS'].append({"id": plugin, "name": mod.name})
+        except Exception as e:
+            app.logger.warning(
+                "Could not load plugin %s: %s" % (plugin, str(e))
+            )
+    return True
+
+
+def startup_request_context():
+    """Return request context of a configured tenant for loading the
+    plugins on startup, or None if the tenant can only be resolved from
+    the URL of a request.
+    """
+    tenants = configured_tenants()
+    if (
+        tenant_handler.tenant_name or not tenants or
+        DEFAULT_TENANT in tenants
+    ):
+        return app.test_request_context()
+    if tenant_handler.tenant_header:
+        return app.test_request_context(
+            headers={tenant_handler.tenant_header: tenants[0]}
+        )
+    return None
+
+
+def start_warmup():
+    """Warm up models and DB pools in the background until ready."""
+    if os.environ.get('WARMUP_MODELS', 'True').lower() == 'true':
+        threading.Thread(target=warmup, name="warmup", daemon=True).start()
+    else:
+        warmup_done.set()
+
+
+def after_fork():
+    """Drop DB connections inherited from the uWSGI master and warm up the
+    worker."""
+    for engine in db_engine.engines.values():
+        # NOTE: do not close the connections, which are shared with the
+        #       master
+        engine.dispose(close=False)
+    start_warmup()
+
+
+# startup: load plugins before handling any requests
+plugins_loaded = False
+context = startup_request_context()
+if context is not None:
+    # NOTE: plugins access the tenant config via a request context
+    with context:
+        plugins_loaded = load_plugins()
+
+if not plugins_loaded:
+    # fallback: load plugins of the tenant of the first request
+    @app.before_request
+    def load_plugins_on_first_request():
+        global plugins_loaded
+        if not plugins_loaded:
+            # HACK to work around
+            #     The setup method 'add_url_rule' can no longer be called on the application.
+            #     It has already handled its first request, any changes will not be applied consistently.
+            # From the flask code, before_request is called immediately after _got_first_request=True, so
+            # there should be no harm clearing the flag again temporarily
+            app._got_first_request = False
+            plugins_loaded = True
+            load_plugins()
+            app._got_first_request = True
+
+# warm up in each worker process, as threads and DB connections of the
+# uWSGI master are not inherited consistently by the forked workers
+try:
+    import uwsgi
+except ImportError:
+    uwsgi = None
+if uwsgi is not None and uwsgi.worker_id() == 0:
+    # app is loaded in the master before forking the workers
+    from uwsgidecorators import postfork
+    postfork(after_fork)
+else:
+    start_warmup()
+
+
 # local webserver
 if __name__ == '__main__':
     print("Starting QWC Admin GUI...")
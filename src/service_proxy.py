@@ -0,0 +1,187 @@
+import re
+import threading
+
+from flask import Response, stream_with_context
+
+
+class RequestBodyStream:
+    """Iterable over the body of an incoming request, for streaming it
+    upstream in chunks with a known Content-Length.
+    """
+
+    def __init__(self, stream, content_length, chunk_size):
+        """Constructor
+
+        :param file stream: Input stream of request body
+        :param int content_length: Length of request body
+        :param int chunk_size: Max chunk size in bytes
+        """
+        self.stream = stream
+        self.content_length = content_length
+        self.chunk_size = chunk_size
+
+    def __len__(self):
+        # NOTE: used by requests for the Content-Length header
+        return self.content_length
+
+    def __iter__(self):
+        remaining = self.content_length
+        while remaining > 0:
+            chunk = self.stream.read(min(self.chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class ServiceProxy:
+    """Streaming proxy for calling whitelisted internal services.
+
+    Request and response bodies are streamed in large chunks without
+    decoding. Compiled whitelist patterns are cached per tenant.
+    """
+
+    # min chunk size in bytes for streaming
+    CHUNK_SIZE = 64 * 1024
+    # max chunk size in bytes for streaming large bodies
+    MAX_CHUNK_SIZE = 1024 * 1024
+
+    # supported HTTP methods
+    METHODS = ['GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'DELETE']
+
+    # request headers forwarded to the upstream service
+    REQUEST_HEADERS = [
+        'Accept', 'Accept-Encoding', 'Accept-Language', 'Content-Type',
+        'Range', 'If-Range', 'If-Match', 'If-None-Match',
+        'If-Modified-Since', 'If-Unmodified-Since', 'Cache-Control'
+    ]
+    # response headers forwarded to the client
+    RESPONSE_HEADERS = [
+        'Content-Type', 'Content-Length', 'Content-Encoding',
+        'Content-Range', 'Content-Disposition', 'Content-Language',
+        'Accept-Ranges', 'Allow', 'ETag', 'Last-Modified', 'Cache-Control',
+        'Expires', 'Vary'
+    ]
+
+    def __init__(self, logger):
+        """Constructor
+
+        :param Logger logger: Application logger
+        """
+        self.logger = logger
+
+        # lookup for compiled whitelists as
+        # {<tenant>: (<whitelist patterns>, <compiled RegExes>)}
+        self.whitelists = {}
+        self.lock = threading.Lock()
+
+    def url_permitted(self, tenant, whitelist, url):
+        """Return whether URL matches any RegEx of the proxy URL whitelist.
+
+        :param str tenant: Tenant ID
+        :param list[str] whitelist: Whitelisted URL RegEx patterns
+        :param str url: Target URL
+        """
+        if not url:
+            return False
+
+        patterns = tuple(whitelist)
+        entry = self.whitelists.get(tenant)
+        if entry is None or entry[0] != patterns:
+            # (re)compile whitelist
+            entry = (patterns, [re.compile(expr) for expr in patterns])
+            with self.lock:
+                self.whitelists[tenant] = entry
+
+        return any(regex.match(url) for regex in entry[1])
+
+    def forward(self, http_client, url, request, timeout):
+        """Forward request to upstream service and return streamed response.
+
+        :param TenantHttpClient http_client: HTTP client for tenant
+        :param str url: Target URL
+        :param Request request: Incoming request
+        :param float timeout: Timeout in seconds
+        """
+        method = request.method
+        headers = {
+            name: request.headers[name] for name in self.REQUEST_HEADERS
+            if name in request.headers
+        }
+        # NOTE: the response body is not decoded, so do not use the default
+        #       Accept-Encoding of requests
+        headers.setdefault('Accept-Encoding', 'identity')
+
+        data = None
+        retry = True
+        content_length = request.content_length
+        if content_length:
+            # stream request body upstream
+            data = RequestBodyStream(
+                request.stream, content_length,
+                self.chunk_size(content_length)
+            )
+            # NOTE: a streamed body cannot be resent
+            retry = False
+        elif request.headers.get('Transfer-Encoding') == 'chunked':
+            # stream request body with chunked transfer encoding
+            data = iter(
+                lambda: request.stream.read(self.CHUNK_SIZE), b''
+            )
+            retry = False
+
+        res = http_client.request(
+            method, url, stream=True, timeout=timeout, retry=retry,
+            headers=headers, data=data
+        )
+
+        response_headers = [
+            (name, res.headers[name]) for name in self.RESPONSE_HEADERS
+            if name in res.headers
+        ]
+
+        if method == 'HEAD':
+            res.close()
+            body = []
+        else:
+            upstream_length = res.headers.get('Content-Length')
+            chunk_size = self.chunk_size(
+                int(upstream_length) if upstream_length and
+                upstream_length.isdigit() else None
+            )
+            body = stream_with_context(self.stream(res, chunk_size))
+
+        response = Response(
+            body, status=res.status_code, headers=response_headers
+        )
+        if 'Content-Type' not in res.headers:
+            # remove default Content-Type
+            del response.headers['Content-Type']
+        # body is passed through with its original encoding
+        response.direct_passthrough = True
+        return response
+
+    def stream(self, res, chunk_size):
+        """Yield raw upstream response body in chunks and close the
+        upstream response afterwards.
+
+        :param Response res: Streamed upstream response
+        :param int chunk_size: Chunk size in bytes
+        """
+        try:
+            # NOTE: pass through without decoding Content-Encoding
+            for chunk in res.raw.stream(chunk_size, decode_content=False):
+                yield chunk
+        finally:
+            res.close()
+
+    def chunk_size(self, content_length):
+        """Return adaptive chunk size for a body length.
+
+        :param int content_length: Body length in bytes or None if unknown
+        """
+        if not content_length:
+            return self.CHUNK_SIZE
+        return max(
+            self.CHUNK_SIZE, min(self.MAX_CHUNK_SIZE, content_length // 16)
+        )
@@ -0,0 +1,591 @@
+from contextlib import contextmanager
+import json
+import os
+from shutil import copyfile
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    # no file locks on Windows
+    fcntl = None
+
+
+class SolrIndexJobCancelled(Exception):
+    """Raised if a Solr index update job has been cancelled."""
+
+
+class SolrIndexJobRunner:
+    """Background runner for Solr search index updates.
+
+    Index updates run in a background thread, so the request returns
+    immediately with a job ID for polling the job status.
+
+    The job state is persisted as JSON file in the jobs dir, so status and
+    cancellation also work across worker processes. There is at most one
+    active job per tenant, guarded by an exclusively created lock file
+    containing its job ID. Further update requests join the active job.
+    """
+
+    # default dir for persisted job states
+    DEFAULT_JOBS_DIR = os.path.join(
+        tempfile.gettempdir(), 'qwc-admin-gui-solr-jobs'
+    )
+    # time in seconds after which finished job states are removed
+    JOB_RETENTION = 86400
+    # min time in seconds without heartbeat after which an active job is
+    # considered as interrupted (e.g. if its worker process has been killed)
+    MIN_STALE_TIMEOUT = 60
+
+    # job status values
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    ACTIVE_STATUSES = [QUEUED, RUNNING]
+
+    def __init__(self, logger, http_client):
+        """Constructor
+
+        :param Logger logger: Application logger
+        :param HttpClient http_client: Shared HTTP client
+        """
+        self.logger = logger
+        self.http_client = http_client
+
+        # lookup for cancel events of jobs in this process
+        # as {<job ID>: <Event>}
+        self.cancel_events = {}
+        self.lock = threading.Lock()
+
+    def start(self, tenant, config, http_client):
+        """Start Solr index update for a tenant, or join its active job.
+
+        Returns job state.
+
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        :param TenantHttpClient http_client: HTTP client for tenant
+        """
+        jobs_dir = self.jobs_dir(tenant, config)
+        lock_path = os.path.join(jobs_dir, 'active.lock')
+
+        with self.lock:
+            self.cleanup(jobs_dir)
+            while True:
+                try:
+                    fd = os.open(
+                        lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY
+                    )
+                except FileExistsError:
+                    active_job = self.active_job(jobs_dir, lock_path, config)
+                    if active_job is not None:
+                        self.logger.info(
+                            "Joining Solr index update job %s for tenant '%s'"
+                            % (active_job['job_id'], tenant)
+                        )
+                        active_job['joined'] = True
+                        return active_job
+                    # retry after removing stale lock
+                    continue
+
+                job = {
+                    'job_id': uuid.uuid4().hex,
+                    'tenant': tenant,
+                    'status': self.QUEUED,
+                    'step': None,
+                    'progress': 0,
+                    'logs': [],
+                    'message': None,
+                    'cancel_requested': False,
+                    'created_at': time.time(),
+                    'updated_at': time.time()
+                }
+                with os.fdopen(fd, 'w') as f:
+                    f.write(job['job_id'])
+                self.save(jobs_dir, job)
+                self.cancel_events[job['job_id']] = threading.Event()
+                break
+
+        self.logger.info(
+            "Starting Solr index update job %s for tenant '%s'" %
+            (job['job_id'], tenant)
+        )
+        thread = threading.Thread(
+            target=self.run, args=(job, jobs_dir, config, http_client),
+            name="solr-index-%s" % job['job_id'], daemon=True
+        )
+        thread.start()
+
+        job['joined'] = False
+        return job
+
+    def status(self, tenant, config, job_id):
+        """Return job state of a tenant, or None if not found.
+
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        :param str job_id: Job ID
+        """
+        jobs_dir = self.jobs_dir(tenant, config)
+        job = self.load(jobs_dir, job_id)
+        if job is None or job['tenant'] != tenant:
+            return None
+
+        if (
+            job['status'] in self.ACTIVE_STATUSES and
+            job_id not in self.cancel_events and
+            time.time() - job['updated_at'] > self.stale_timeout(config)
+        ):
+            # job of another process without heartbeat
+            job['status'] = self.FAILED
+            job['message'] = "Solr index update has been interrupted"
+
+        return job
+
+    def cancel(self, tenant, config, job_id):
+        """Request cancellation of a job and return its state, or None if
+        not found.
+
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        :param str job_id: Job ID
+        """
+        jobs_dir = self.jobs_dir(tenant, config)
+        with self.state_lock(jobs_dir):
+            job = self.load(jobs_dir, job_id)
+            if job is None or job['tenant'] != tenant:
+                return None
+            if job['status'] in self.ACTIVE_STATUSES:
+                self.logger.info(
+                    "Cancelling Solr index update job %s for tenant '%s'" %
+                    (job_id, tenant)
+                )
+                job['cancel_requested'] = True
+                self.save(jobs_dir, job)
+        event = self.cancel_events.get(job_id)
+        if event is not None:
+            event.set()
+
+        return job
+
+    def run(self, job, jobs_dir, config, http_client):
+        """Run Solr index update job.
+
+        :param dict job: Job state
+        :param str jobs_dir: Dir for persisted job states
+        :param obj config: Tenant config
+        :param TenantHttpClient http_client: HTTP client for tenant
+        """
+        try:
+            self.update(
+                job, jobs_dir,
+                "Starting Solr search index update for tenant '%s'" %
+                job['tenant'], 0, status=self.RUNNING
+            )
+            message = self.update_index(job, jobs_dir, config, http_client)
+            self.update(
+                job, jobs_dir, 'finished', 100, status=self.SUCCEEDED,
+                message=message
+            )
+            self.logger.info(message)
+        except SolrIndexJobCancelled:
+            message = "Solr index update has been cancelled"
+            self.update(
+                job, jobs_dir, 'cancelled', job['progress'],
+                status=self.CANCELLED, message=message
+            )
+            self.logger.info(
+                "%s for tenant '%s'" % (message, job['tenant'])
+            )
+        except Exception as e:
+            message = "Could not update Solr search index:\n%s" % e
+            self.update(
+                job, jobs_dir, 'failed', job['progress'], status=self.FAILED,
+                message=message
+            )
+            self.logger.error(message)
+        finally:
+            with self.lock:
+                self.cancel_events.pop(job['job_id'], None)
+                self.release_lock(
+                    os.path.join(jobs_dir, 'active.lock'), job['job_id']
+                )
+
+    def update_index(self, job, jobs_dir, config, http_client):
+        """Clear and rebuild the Solr search index of the job tenant and
+        return result message.
+
+        :param dict job: Job state
+        :param str jobs_dir: Dir for persisted job states
+        :param obj config: Tenant config
+        :param TenantHttpClient http_client: HTTP client for tenant
+        """
+        tenant = job['tenant']
+        solr_service_url = config.get('solr_service_url', '')
+        solr_tenant_dih = config.get('solr_tenant_dih', '')
+
+        # get optional source DataImportHandler config file for tenant
+        solr_tenant_dih_config_file = config.get(
+            'solr_tenant_dih_config_file', ''
+        )
+        # get optional target path for Solr configs
+        solr_config_path = config.get('solr_config_path', '')
+
+        if solr_tenant_dih_config_file and solr_config_path:
+            # copy tenant config file to Solr configs dir
+            file_name = os.path.basename(solr_tenant_dih_config_file)
+            self.update(
+                job, jobs_dir,
+                "Updating Solr config file '%s' for tenant '%s'" %
+                (file_name, tenant), 0
+            )
+            try:
+                copyfile(
+                    solr_tenant_dih_config_file,
+                    os.path.join(solr_config_path, file_name)
+                )
+            except Exception as e:
+                raise Exception("Could not copy Solr tenant config:\n%s" % e)
+
+        timeout = config.get('proxy_timeout', 60)
+        solr_update_check_max_retries = config.get(
+            'solr_update_check_max_retries', 10
+        )
+        solr_update_check_wait = config.get('solr_update_check_wait', 5)
+
+        # clear search index for tenant
+        self.check_cancelled(job, jobs_dir)
+        url = urllib.parse.urljoin(
+            solr_service_url, "update?commitWithin=1000"
+        )
+        data = {'delete': {'query': "tenant:%s" % tenant}}
+        headers = {'content-type': 'application/json'}
+        self.update(
+            job, jobs_dir,
+            "Clearing Solr search index for tenant '%s'" % tenant, 5
+        )
+        response = http_client.post(
+            url, data=json.dumps(data), headers=headers, timeout=timeout
+        )
+        if response.status_code != 200:
+            raise Exception(
+                "Could not clear Solr search index:\n%s" % response.text
+            )
+
+        # wait until index has been cleared
+        num_found = -1
+        for i in range(solr_update_check_max_retries):
+            self.wait(job, jobs_dir, solr_update_check_wait)
+
+            # send dummy query with tenant filter
+            url = urllib.parse.urljoin(
+                solr_service_url,
+                "select?omitHeader=true&q=tenant:%s&rows=0" % tenant
+            )
+            self.update(
+                job, jobs_dir,
+                "Checking result count for tenant '%s'" % tenant,
+                5 + int(40 * (i + 1) / solr_update_check_max_retries)
+            )
+            response = http_client.get(url, timeout=timeout)
+
+            # check if result count is 0
+            num_found = json.loads(response.text) \
+                .get('response', {}).get('numFound', -1)
+            if num_found == 0:
+                break
+
+        if num_found != 0:
+            raise Exception(
+                "Solr search index could not be cleared (%s results)" %
+                num_found
+            )
+
+        # update search index for tenant
+        self.check_cancelled(job, jobs_dir)
+        url = urllib.parse.urljoin(
+            solr_service_url,
+            "%s?command=full-import&clean=false" % solr_tenant_dih
+        )
+        self.update(
+            job, jobs_dir,
+            "Updating Solr search index for '%s' for tenant '%s'" %
+            (solr_tenant_dih, tenant), 50
+        )
+        response = http_client.get(url, timeout=timeout)
+        if response.status_code != 200:
+            raise Exception(
+                "Could not create Solr search index:\n%s" % response.text
+            )
+
+        # wait until index has been updated
+        for i in range(solr_update_check_max_retries):
+            self.wait(job, jobs_dir, solr_update_check_wait)
+
+            # check status for tenant
+            url = urllib.parse.urljoin(
+                solr_service_url,
+                "%s?command=status" % solr_tenant_dih
+            )
+            self.update(
+                job, jobs_dir,
+                "Checking Solr status for tenant '%s'" % tenant,
+                50 + int(45 * (i + 1) / solr_update_check_max_retries)
+            )
+            response = http_client.get(url, timeout=timeout)
+
+            status_response = json.loads(response.text)
+            status = status_response.get('status')
+            if status == 'idle':
+                import_failed = 'Full Import failed' in status_response.get(
+                    'statusMessages', {}
+                )
+                if not import_failed:
+                    return (
+                        "Solr search index for tenant '%s' "
+                        "has been successfully updated" % tenant
+                    )
+                else:
+                    raise Exception(
+                        "Solr full import failed. Check Solr logs for errors."
+                    )
+
+        # if still updating
+        return (
+            "Started Solr search index update for tenant '%s'" % tenant
+        )
+
+    def wait(self, job, jobs_dir, seconds):
+        """Wait between status checks, unless the job is cancelled.
+
+        :param dict job: Job state
+        :param str jobs_dir: Dir for persisted job states
+        :param float seconds: Wait time in seconds
+        """
+        event = self.cancel_events.get(job['job_id'])
+        if event is not None:
+            event.wait(seconds)
+        else:
+            time.sleep(seconds)
+        self.check_cancelled(job, jobs_dir)
+
+    def check_cancelled(self, job, jobs_dir):
+        """Raise SolrIndexJobCancelled if cancellation of the job has been
+        requested, in this or in another worker process.
+
+        :param dict job: Job state
+        :param str jobs_dir: Dir for persisted job states
+        """
+        event = self.cancel_events.get(job['job_id'])
+        if event is not None and event.is_set():
+            raise SolrIndexJobCancelled()
+
+        persisted = self.load(jobs_dir, job['job_id'])
+        if persisted is not None and persisted.get('cancel_requested'):
+            raise SolrIndexJobCancelled()
+
+    def update(self, job, jobs_dir, step, progress, status=None,
+               message=None):
+        """Update and persist job state.
+
+        :param dict job: Job state
+        :param str jobs_dir: Dir for persisted job states
+        :param str step: Current step, added to job logs if there is no
+                         message
+        :param int progress: Progress in percent
+        :param str status: Optional new job status
+        :param str message: Optional result message
+        """
+        with self.state_lock(jobs_dir):
+            # keep cancel requests of other processes
+            persisted = self.load(jobs_dir, job['job_id'])
+            if persisted is not None:
+                job['cancel_requested'] = persisted.get('cancel_requested')
+            job['step'] = step
+            job['progress'] = progress
+            if status is not None:
+                job['status'] = status
+            if message is not None:
+                job['message'] = message
+                job['logs'].append(message)
+            else:
+                job['logs'].append(step)
+            job['updated_at'] = time.time()
+            self.save(jobs_dir, job)
+
+    def active_job(self, jobs_dir, lock_path, config):
+        """Return state of the active job of a tenant, or None if its lock
+        is stale and has been removed.
+
+        :param str jobs_dir: Dir for persisted job states
+        :param str lock_path: Path of lock file
+        :param obj config: Tenant config
+        """
+        try:
+            with open(lock_path) as f:
+                job_id = f.read().strip()
+        except OSError:
+            # lock has been removed in the meantime
+            return None
+
+        job = self.load(jobs_dir, job_id)
+        if (
+            job is not None and
+            job['status'] in self.ACTIVE_STATUSES and
+            time.time() - job['updated_at'] <= self.stale_timeout(config)
+        ):
+            return job
+
+        # job is finished or has been interrupted
+        self.logger.warning(
+            "Removing stale Solr index update lock of job %s" % job_id
+        )
+        self.release_lock(lock_path, job_id)
+        return None
+
+    def release_lock(self, lock_path, job_id):
+        """Remove lock file if it is held by a job.
+
+        The lock file is moved aside before checking its job ID, so that a
+        lock taken by another job in the meantime is never removed.
+
+        :param str lock_path: Path of lock file
+        :param str job_id: Job ID
+        """
+        released_path = "%s.%s.released" % (lock_path, uuid.uuid4().hex)
+        try:
+            os.rename(lock_path, released_path)
+        except OSError:
+            # lock has been removed in the meantime
+            return
+
+        try:
+            with open(released_path) as f:
+                owner = f.read().strip()
+            if owner != job_id:
+                # restore lock of other job, unless a new lock exists
+                try:
+                    os.link(released_path, lock_path)
+                except OSError:
+                    pass
+        finally:
+            try:
+                os.remove(released_path)
+            except OSError:
+                pass
+
+    def stale_timeout(self, config):
+        """Return time in seconds without heartbeat after which an active
+        job is considered as interrupted.
+
+        A single Solr request may block for the timeouts of all its
+        attempts and the backoff between retries.
+
+        :param obj config: Tenant config
+        """
+        solr_update_check_wait = config.get('solr_update_check_wait', 5)
+        return max(
+            self.MIN_STALE_TIMEOUT,
+            3 * solr_update_check_wait,
+            self.http_client.max_request_time(
+                config, config.get('proxy_timeout', 60)
+            ) + solr_update_check_wait
+        )
+
+    @contextmanager
+    def state_lock(self, jobs_dir):
+        """Lock job states of a tenant across threads and worker processes
+        while reading and writing them.
+
+        :param str jobs_dir: Dir for persisted job states
+        """
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(jobs_dir, '.state.lock'), 'a') as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def jobs_dir(self, tenant, config):
+        """Return dir for persisted job states of a tenant, creating it if
+        required.
+
+        :param str tenant: Tenant ID
+        :param obj config: Tenant config
+        """
+        jobs_dir = os.path.join(
+            config.get('solr_index_jobs_dir', self.DEFAULT_JOBS_DIR),
+            tenant
+        )
+        os.makedirs(jobs_dir, exist_ok=True)
+        return jobs_dir
+
+    def job_path(self, jobs_dir, job_id):
+        """Return path of persisted job state.
+
+        :param str jobs_dir: Dir for persisted job states
+        :param str job_id: Job ID
+        """
+        # NOTE: job IDs are hex UUIDs
+        return os.path.join(
+            jobs_dir, "%s.json" % "".join(
+                c for c in job_id if c in '0123456789abcdef'
+            )
+        )
+
+    def load(self, jobs_dir, job_id):
+        """Return persisted job state, or None if not found.
+
+        :param str jobs_dir: Dir for persisted job states
+        :param str job_id: Job ID
+        """
+        try:
+            with open(self.job_path(jobs_dir, job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, jobs_dir, job):
+        """Persist job state atomically.
+
+        :param str jobs_dir: Dir for persisted job states
+        :param dict job: Job state
+        """
+        path = self.job_path(jobs_dir, job['job_id'])
+        state = dict(job)
+        state.pop('joined', None)
+        tmp_path = "%s.%d.tmp" % (path, threading.get_ident())
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def cleanup(self, jobs_dir):
+        """Remove persisted states of finished jobs older than
+        JOB_RETENTION.
+
+        :param str jobs_dir: Dir for persisted job states
+        """
+        now = time.time()
+        for entry in os.scandir(jobs_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                if now - entry.stat().st_mtime > self.JOB_RETENTION:
+                    job = self.load(jobs_dir, entry.name[:-len('.json')])
+                    if (
+                        job is None or
+                        job['status'] not in self.ACTIVE_STATUSES
+                    ):
+                        os.remove(entry.path)
+            except OSError:
+                pass
@@ -606,4 +606,81 @@ if (!String.prototype.includes) {
 
     $(this).multiSelect(options);
   };
+
+  /* Multiselect with remote search */
+
+  // selectable items are loaded on demand from the JSON search endpoint
+  // in the 'data-search-url' attribute of the select, which returns
+  // {"items": [{"id": <id>, "name": <name>}], "more": <bool>}
+  $.fn.multiSelectWithRemoteSearch = function(msOptions) {
+    return this.each(function() {
+      var $select = $(this);
+      var searchUrl = $select.data('search-url');
+      var search = {
+        text: '',
+        page: 1,
+        more: false,
+        request: null,
+        timer: null
+      };
+
+      var loadItems = function(ms, page) {
+        if (search.request !== null) {
+          search.request.abort();
+        }
+        search.page = page;
+        search.request = $.getJSON(searchUrl, {q: search.text, page: page}, function(result) {
+          search.request = null;
+          search.more = result.more;
+          $select.multiSelect('addOption', $.map(result.items, function(item) {
+            return {value: item.id, text: $('<div>').text(item.name).html()};
+          }));
+          filterItems(ms.$selectableContainer);
+        });
+      };
+
+      var options = $.extend({}, msOptions);
+      $.extend(options, {
+        selectableHeader: options.selectableHeader + '<input class="ms-search" type="text">',
+        selectionHeader: options.selectionHeader + '<input class="ms-search" type="text">',
+        afterInit: function() {
+          var ms = this;
+          // filter assigned items locally
+          ms.$selectionContainer.find('.ms-search').on('change keyup', function() {
+            filterItems(ms.$selectionContainer);
+          });
+          // search selectable items on server
+          ms.$selectableContainer.find('.ms-search').on('change keyup', function() {
+            var text = $(this).val();
+            filterItems(ms.$selectableContainer);
+            if (text !== search.text) {
+              search.text = text;
+              clearTimeout(search.timer);
+              search.timer = setTimeout(function() {
+                loadItems(ms, 1);
+              }, 300);
+            }
+          });
+          // load next page when scrolled to bottom
+          ms.$selectableUl.on('scroll', function() {
+            if (search.more && search.request === null &&
+                this.scrollTop + this.clientHeight >= this.scrollHeight - 20) {
+              loadItems(ms, search.page + 1);
+            }
+          });
+          loadItems(ms, 1);
+        },
+        afterSelect: function() {
+          filterItems(this.$selectableContainer);
+          filterItems(this.$selectionContainer);
+        },
+        afterDeselect: function() {
+          filterItems(this.$selectableContainer);
+          filterItems(this.$selectionContainer);
+        }
+      });
+
+      $select.multiSelect(options);
+    });
+  };
 }(window.jQuery);
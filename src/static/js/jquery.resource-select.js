@@ -0,0 +1,132 @@
+/*
+* Chosen select for resources, with options loaded on demand from the JSON
+* resource search in the 'data-search-url' attribute of the select, which
+* returns {"items": [{"id": <id>, "type": <type>, "name": <name>,
+* "parent": <parent name>}], "more": <bool>}
+*
+* Only the first page of matching resources is shown, further resources
+* are found by refining the search text.
+*
+* Options are grouped by resource type. Selected options need the
+* 'data-type', 'data-name' and 'data-parent' attributes.
+*/
+
+!function ($) {
+
+  "use strict";
+
+  $.fn.resourceSelect = function(options) {
+    return this.each(function() {
+      var $select = $(this);
+      var searchUrl = $select.data('search-url');
+      var settings = $.extend({
+        // function returning list of allowed resource types, or null for all
+        types: function() { return null; },
+        // lookup for resource type labels as {<type>: <label>}
+        typeLabels: {},
+        // set to show parent resource names
+        showParent: false,
+        // number of loaded resources per search
+        perPage: 50,
+        // options for Chosen jQuery plugin
+        chosen: {}
+      }, options);
+      var search = {
+        text: null,
+        request: null,
+        timer: null
+      };
+
+      var itemFromOption = function($option) {
+        return {
+          id: parseInt($option.val()),
+          type: $option.data('type'),
+          name: $option.data('name'),
+          parent: $option.data('parent') || null
+        };
+      };
+
+      // replace resource options, keeping the current selection
+      var updateOptions = function(items) {
+        var selected = $select.find('option:selected').filter('[data-type]');
+        var allowedTypes = settings.types();
+        if (selected.length > 0) {
+          var selectedItem = itemFromOption(selected);
+          if (allowedTypes !== null && $.inArray(selectedItem.type, allowedTypes) === -1) {
+            // remove selection if not allowed
+            selected = $();
+          } else if (!items.some(function(item) { return item.id === selectedItem.id; })) {
+            items = [selectedItem].concat(items);
+          }
+        }
+
+        $select.find('optgroup').remove();
+        var groups = {};
+        $.each(items, function(i, item) {
+          if (groups[item.type] === undefined) {
+            groups[item.type] = $('<optgroup>')
+              .attr('label', settings.typeLabels[item.type] || item.type)
+              .attr('data-type', item.type)
+              .appendTo($select);
+          }
+          var label = item.name;
+          if (settings.showParent && item.parent) {
+            label += ' (' + item.parent + ')';
+          }
+          $('<option>')
+            .val(item.id).text(label)
+            .attr('data-type', item.type)
+            .attr('data-name', item.name)
+            .attr('data-parent', item.parent || '')
+            .appendTo(groups[item.type]);
+        });
+        $select.val(selected.length > 0 ? selected.val() : $select.find('option').first().val());
+
+        // NOTE: Chosen clears the search field when updating results
+        var searchField = $select.data('chosen').search_field;
+        var text = searchField.val();
+        $select.trigger('chosen:updated');
+        if (text) {
+          searchField.val(text).trigger('keyup');
+        }
+      };
+
+      var loadItems = function() {
+        if (search.request !== null) {
+          search.request.abort();
+        }
+        var params = {q: search.text || '', per_page: settings.perPage};
+        var types = settings.types();
+        if (types !== null) {
+          params.type = types;
+        }
+        search.request = $.ajax({
+          url: searchUrl,
+          data: params,
+          traditional: true,
+          dataType: 'json'
+        }).done(function(result) {
+          search.request = null;
+          updateOptions(result.items);
+        });
+      };
+
+      $select.chosen($.extend({search_contains: true}, settings.chosen));
+      $select.data('chosen').search_field.on('keyup', function() {
+        var text = $(this).val();
+        if (text !== search.text) {
+          search.text = text;
+          clearTimeout(search.timer);
+          search.timer = setTimeout(loadItems, 300);
+        }
+      });
+      // reload resources, e.g. if allowed types changed
+      $select.on('resource-select:reload', function() {
+        loadItems();
+      });
+
+      search.text = '';
+      loadItems();
+    });
+  };
+}(window.jQuery);
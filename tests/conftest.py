@@ -0,0 +1,31 @@
+from contextlib import contextmanager
+import os
+import sys
+
+import pytest
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+)
+
+from query_budget import QueryCounter, REPEATED_STATEMENT_THRESHOLD
+
+
+@pytest.fixture
+def query_budget():
+    """Assert that a block executes at most a number of SQL statements and
+    no statement shape repeatedly (N+1 query), like QUERY_BUDGET_MODE=fail.
+
+    Usage:
+        def test_import(query_budget):
+            with query_budget(3):
+                ...
+    """
+    @contextmanager
+    def check(budget, threshold=REPEATED_STATEMENT_THRESHOLD):
+        with QueryCounter() as counter:
+            yield counter
+        violations = counter.violations(budget, threshold)
+        assert not violations, "\n".join(violations)
+
+    return check
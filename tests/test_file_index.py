@@ -0,0 +1,22 @@
+import logging
+import os
+
+from plugins.themes.utils.file_index import FileIndex
+
+
+def test_file_index_skips_symlink_loops(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    (tmp_path / 'a.qgs').write_text('')
+    (tmp_path / 'sub' / 'b.qgs').write_text('')
+    os.symlink('..', tmp_path / 'sub' / 'loop')
+
+    index = FileIndex(logging.getLogger(__name__))
+    assert index.files(str(tmp_path), ('.qgs',)) == ['a.qgs', 'sub/b.qgs']
+
+    # changed directories are listed again on update
+    (tmp_path / 'sub' / 'c.qgs').write_text('')
+    os.utime(tmp_path / 'sub', ns=(0, 0))
+    index.refresh()
+    assert index.files(str(tmp_path), ('.qgs',)) == [
+        'a.qgs', 'sub/b.qgs', 'sub/c.qgs'
+    ]
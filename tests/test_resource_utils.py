@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import Column, Integer, String, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from resource_utils import upsert_resources
+
+Base = declarative_base()
+
+
+class Resource(Base):
+    __tablename__ = 'resources'
+
+    id = Column(Integer, primary_key=True)
+    type = Column(String)
+    name = Column(String)
+    parent_id = Column(Integer)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def test_upsert_resources_skips_existing(session):
+    maps = upsert_resources(Resource, [
+        {'type': 'map', 'name': 'a'},
+        {'type': 'map', 'name': 'b'},
+        {'type': 'map', 'name': 'a'}
+    ], session)
+    assert sorted(row['name'] for row in maps) == ['a', 'b']
+
+    layers = upsert_resources(Resource, [
+        {'type': 'map', 'name': 'a'},
+        {'type': 'layer', 'name': 'l', 'parent_id': maps[0]['id']},
+        {'type': 'layer', 'name': 'l', 'parent_id': maps[1]['id']}
+    ], session)
+    assert len(layers) == 2
+
+    again = upsert_resources(Resource, [
+        {'type': 'layer', 'name': 'l', 'parent_id': maps[0]['id']},
+        {'type': 'layer', 'name': 'l'}
+    ], session)
+    assert [row['parent_id'] for row in again] == [None]
+
+
+def test_upsert_resources_query_budget(session, query_budget):
+    maps = upsert_resources(Resource, [
+        {'type': 'map', 'name': 'map%d' % i} for i in range(100)
+    ], session)
+
+    # layers of many maps are looked up with one query per type
+    rows = [
+        {'type': 'layer', 'name': 'layer%d' % j, 'parent_id': row['id']}
+        for row in maps for j in range(3)
+    ]
+    with query_budget(2):
+        assert len(upsert_resources(Resource, rows, session)) == 300
+    with query_budget(1):
+        assert upsert_resources(Resource, rows, session) == []